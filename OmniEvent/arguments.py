@@ -104,6 +104,25 @@ class DataArguments:
             "help": "whether truncate in batch. False only if mrc."
         }
     )
+    num_proc: int = field(
+        default=1,
+        metadata={
+            "help": "Number of processes converting examples to features."
+        }
+    )
+    shuffle_buffer_size: int = field(
+        default=0,
+        metadata={
+            "help": "Size of the shuffle buffer of streamed datasets (`IterableProcessor`). No shuffling if <= 1."
+        }
+    )
+    feature_cache_dir: Optional[str] = field(
+        default=None,
+        metadata={
+            "help": "Directory of memory-mapped features, keyed by the input file, tokenizer and data arguments. "
+                    "Features are converted on every run if not set."
+        }
+    )
     language: str = field(
         default="English",
         metadata={"help": "Data language."}
@@ -380,6 +399,19 @@ class TrainingArguments(TrainingArguments):
             "help": "Model parallelism."
         }
     )
+    max_tokens_per_batch: Optional[int] = field(
+        default=None,
+        metadata={
+            "help": "Token budget of length-bucketed batches (batch size x longest input). The batches of training "
+                    "and evaluation are built by `TokenBudgetBatchSampler` if set."
+        }
+    )
+    length_bucket_size: int = field(
+        default=1000,
+        metadata={
+            "help": "Number of shuffled training samples sorted by length together when `max_tokens_per_batch` is set."
+        }
+    )
 
 
 class ArgumentParser(HfArgumentParser):
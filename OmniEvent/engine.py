@@ -0,0 +1,399 @@
+import os
+import json
+import time
+import yaml
+import logging
+
+import torch
+
+from typing import Dict, List, Optional, Tuple
+
+from .arguments import (
+    ArgumentParser,
+    ModelArguments,
+    DataArguments,
+    TrainingArguments
+)
+from .model.model import get_model_cls
+from .model.quantization import QUANTIZATION_MODES, load_quantized
+from .utils import check_web_and_convert_path
+from transformers import (
+    AutoConfig,
+    BertTokenizerFast,
+    RobertaTokenizerFast,
+    T5TokenizerFast,
+    MT5TokenizerFast,
+    BartTokenizerFast
+)
+from transformers.modeling_utils import no_init_weights
+from .infer_module.seq2seq import (
+    get_words,
+    do_event_detection_batch,
+    do_event_argument_extraction_batch,
+    get_ed_result,
+    get_eae_result,
+    prepare_for_eae_from_input,
+    prepare_for_eae_from_pred,
+    prepare_for_eae_from_result
+)
+from .infer_module.registry import ModelRegistry
+from .infer_module.encoder import (
+    ENCODER_PARADIGMS,
+    is_encoder_model,
+    load_encoder_pretrained,
+    do_event_detection_encoder,
+    do_event_argument_extraction_encoder,
+    prepare_for_eae_from_events,
+    get_encoder_ed_result,
+    get_encoder_eae_result
+)
+from .infer_module.onnx_engine import export_seq2seq_onnx, is_onnx_exported, OnnxSeq2SeqEngine
+from .infer_module.cache import ResultCache
+
+logger = logging.getLogger(__name__)
+
+SCHEMAS = ['ace', 'kbp', 'ere', 'maven', 'leven', 'duee', 'fewfc']
+TASKS = ['ED', 'EAE', 'EE']
+MAX_SEQ_LENGTH = 160
+WARMUP_TEXT = "U.S. and British troops were moving on the strategic southern port city of Basra Saturday after a " \
+              "massive aerial assault pounded Baghdad at dawn"
+
+
+class AttrDict(dict):
+    def __init__(self, *args, **kwargs):
+        super(AttrDict, self).__init__(*args, **kwargs)
+        self.__dict__ = self
+
+
+TOKENIZER_NAME_TO_CLS = {
+    "BertTokenizer": BertTokenizerFast,
+    "RobertaTokenizer": RobertaTokenizerFast,
+    "T5Tokenizer": T5TokenizerFast,
+    "MT5Tokenizer": MT5TokenizerFast,
+    "BartTokenizer": BartTokenizerFast
+}
+
+
+def get_tokenizer(tokenizer_name_or_path):
+    path = check_web_and_convert_path(tokenizer_name_or_path, "tokenizer")
+    tokenizer_config = json.load(open(os.path.join(path, "tokenizer_config.json")))
+    tokenizer_cls = TOKENIZER_NAME_TO_CLS[tokenizer_config["tokenizer_class"]]
+    tokenizer = tokenizer_cls.from_pretrained(path)
+    return tokenizer
+
+
+def get_model(model_args, model_name_or_path):
+    path = check_web_and_convert_path(model_name_or_path, "model")
+    model = get_model_cls(model_args).from_pretrained(path)
+    return model
+
+
+def build_model(model_args, model_name_or_path):
+    """Builds the architecture of a checkpoint from its config, without loading or initializing weights."""
+    path = check_web_and_convert_path(model_name_or_path, "model")
+    with no_init_weights():
+        model = get_model_cls(model_args)(AutoConfig.from_pretrained(path))
+    return model
+
+
+def get_paradigm(path):
+    """Reads the paradigm and model type from the `args.yaml` of a checkpoint, defaulting to seq2seq mT5."""
+    args = {}
+    if os.path.exists(os.path.join(path, "args.yaml")):
+        with open(os.path.join(path, "args.yaml"), "r", encoding="utf-8") as f:
+            args = yaml.safe_load(f) or {}
+    return args.get("paradigm", "seq2seq"), args.get("model_type", "mt5")
+
+
+def load_pretrained(model_name_or_path, device, dtype=None, quantize=None):
+    # config
+    path = check_web_and_convert_path(model_name_or_path, "model")
+    paradigm, model_type = get_paradigm(path)
+    if paradigm in ENCODER_PARADIGMS:
+        parser = ArgumentParser((ModelArguments, DataArguments, TrainingArguments))
+        model_args, data_args, training_args = parser.from_pretrained(path)
+        return load_encoder_pretrained(path, model_args, data_args, training_args, device, dtype, quantize)
+    # model
+    model_args = AttrDict({
+        "paradigm": "seq2seq",
+        "model_type": model_type
+    })
+    if quantize is not None:
+        assert str(device) == "cpu", "Quantized models only run on cpu."
+        model = load_quantized(lambda: build_model(model_args, model_name_or_path),
+                               lambda: get_model(model_args, model_name_or_path),
+                               path, quantize)
+    else:
+        model = get_model(model_args, model_name_or_path)
+    model = model.to(device)
+    if dtype is not None:
+        model = model.to(dtype)
+    # model.cuda()
+    # tokenizer
+    tokenizer = get_tokenizer(model_name_or_path)
+
+    return model, tokenizer
+
+
+def load_onnx_pretrained(model_name_or_path, device, dtype=None):
+    """Loads the ONNX Runtime engine of a seq2seq checkpoint, exporting it to `<checkpoint>/onnx` on first use."""
+    assert str(device) == "cpu", "The onnx backend only runs on cpu."
+    path = check_web_and_convert_path(model_name_or_path, "model")
+    onnx_path = os.path.join(path, "onnx")
+    if not is_onnx_exported(onnx_path):
+        assert get_paradigm(path)[0] == "seq2seq", "The onnx backend only supports seq2seq models."
+        model, tokenizer = load_pretrained(model_name_or_path, "cpu")
+        export_seq2seq_onnx(model, onnx_path, tokenizer)
+    model = OnnxSeq2SeqEngine.from_pretrained(onnx_path)
+    tokenizer = get_tokenizer(model_name_or_path)
+    return model, tokenizer
+
+
+def load_int8_pretrained(model_name_or_path, device, dtype=None):
+    return load_pretrained(model_name_or_path, device, quantize="int8")
+
+
+# Process-wide caches, so that repeated `infer()` calls do not reload checkpoints.
+model_registry = ModelRegistry(load_pretrained)
+onnx_registry = ModelRegistry(load_onnx_pretrained)
+int8_registry = ModelRegistry(load_int8_pretrained)
+
+
+def get_pretrained(model_name_or_path, device, dtype=None, backend="torch", quantize=None):
+    assert backend in ["torch", "onnx"]
+    assert quantize in QUANTIZATION_MODES
+    if backend == "onnx":
+        assert quantize is None, "Quantization is only supported by the torch backend."
+        return onnx_registry.get(model_name_or_path, device)
+    if quantize == "int8":
+        return int8_registry.get(model_name_or_path, device)
+    return model_registry.get(model_name_or_path, device, dtype)
+
+
+def get_device(device, backend="torch", quantize=None):
+    """Resolves `device`, where "auto" picks cuda if it is available. The onnx backend and quantized models run on the
+    cpu only.
+
+    Raises:
+        ValueError: If another device than the cpu is asked for with the onnx backend or `quantize`.
+    """
+    if backend == "onnx" or quantize is not None:
+        if device != "auto" and torch.device(device).type != "cpu":
+            raise ValueError("The %s runs on the cpu only, but device %s was given."
+                             % ("onnx backend" if backend == "onnx" else "%s quantization" % quantize, device))
+        return torch.device("cpu")
+    if device == 'auto':
+        device = torch.device("cpu")
+        if torch.cuda.is_available():
+            device = 'cuda'
+    else:
+        device = torch.device(device)
+    return device
+
+
+def check_triggers(texts, triggers):
+    """Asserts that EAE gets a list of triggers for every text."""
+    assert triggers is not None, "EAE needs the triggers of the texts."
+    assert len(triggers) == len(texts), "EAE needs one list of triggers per text."
+    assert all(isinstance(text_triggers, (list, tuple)) for text_triggers in triggers), \
+        "EAE needs one list of triggers per text."
+
+
+def get_task_models(task, model, tokenizer, device, dtype=None, backend="torch", quantize=None):
+    """Returns `(ed_model, ed_tokenizer, eae_model, eae_tokenizer)` for a task, using the pretrained models if the
+    user does not pass any. Models that the task does not need are `None`.
+
+    A model given as a name or path is loaded with `get_pretrained`, which also handles encoder-only checkpoints.
+    """
+    if isinstance(model, str):
+        model, tokenizer = get_pretrained(model, device, dtype, backend, quantize)
+    elif isinstance(model, (list, tuple)) and any(isinstance(m, str) for m in model):
+        models, tokenizers = [], []
+        for i, m in enumerate(model):
+            if isinstance(m, str):
+                m, t = get_pretrained(m, device, dtype, backend, quantize)
+            else:
+                t = tokenizer[i]
+            models.append(m)
+            tokenizers.append(t)
+        model, tokenizer = models, tokenizers
+    ed_model, ed_tokenizer, eae_model, eae_tokenizer = None, None, None, None
+    if task == "ED":
+        if model is None or tokenizer is None:
+            ed_model, ed_tokenizer = get_pretrained("s2s-mt5-ed", device, dtype, backend, quantize)
+        else:
+            ed_model, ed_tokenizer = model, tokenizer
+    elif task == "EAE":
+        if model is None or tokenizer is None:
+            eae_model, eae_tokenizer = get_pretrained("s2s-mt5-eae", device, dtype, backend, quantize)
+        else:
+            eae_model, eae_tokenizer = model, tokenizer
+    elif task == "EE":
+        if model is None or tokenizer is None:
+            ed_model, ed_tokenizer = get_pretrained("s2s-mt5-ed", device, dtype, backend, quantize)
+            eae_model, eae_tokenizer = get_pretrained("s2s-mt5-eae", device, dtype, backend, quantize)
+        else:
+            ed_model, ed_tokenizer = model[0], tokenizer[0]
+            eae_model, eae_tokenizer = model[1], tokenizer[1]
+    return ed_model, ed_tokenizer, eae_model, eae_tokenizer
+
+
+class InferenceEngine(object):
+    """Runs event detection and argument extraction with a pair of loaded models.
+
+    The engine owns everything between a text and its result: the models and tokenizers, their device, the
+    length-bucketed batching of inputs, warmup and the result cache. `infer()`, `infer_batch()` and the server all
+    predict through an engine, so an optimization of the inference path only has to be made here.
+
+    Args:
+        ed_model (`optional`): Event detection model, seq2seq or encoder-only. Only needed for ED and EE.
+        ed_tokenizer (`optional`): Tokenizer of `ed_model`.
+        eae_model (`optional`): Event argument extraction model. Only needed for EAE and EE.
+        eae_tokenizer (`optional`): Tokenizer of `eae_model`.
+        device (`str`, `optional`, defaults to "cpu"): Device the models are on.
+        batch_size (`int`, `optional`, defaults to 32): Maximum number of inputs per `generate` call.
+        max_tokens (`int`, `optional`): Maximum number of padded tokens per `generate` call.
+        cache (`ResultCache`, `optional`): Cache of the results of `predict_text`.
+        backend (`str`, `optional`, defaults to "torch"): Runtime of the models, part of the cache keys.
+        quantize (`str`, `optional`): Quantization of the models, part of the cache keys.
+    """
+
+    def __init__(self,
+                 ed_model=None,
+                 ed_tokenizer=None,
+                 eae_model=None,
+                 eae_tokenizer=None,
+                 device="cpu",
+                 batch_size: int = 32,
+                 max_tokens: Optional[int] = None,
+                 cache: Optional[ResultCache] = None,
+                 backend: str = "torch",
+                 quantize: Optional[str] = None) -> None:
+        self.ed_model = ed_model
+        self.ed_tokenizer = ed_tokenizer
+        self.eae_model = eae_model
+        self.eae_tokenizer = eae_tokenizer
+        self.device = device
+        self.batch_size = batch_size
+        self.max_tokens = max_tokens
+        self.cache = cache
+        self.backend = backend
+        self.quantize = quantize
+
+    @classmethod
+    def from_pretrained(cls,
+                        ed_model: Optional[str] = None,
+                        eae_model: Optional[str] = None,
+                        device="auto",
+                        dtype=None,
+                        backend: str = "torch",
+                        quantize: Optional[str] = None,
+                        **kwargs) -> "InferenceEngine":
+        """Loads the checkpoints `ed_model` and `eae_model` (names or paths) through the process-wide registries.
+        Other keyword arguments are passed to the constructor."""
+        device = get_device(device, backend, quantize)
+        ed_model, ed_tokenizer = get_pretrained(ed_model, device, dtype, backend, quantize) \
+            if ed_model is not None else (None, None)
+        eae_model, eae_tokenizer = get_pretrained(eae_model, device, dtype, backend, quantize) \
+            if eae_model is not None else (None, None)
+        return cls(ed_model, ed_tokenizer, eae_model, eae_tokenizer, device, backend=backend, quantize=quantize,
+                   **kwargs)
+
+    @classmethod
+    def for_task(cls, task: str, model=None, tokenizer=None, device="auto", dtype=None, backend: str = "torch",
+                 quantize: Optional[str] = None, **kwargs) -> "InferenceEngine":
+        """Builds the engine of a task from the `model` and `tokenizer` arguments of `infer()`, see
+        `get_task_models`. Other keyword arguments are passed to the constructor."""
+        assert task in TASKS
+        device = get_device(device, backend, quantize)
+        models = get_task_models(task, model, tokenizer, device, dtype, backend, quantize)
+        return cls(*models, device, backend=backend, quantize=quantize, **kwargs)
+
+    def get_models(self, task: str) -> List:
+        """Returns the models a task runs through."""
+        return {"ED": [self.ed_model], "EAE": [self.eae_model], "EE": [self.ed_model, self.eae_model]}[task]
+
+    def is_encoder(self) -> bool:
+        return any(is_encoder_model(model) for model in [self.ed_model, self.eae_model])
+
+    def count_tokens(self, text: str, schema: str) -> int:
+        """Cheaply estimates the number of input tokens of a text for token-budgeted batching."""
+        language = "Chinese" if schema in ["<duee>", "<fewfc>", "<leven>"] else "English"
+        return min(len(get_words(schema + text, language)), MAX_SEQ_LENGTH)
+
+    def detect_events(self, texts: List[str], schemas: List[str], **gen_kwargs) -> Tuple[List[Dict], List[Dict]]:
+        """Event detection over `texts`, with schemas such as "<ace>".
+
+        `gen_kwargs` (`max_length`, `num_beams`) are passed to `generate` and ignored by encoder-only models.
+
+        Returns:
+            The ED results in the format of `infer`, and the EAE instances of the predicted triggers.
+        """
+        if is_encoder_model(self.ed_model):
+            events = do_event_detection_encoder(self.ed_model, self.ed_tokenizer, texts, self.device,
+                                                self.batch_size)
+            return get_encoder_ed_result(texts, events), prepare_for_eae_from_events(texts, events, schemas)
+        events = do_event_detection_batch(self.ed_model, self.ed_tokenizer, texts, schemas, self.device,
+                                          self.batch_size, self.max_tokens, **gen_kwargs)
+        return get_ed_result(texts, events), prepare_for_eae_from_pred(texts, events, schemas)
+
+    def extract_arguments(self, instances: List[Dict], **gen_kwargs) -> List[Dict]:
+        """Event argument extraction over instances of `prepare_for_eae_from_*`. Instances without triggers yield
+        results without events. Returns one result per instance in the format of `infer`."""
+        if all(len(instance["triggers"]) == 0 for instance in instances):
+            return get_eae_result(instances, [])
+        if is_encoder_model(self.eae_model):
+            arguments = do_event_argument_extraction_encoder(self.eae_model, self.eae_tokenizer, instances,
+                                                             self.device, self.batch_size)
+            return get_encoder_eae_result(instances, arguments)
+        arguments = do_event_argument_extraction_batch(self.eae_model, self.eae_tokenizer, instances, self.device,
+                                                       self.batch_size, self.max_tokens, **gen_kwargs)
+        return get_eae_result(instances, arguments)
+
+    def predict(self, texts: List[str], schemas: List[str], task: str, triggers: Optional[List] = None,
+                **gen_kwargs) -> List[Dict]:
+        """Runs a task over `texts` and returns one result per text in the format of `infer`.
+
+        Args:
+            texts (`List[str]`): Input plain texts.
+            schemas (`List[str]`): Schema of every text, e.g. "<ace>".
+            task (`str`): Task type. Selected in ['ED', 'EAE', 'EE']
+            triggers (`List[List[List]]`, *optional*): Triggers of every text. Only useful for EAE.
+        """
+        if task == "EAE":
+            check_triggers(texts, triggers)
+            return self.extract_arguments(prepare_for_eae_from_input(texts, triggers, schemas), **gen_kwargs)
+        results, instances = self.detect_events(texts, schemas, **gen_kwargs)
+        if task == "ED":
+            return results
+        return self.extract_arguments(instances, **gen_kwargs)
+
+    def make_key(self, text: str, schema: str, task: str, triggers: Optional[List] = None) -> Tuple[str, bool]:
+        """Returns the key of a request in `cache`, see `ResultCache.make_key`."""
+        return self.cache.make_key(text, schema, task, self.get_models(task), triggers, backend=self.backend,
+                                   quantize=self.quantize)
+
+    def predict_text(self, text: str, schema: str, task: str, triggers: Optional[List] = None) -> Dict:
+        """Predicts the result of a single text, through `cache` if the engine has one."""
+        def compute():
+            return self.predict([text], [schema], task, [triggers])[0]
+
+        if self.cache is None:
+            return compute()
+        return self.cache.get_or_compute(self.make_key(text, schema, task, triggers), text, schema, compute)
+
+    def warmup(self) -> float:
+        """Runs a sample text through every model of the engine, so that the first requests do not pay for lazy
+        initialization. Returns the time it took."""
+        start = time.perf_counter()
+        instance = {"text": WARMUP_TEXT, "schema": "<ace>", "triggers": []}
+        if self.ed_model is not None:
+            result = self.detect_events([WARMUP_TEXT], ["<ace>"])[0][0]
+            instance = prepare_for_eae_from_result(result, "<ace>")
+        if self.eae_model is not None:
+            if len(instance["triggers"]) == 0:
+                instance["triggers"].append({"mention": "assault", "offset": [113, 120]})
+            self.extract_arguments([instance])
+        duration = time.perf_counter() - start
+        logger.info("Warmup took %.2fs" % duration)
+        return duration
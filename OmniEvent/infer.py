@@ -1,89 +1,56 @@
-import os
-import json
-
-import torch.cuda
-
-from .arguments import (
-    ArgumentParser,
-    ModelArguments,
-    DataArguments,
-    TrainingArguments
-)
-from .model.model import get_model_cls
-from .input_engineering.whitespace_tokenizer import WhitespaceTokenizer
-from .utils import check_web_and_convert_path
-from transformers import (
-    BertTokenizerFast,
-    RobertaTokenizerFast,
-    T5TokenizerFast,
-    MT5TokenizerFast,
-    BartTokenizerFast
+from .engine import (
+    AttrDict,
+    TOKENIZER_NAME_TO_CLS,
+    SCHEMAS,
+    InferenceEngine,
+    get_tokenizer,
+    get_model,
+    build_model,
+    get_paradigm,
+    load_pretrained,
+    load_onnx_pretrained,
+    load_int8_pretrained,
+    model_registry,
+    onnx_registry,
+    int8_registry,
+    get_pretrained,
+    get_device,
+    check_triggers,
+    get_task_models
 )
-from .infer_module.seq2seq import (
-    do_event_detection,
-    do_event_argument_extraction,
-    get_ed_result,
-    get_eae_result,
-    prepare_for_eae_from_input,
-    prepare_for_eae_from_pred
-)
-
-
-class AttrDict(dict):
-    def __init__(self, *args, **kwargs):
-        super(AttrDict, self).__init__(*args, **kwargs)
-        self.__dict__ = self
-
-
-TOKENIZER_NAME_TO_CLS = {
-    "BertTokenizer": BertTokenizerFast,
-    "RobertaTokenizer": RobertaTokenizerFast,
-    "T5Tokenizer": T5TokenizerFast,
-    "MT5Tokenizer": MT5TokenizerFast,
-    "BartTokenizer": BartTokenizerFast
-}
-
-
-def get_tokenizer(tokenizer_name_or_path):
-    path = check_web_and_convert_path(tokenizer_name_or_path, "tokenizer")
-    tokenizer_config = json.load(open(os.path.join(path, "tokenizer_config.json")))
-    tokenizer_cls = TOKENIZER_NAME_TO_CLS[tokenizer_config["tokenizer_class"]]
-    tokenizer = tokenizer_cls.from_pretrained(path)
-    return tokenizer
-
+from .infer_module.seq2seq import EDProcessor
+from .infer_module.encoder import is_encoder_model
+from .infer_module.window import split_documents, merge_documents
+from .infer_module.metrics import get_stats, reset_stats
+from .infer_module.cache import ResultCache
+from .infer_module.stream import StreamStages, stream_predictions, write_stream, pipelined_event_extraction
 
-def get_model(model_args, model_name_or_path):
-    path = check_web_and_convert_path(model_name_or_path, "model")
-    model = get_model_cls(model_args).from_pretrained(path)
-    return model
 
+def infer(text, model=None, tokenizer=None, triggers=None, schema="ace", task="ED", device='auto', dtype=None,
+          backend="torch", quantize=None, cache=None):
+    """Infer method.
 
-def get_pretrained(model_name_or_path, device):
-    # config 
-    # parser = ArgumentParser((ModelArguments, DataArguments, TrainingArguments))
-    # model_args, data_args, training_args = parser.from_pretrained(model_name_or_path)
-    # model
-    model_args = AttrDict({
-        "paradigm": "seq2seq",
-        "model_type": "mt5"
-    })
-    model = get_model(model_args, model_name_or_path)
-    model = model.to(device)
-    # model.cuda()
-    # tokenizer 
-    tokenizer = get_tokenizer(model_name_or_path)
-
-    return model, tokenizer
+    Pretrained models are loaded once per `(model, device, dtype)` and cached in `model_registry`; use
+    `model_registry.preload()` to warm up and `model_registry.evict()` to release them.
 
-
-def infer(text, model=None, tokenizer=None, triggers=None, schema="ace", task="ED", device='auto'):
-    """Infer method.
+    Besides the seq2seq mT5 models, token classification, sequence labeling and MRC checkpoints trained with
+    `examples/ED` and `examples/EAE` can be used by passing their path (with `args.yaml`) as `model`. They decode
+    with a single encoder pass instead of beam search.
 
     Args:
         text (`str`): Input plain text.
+        model (`Union[str, Model, List]`, *optional*): Model or checkpoint path; one per stage `[ED, EAE]` for EE.
         triggers (`List[List]`, *optional*): List of triggers in the text. Only useful for EAE. Examples: [(moving, 2, 8), ...]
         schema (`str`): Schema used for ED and EAE. Selected in ['ace', 'kbp', 'ere', 'maven', 'leven', 'duee', 'fewfc']
         task (`str`): Task type. Selected in ['ED', 'EAE', 'EE']
+        device (`str`): Device to run on. `'auto'` selects cuda if available.
+        dtype (`torch.dtype`, *optional*): Data type the pretrained models are cast to, e.g. `torch.float16`.
+        backend (`str`): Runtime of the pretrained models. Selected in ['torch', 'onnx']. `'onnx'` runs on cpu with
+            ONNX Runtime and exports the checkpoints on first use.
+        quantize (`str`, *optional*): Set to `'int8'` to run the pretrained models with dynamic int8 quantization
+            on cpu. The quantized weights are cached next to the checkpoints, so only the first load quantizes.
+        cache (`ResultCache`, *optional*): Cache of results. Repeated texts are served from the cache, and identical
+            texts inferred concurrently from several threads are only computed once.
     
     Returns:
         results (`List`): Predicted results. The format is 
@@ -107,48 +74,133 @@ def infer(text, model=None, tokenizer=None, triggers=None, schema="ace", task="E
             } 
         ]
     """
-    assert schema in ['ace', 'kbp', 'ere', 'maven', 'leven', 'duee', 'fewfc']
+    assert schema in SCHEMAS
     assert task in ['ED', 'EAE', 'EE']
     schema = f"<{schema}>"
-    # get device.
-    if device == 'auto':
-        device = torch.device("cpu")
-        if torch.cuda.is_available():
-            device = 'cuda'
-    else:
-        device = torch.device(device)
-
-    if task == "ED":
-        if model is None or tokenizer is None:
-            ed_model, ed_tokenizer = get_pretrained("s2s-mt5-ed", device)
-        else:
-            ed_model, ed_tokenizer = model, tokenizer
-        events = do_event_detection(ed_model, ed_tokenizer, [text], [schema], device)
-        results = get_ed_result([text], events)
-    elif task == "EAE":
-        if model is None or tokenizer is None:
-            eae_model, eae_tokenizer = get_pretrained("s2s-mt5-eae", device)
-        else:
-            eae_model, eae_tokenizer = model, tokenizer
-        instances = prepare_for_eae_from_input([text], [triggers], [schema])
-        arguments = do_event_argument_extraction(eae_model, eae_tokenizer, instances)
-        results = get_eae_result(instances, arguments)
-    elif task == "EE":
-        if model is None or tokenizer is None:
-            ed_model, ed_tokenizer = get_pretrained("s2s-mt5-ed", device)
-            eae_model, eae_tokenizer = get_pretrained("s2s-mt5-eae", device)
-        else:
-            ed_model, ed_tokenizer = model[0], tokenizer[0]
-            eae_model, eae_tokenizer = model[1], tokenizer[1]
-        events = do_event_detection(ed_model, ed_tokenizer, [text], [schema], device)
-        instances = prepare_for_eae_from_pred([text], events, [schema])
-        if len(instances[0]["triggers"]) == 0:
-            results = [{
-                "text": instances[0]["text"],
-                "events": []
-            }]
-            return results
-        arguments = do_event_argument_extraction(eae_model, eae_tokenizer, instances, device)
-        results = get_eae_result(instances, arguments)
+    engine = InferenceEngine.for_task(task, model, tokenizer, device, dtype, backend, quantize, cache=cache)
+    results = [engine.predict_text(text, schema, task, triggers)]
     print(results)
     return results
+
+
+def infer_batch(texts, schemas="ace", task="ED", batch_size=32, max_tokens=None, model=None, tokenizer=None,
+                triggers=None, device='auto', dtype=None, pipelined=False, chunk_size=64, backend="torch",
+                quantize=None):
+    """Batched infer method.
+
+    Inputs are sorted by token length and grouped into batches of at most `batch_size` inputs and `max_tokens` padded
+    tokens, so that `generate` runs once per batch. Results are returned in the order of `texts`.
+
+    Args:
+        texts (`List[str]`): Input plain texts.
+        schemas (`Union[str, List[str]]`): Schema of all texts, or one schema per text. Selected in ['ace', 'kbp',
+            'ere', 'maven', 'leven', 'duee', 'fewfc']
+        task (`str`): Task type. Selected in ['ED', 'EAE', 'EE']
+        batch_size (`int`): Maximum number of inputs per batch. For EAE and EE an input is a (text, trigger) pair.
+        max_tokens (`int`, *optional*): Maximum number of tokens per batch, counted after padding.
+        triggers (`List[List[List]]`, *optional*): Triggers of every text. Only useful for EAE.
+        pipelined (`bool`): Only useful for EE. Whether to run ED on the next chunk of `chunk_size` texts while EAE
+            processes the current one, instead of running ED on all texts first.
+        backend (`str`): Runtime of the pretrained models. Selected in ['torch', 'onnx'].
+        quantize (`str`, *optional*): Set to `'int8'` for dynamically quantized pretrained models on cpu.
+
+    Returns:
+        results (`List`): Predicted results, one per text, in the format of `infer`.
+    """
+    if isinstance(schemas, str):
+        schemas = [schemas] * len(texts)
+    assert len(schemas) == len(texts)
+    assert all(schema in SCHEMAS for schema in schemas)
+    assert task in ['ED', 'EAE', 'EE']
+    if task == "EAE":
+        check_triggers(texts, triggers)
+    schemas = [f"<{schema}>" for schema in schemas]
+    engine = InferenceEngine.for_task(task, model, tokenizer, device, dtype, backend, quantize,
+                                      batch_size=batch_size, max_tokens=max_tokens)
+
+    if task == "EE" and pipelined:
+        return pipelined_event_extraction(engine, texts, schemas, chunk_size)
+    return engine.predict(texts, schemas, task, triggers)
+
+
+def infer_documents(texts, schemas="ace", task="ED", window_size=None, window_overlap=32, batch_size=32,
+                    max_tokens=None, model=None, tokenizer=None, triggers=None, device='auto', dtype=None,
+                    backend="torch", quantize=None):
+    """Infer method for long documents.
+
+    Instead of truncating every text to the maximum input length of the model, each document is split into windows of
+    whole words that overlap by `window_overlap` tokens. The windows of all documents are batched together, and their
+    predictions are merged by char offset: duplicates from the overlaps are removed, and if windows disagree the
+    prediction farthest from a window border is kept. Works for seq2seq and encoder-only models.
+
+    Args:
+        texts (`List[str]`): Input documents.
+        window_size (`int`, *optional*): Maximum number of tokens per window. Defaults to the maximum input length of
+            the model minus room for the schema prefix and markers.
+        window_overlap (`int`): Maximum number of tokens shared by consecutive windows.
+        Other arguments are the same as `infer_batch`.
+
+    Returns:
+        results (`List`): Predicted results, one per document, in the format of `infer`.
+    """
+    if isinstance(schemas, str):
+        schemas = [schemas] * len(texts)
+    assert len(schemas) == len(texts)
+    assert all(schema in SCHEMAS for schema in schemas)
+    assert task in ['ED', 'EAE', 'EE']
+    if task == "EAE":
+        check_triggers(texts, triggers)
+    schemas = [f"<{schema}>" for schema in schemas]
+    engine = InferenceEngine.for_task(task, model, tokenizer, device, dtype, backend, quantize,
+                                      batch_size=batch_size, max_tokens=max_tokens)
+    first_model, first_tokenizer = (engine.eae_model, engine.eae_tokenizer) if task == "EAE" else \
+        (engine.ed_model, engine.ed_tokenizer)
+    if is_encoder_model(first_model):
+        languages = [first_model.language] * len(texts)
+        max_seq_length = first_model.max_seq_length
+    else:
+        languages = ["Chinese" if schema in ["<duee>", "<fewfc>", "<leven>"] else "English" for schema in schemas]
+        max_seq_length = EDProcessor(first_tokenizer).max_seq_length
+    if window_size is None:
+        window_size = max_seq_length - 16
+    assert window_overlap < window_size
+    all_windows, window_texts, owners, window_triggers = split_documents(first_tokenizer, texts, languages,
+                                                                         window_size, window_overlap,
+                                                                         triggers if task == "EAE" else None)
+    window_results = engine.predict(window_texts, [schemas[owner] for owner in owners], task, window_triggers)
+    return merge_documents(texts, all_windows, owners, window_results)
+
+
+def infer_stream(source, out_path=None, schema="ace", task="ED", batch_size=32, max_tokens=None, model=None,
+                 tokenizer=None, device='auto', dtype=None, checkpoint_path=None, chunk_size=256, queue_size=2,
+                 backend="torch", quantize=None):
+    """Streaming infer method for corpora that do not fit into memory.
+
+    Reads unified-format jsonl lazily and runs read -> ED -> EAE as a pipeline of threads connected by bounded queues,
+    so memory stays constant regardless of the corpus size. The models run through an `InferenceEngine`. Items with
+    a `source` field use it as schema; EAE uses the triggers in `events`.
+
+    Args:
+        source (`Union[str, Iterable]`): Path to a jsonl file, or an iterable of items (dicts, json strings or texts).
+        out_path (`str`, *optional*): Output jsonl path. If given, results are written there and the number of
+            consumed input lines is returned. Otherwise a generator of results is returned.
+        schema (`str`): Schema of items without `source`. Selected in ['ace', 'kbp', 'ere', 'maven', 'leven', 'duee', 'fewfc']
+        task (`str`): Task type. Selected in ['ED', 'EAE', 'EE']
+        checkpoint_path (`str`, *optional*): Only used with `out_path`. Progress is saved there after every chunk
+            and an existing checkpoint resumes an interrupted run. Defaults to `out_path + ".ckpt"`.
+        chunk_size (`int`): Number of lines that are length-bucketed and batched together.
+        queue_size (`int`): Number of chunks buffered between two stages.
+        backend (`str`): Runtime of the pretrained models. Selected in ['torch', 'onnx'].
+        quantize (`str`, *optional*): Set to `'int8'` for dynamically quantized pretrained models on cpu.
+    """
+    assert schema in SCHEMAS
+    assert task in ['ED', 'EAE', 'EE']
+    engine = InferenceEngine.for_task(task, model, tokenizer, device, dtype, backend, quantize,
+                                      batch_size=batch_size, max_tokens=max_tokens)
+    stages = StreamStages(task, engine, f"<{schema}>")
+    if out_path is None:
+        return (result for _, results in stream_predictions(source, stages, 0, chunk_size, queue_size)
+                for result in results)
+    if checkpoint_path is None:
+        checkpoint_path = out_path + ".ckpt"
+    return write_stream(source, out_path, stages, checkpoint_path, chunk_size, queue_size)
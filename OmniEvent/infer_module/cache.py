@@ -0,0 +1,262 @@
+import os
+import re
+import copy
+import json
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Chinese schemas are split into characters including whitespace, so their texts are used as they are
+CHINESE_SCHEMAS = ["<duee>", "<fewfc>", "<leven>"]
+
+metrics.describe("cache_lookups_total", "Result cache lookups by outcome.")
+
+
+def get_alignment(text: str) -> Tuple[str, List[int]]:
+    """Collapses every run of whitespace of `text` into a single space and strips trailing whitespace.
+
+    Leading whitespace is kept as one space, because the schema prefix is glued to the first word of a text that does
+    not start with whitespace.
+
+    Returns:
+        The normalized text and, for every char of it, the index of the corresponding char in `text`.
+    """
+    chars, positions = [], []
+    if text[:1].isspace():
+        chars.append(" ")
+        positions.append(0)
+    for match in re.finditer(r"\S+", text):
+        if len(chars) > 0 and chars[-1] != " ":
+            chars.append(" ")
+            positions.append(match.start() - 1)
+        chars.extend(match.group())
+        positions.extend(range(match.start(), match.end()))
+    return "".join(chars), positions
+
+
+def map_result(result: Dict, text: str, mapping: Callable[[int], Optional[int]]) -> Optional[Dict]:
+    """Maps the offsets of a result to another text with `mapping`, which maps char indices and returns `None` for
+    chars that have no counterpart. Returns `None` if any offset cannot be mapped."""
+    def map_offset(offset):
+        start, end = mapping(offset[0]), mapping(offset[1] - 1)
+        return None if start is None or end is None else [start, end + 1]
+
+    events = []
+    for event in result["events"]:
+        offset = map_offset(event["offset"])
+        if offset is None:
+            return None
+        event = dict(event, offset=offset)
+        if "arguments" in event:
+            arguments = []
+            for argument in event["arguments"]:
+                argument_offset = map_offset(argument["offset"])
+                if argument_offset is None:
+                    return None
+                arguments.append(dict(argument, offset=argument_offset))
+            event["arguments"] = arguments
+        events.append(event)
+    return {"text": text, "events": events}
+
+
+def get_model_fingerprint(model) -> Tuple[str, bool]:
+    """Identifies the weights of a model.
+
+    Models loaded with `from_pretrained` are identified by their class, checkpoint path, the modification time of the
+    checkpoint and their dtype, so fingerprints stay valid across processes. Other models are identified by their
+    object id, which is only valid in this process.
+
+    Returns:
+        The fingerprint and whether it may be persisted.
+    """
+    if model is None:
+        return "", True
+    name = getattr(model, "name_or_path", None) or getattr(getattr(model, "config", None), "_name_or_path", None)
+    if not name:
+        return "%s@%x" % (type(model).__name__, id(model)), False
+    mtime = os.path.getmtime(name) if os.path.exists(name) else ""
+    return "%s:%s:%s:%s" % (type(model).__name__, name, mtime, getattr(model, "dtype", "")), True
+
+
+class ResultCache(object):
+    """Content-addressed cache of inference results with request coalescing.
+
+    Results are keyed by a hash of the normalized text, schema, task, triggers and model fingerprint. For non-Chinese
+    schemas the text is normalized by collapsing whitespace, which the models split on anyway, and the offsets of a
+    cached result are mapped back onto the exact text of every request. Identical requests that arrive while a result
+    is being computed wait for that computation instead of starting their own.
+
+    Args:
+        max_entries (`int`, `optional`, defaults to 10000):
+            Size of the in-memory LRU tier.
+        path (`str`, `optional`):
+            Path of a sqlite file used as a second, persistent tier. Only memory is used if not given.
+    """
+
+    def __init__(self, max_entries: int = 10000, path: Optional[str] = None) -> None:
+        self.max_entries = max_entries
+        self.path = path
+        self.memory = OrderedDict()
+        self.in_flight = {}
+        self.lookups = {outcome: 0 for outcome in ["memory_hit", "disk_hit", "coalesced", "miss"]}
+        self.lock = threading.Lock()
+        self.db = None
+        if path is not None:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT)")
+            self.db.commit()
+
+    @staticmethod
+    def normalize(text: str, schema: str) -> str:
+        return text if schema in CHINESE_SCHEMAS else get_alignment(text)[0]
+
+    def make_key(self, text: str, schema: str, task: str, models: List, triggers: Optional[List] = None,
+                 **options) -> Tuple[str, bool]:
+        """Returns the key of a request and whether its result may be persisted to disk."""
+        fingerprints = [get_model_fingerprint(model) for model in models]
+        content = [self.normalize(text, schema), schema, task, [fingerprint for fingerprint, _ in fingerprints],
+                   [list(trigger) for trigger in triggers] if triggers is not None else None, sorted(options.items())]
+        key = hashlib.sha256(json.dumps(content, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+        return key, all(persistent for _, persistent in fingerprints)
+
+    def to_cached(self, result: Dict, text: str, schema: str) -> Optional[Dict]:
+        if schema in CHINESE_SCHEMAS:
+            return copy.deepcopy(result)
+        normalized, positions = get_alignment(text)
+        inverse = {position: i for i, position in enumerate(positions)}
+        return map_result(result, normalized, inverse.get)
+
+    def from_cached(self, cached: Dict, text: str, schema: str) -> Dict:
+        if schema in CHINESE_SCHEMAS or cached["text"] == text:
+            return copy.deepcopy(dict(cached, text=text))
+        _, positions = get_alignment(text)
+        return copy.deepcopy(map_result(cached, text, lambda i: positions[i]))
+
+    def _record(self, outcome: str) -> None:
+        self.lookups[outcome] += 1
+        metrics.inc("cache_lookups_total", outcome=outcome)
+
+    def lookup(self, key: str) -> Optional[Dict]:
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self._record("memory_hit")
+                return self.memory[key]
+            if self.db is not None:
+                row = self.db.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    value = json.loads(row[0])
+                    self._put_memory(key, value)
+                    self._record("disk_hit")
+                    return value
+        return None
+
+    def _put_memory(self, key: str, value: Dict) -> None:
+        self.memory[key] = value
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def put(self, key: str, value: Dict, persistent: bool = True) -> None:
+        with self.lock:
+            self._put_memory(key, value)
+            if self.db is not None and persistent:
+                self.db.execute("INSERT OR REPLACE INTO results (key, value) VALUES (?, ?)",
+                                (key, json.dumps(value, ensure_ascii=False)))
+                self.db.commit()
+            metrics.set("cache_entries", len(self.memory), tier="memory")
+
+    def _claim(self, key: str) -> Tuple[Future, bool]:
+        with self.lock:
+            if key in self.in_flight:
+                self._record("coalesced")
+                return self.in_flight[key], False
+            self._record("miss")
+            future = self.in_flight[key] = Future()
+            return future, True
+
+    def _finish(self, key: str, persistent: bool, future: Future, result: Dict, text: str, schema: str) -> None:
+        cached = self.to_cached(result, text, schema)
+        if cached is not None:
+            self.put(key, cached, persistent)
+        with self.lock:
+            self.in_flight.pop(key, None)
+        future.set_result(cached)
+
+    def _fail(self, key: str, future: Future, error: BaseException) -> None:
+        with self.lock:
+            self.in_flight.pop(key, None)
+        if isinstance(error, asyncio.CancelledError):
+            # the client of the computing request went away, so the waiting requests compute on their own
+            future.set_result(None)
+        else:
+            future.set_exception(error)
+
+    def get_or_compute(self, key: Tuple[str, bool], text: str, schema: str, compute: Callable[[], Dict]) -> Dict:
+        """Returns the cached result of `key` for `text`, or computes it with `compute` exactly once among concurrent
+        callers (threads) with the same key.
+
+        Args:
+            key (`Tuple[str, bool]`): The key returned by `make_key`.
+            text (`str`): The exact text of the request.
+            schema (`str`): The schema of the request, e.g. "<ace>".
+            compute (`Callable`): Computes the result of the request for `text`.
+        """
+        key, persistent = key
+        cached = self.lookup(key)
+        if cached is not None:
+            return self.from_cached(cached, text, schema)
+        future, owner = self._claim(key)
+        if not owner:
+            cached = future.result()
+            return self.from_cached(cached, text, schema) if cached is not None else compute()
+        try:
+            result = compute()
+        except BaseException as e:
+            self._fail(key, future, e)
+            raise
+        self._finish(key, persistent, future, result, text, schema)
+        return result
+
+    async def get_or_compute_async(self, key: Tuple[str, bool], text: str, schema: str,
+                                   compute: Callable[[], Awaitable[Dict]]) -> Dict:
+        """Same as `get_or_compute` for coroutines, e.g. the requests of the server."""
+        key, persistent = key
+        cached = self.lookup(key)
+        if cached is not None:
+            return self.from_cached(cached, text, schema)
+        future, owner = self._claim(key)
+        if not owner:
+            cached = await asyncio.wrap_future(future)
+            return self.from_cached(cached, text, schema) if cached is not None else await compute()
+        try:
+            result = await compute()
+        except BaseException as e:
+            self._fail(key, future, e)
+            raise
+        self._finish(key, persistent, future, result, text, schema)
+        return result
+
+    def get_stats(self) -> Dict[str, float]:
+        """Returns the number of lookups by outcome, the hit rate and the number of entries in memory."""
+        lookups = dict(self.lookups)
+        total = sum(lookups.values())
+        hits = total - lookups["miss"]
+        return dict(lookups, hit_rate=hits / total if total > 0 else 0.0, entries=len(self.memory))
+
+    def clear(self) -> None:
+        with self.lock:
+            self.memory.clear()
+            if self.db is not None:
+                self.db.execute("DELETE FROM results")
+                self.db.commit()
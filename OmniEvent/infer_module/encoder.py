@@ -0,0 +1,353 @@
+import os
+import re
+import json
+
+import torch
+import torch.nn as nn
+
+from typing import Dict, List, Optional, Tuple
+
+from ..backbone.backbone import get_backbone
+from ..model.model import get_model
+from ..model.quantization import load_quantized
+from ..evaluation.convert_format import get_pred_per_mention
+from ..input_engineering.input_utils import get_bio_labels, get_words, char_pos_to_word_pos
+from ..input_engineering.mrc_processor import ED_MRC_QUERY
+from ..utils import FILE_NAMES
+
+
+ENCODER_PARADIGMS = ["token_classification", "sequence_labeling", "mrc"]
+MARKERS = ["<event>", "</event>"]
+
+
+class EncoderInferenceModel(nn.Module):
+    """An encoder-only (token classification, sequence labeling or MRC) model together with what is needed to decode
+    its predictions. Inference takes a single forward pass per batch instead of beam search.
+
+    Attributes:
+        model (`BaseModel`):
+            The `ModelForTokenClassification` or `ModelForSequenceLabeling` to run.
+        paradigm (`str`):
+            Paradigm of the model. Selected in ['token_classification', 'sequence_labeling', 'mrc'].
+        task (`str`):
+            Task of the model. Selected in ['ED', 'EAE'].
+        label2id (`Dict[str, int]`), id2label (`Dict[int, str]`):
+            The event types (ED) or argument roles (EAE) of the model; BIO labels for sequence labeling.
+        language (`str`):
+            Language of the inputs, English or Chinese.
+        max_seq_length (`int`):
+            Maximum number of tokens of an input.
+        insert_marker (`bool`):
+            Whether token classification marks the candidate trigger with `MARKERS`.
+        head_type (`str`):
+            Head of the model. A "crf" head returns label ids instead of logits.
+    """
+
+    def __init__(self, model, paradigm, task, label2id, language="English", max_seq_length=160, insert_marker=True,
+                 head_type="linear") -> None:
+        """Constructs an `EncoderInferenceModel`."""
+        super(EncoderInferenceModel, self).__init__()
+        self.model = model
+        self.paradigm = paradigm
+        self.task = task
+        self.label2id = label2id
+        self.id2label = {id: label for label, id in label2id.items()}
+        self.language = language
+        self.max_seq_length = max_seq_length
+        self.insert_marker = insert_marker
+        self.head_type = head_type
+
+    def forward(self, **inputs) -> Dict[str, torch.Tensor]:
+        return self.model(**inputs)
+
+
+def is_encoder_model(model) -> bool:
+    return isinstance(model, EncoderInferenceModel)
+
+
+def get_label2id(path, data_args, paradigm, task):
+    """Loads the labels of a checkpoint, from `type2id.json`/`role2id.json` in the checkpoint directory if present and
+    from the paths in `args.yaml` otherwise."""
+    name = "type2id" if task == "ED" else "role2id"
+    label_path = os.path.join(path, f"{name}.json")
+    if not os.path.exists(label_path):
+        label_path = getattr(data_args, f"{name}_path")
+    label2id = json.load(open(label_path, encoding="utf-8"))
+    if paradigm == "sequence_labeling":
+        label2id = get_bio_labels(label2id)
+    return label2id
+
+
+def load_encoder_pretrained(path, model_args, data_args, training_args, device, dtype=None, quantize=None):
+    """Loads an encoder-only checkpoint trained with `examples/ED` or `examples/EAE`.
+
+    Args:
+        path (`str`):
+            The checkpoint directory, holding `args.yaml`, `pytorch_model.bin` and optionally the tokenizer and
+            `type2id.json`/`role2id.json`.
+        model_args, data_args, training_args:
+            The arguments parsed from `args.yaml`.
+
+    Returns:
+        The `EncoderInferenceModel` and its tokenizer.
+    """
+    paradigm, task = model_args.paradigm, training_args.task_name
+    assert paradigm in ENCODER_PARADIGMS
+    if (task, paradigm) in [("EAE", "token_classification"), ("EAE", "mrc")]:
+        raise NotImplementedError("%s inference is not supported for the %s paradigm." % (task, paradigm))
+    label2id = get_label2id(path, data_args, paradigm, task)
+    model_args.num_labels = len(label2id)
+    has_tokenizer = any(os.path.exists(os.path.join(path, name)) for name in FILE_NAMES["tokenizer"])
+    backbone, tokenizer, _ = get_backbone(model_args.model_type, model_args.model_name_or_path,
+                                          path if has_tokenizer else model_args.model_name_or_path,
+                                          MARKERS, model_args, new_tokens=MARKERS)
+    model = get_model(model_args, backbone, task)
+    weights_path = os.path.join(path, FILE_NAMES["model"][0])
+
+    def load_model():
+        model.load_state_dict(torch.load(weights_path, map_location="cpu"), strict=False)
+        return model
+
+    if quantize is not None:
+        model = load_quantized(lambda: model, load_model, path, quantize)
+    else:
+        model = load_model()
+    model = EncoderInferenceModel(model, paradigm, task, label2id, data_args.language, data_args.max_seq_length,
+                                  data_args.insert_marker, model_args.head_type).to(device)
+    if dtype is not None and quantize is None:
+        model = model.to(dtype)
+    return model, tokenizer
+
+
+def get_word_offsets(text: str, language: str) -> List[Tuple[int, int]]:
+    """Returns the character offsets of the words returned by `get_words`."""
+    if language == "English":
+        return [match.span() for match in re.finditer(r"\S+", text)]
+    return [(i, i + 1) for i in range(len(text))]
+
+
+def tokenize_mrc_words(model, tokenizer, batch_words, device):
+    """Tokenizes ED inputs of an MRC model as `EDMRCProcessor` does: the query with token type 0, followed by the text
+    with token type 1, cut to `max_seq_length` tokens in total. The word ids of the query tokens are `None`."""
+    query = tokenizer(ED_MRC_QUERY, truncation=False, is_split_into_words=True)["input_ids"]
+    max_text_length = model.max_seq_length - len(query)
+    texts = tokenizer(batch_words, truncation=False, is_split_into_words=True)
+    all_input_ids, word_ids = [], []
+    for i in range(len(batch_words)):
+        all_input_ids.append(query + texts["input_ids"][i][:max_text_length])
+        word_ids.append([None] * len(query) + texts.word_ids(i)[:max_text_length])
+    width = max(len(input_ids) for input_ids in all_input_ids)
+    inputs = dict(
+        input_ids=[input_ids + [tokenizer.pad_token_id] * (width - len(input_ids)) for input_ids in all_input_ids],
+        attention_mask=[[1] * len(input_ids) + [0] * (width - len(input_ids)) for input_ids in all_input_ids],
+        token_type_ids=[[0] * len(query) + [1] * (width - len(query)) for _ in all_input_ids]
+    )
+    return {key: torch.tensor(value, dtype=torch.long).to(device) for key, value in inputs.items()}, word_ids
+
+
+def tokenize_words(model, tokenizer, batch_words, device):
+    if model.paradigm == "mrc":
+        return tokenize_mrc_words(model, tokenizer, batch_words, device)
+    inputs = tokenizer(batch_words,
+                       padding=True,
+                       truncation=True,
+                       max_length=model.max_seq_length,
+                       is_split_into_words=True,
+                       return_tensors="pt")
+    word_ids = [inputs.word_ids(i) for i in range(len(batch_words))]
+    inputs = {key: value.to(device) for key, value in inputs.items()
+              if key in ["input_ids", "attention_mask", "token_type_ids"]}
+    return inputs, word_ids
+
+
+def predict_word_labels(model, tokenizer, all_words, device, batch_size=32) -> List[List[int]]:
+    """Runs a sequence labeling model and returns the label id of the first token of every word.
+
+    Tokens are aligned to words by the `word_ids` of the fast tokenizer. Words without tokens, because the tokenizer
+    drops them or they are truncated, get the outside label ("O" or "NA").
+    """
+    outside_id = model.label2id.get("O", model.label2id.get("NA", 0))
+    all_preds = []
+    for start in range(0, len(all_words), batch_size):
+        batch_words = all_words[start:start+batch_size]
+        inputs, word_ids = tokenize_words(model, tokenizer, batch_words, device)
+        with torch.no_grad():
+            logits = model(**inputs)["logits"]
+        preds = logits if model.head_type == "crf" else logits.argmax(-1)
+        preds = preds.tolist()
+        for i, words in enumerate(batch_words):
+            word_preds = [outside_id] * len(words)
+            pre_word_id = None
+            for pos, word_id in enumerate(word_ids[i]):
+                if word_id is not None and word_id != pre_word_id:
+                    word_preds[word_id] = preds[i][pos]
+                pre_word_id = word_id
+            all_preds.append(word_preds)
+    return all_preds
+
+
+def get_spans(word_preds: List[int], model) -> List[Tuple[int, int, str]]:
+    """Groups word-level predictions into `(word start, word end, label)` spans and keeps those that
+    `get_pred_per_mention` accepts."""
+    paradigm = "sl" if model.paradigm == "sequence_labeling" else "mrc"
+    id2label = model.id2label
+    spans = []
+    i = 0
+    while i < len(word_preds):
+        label = id2label[int(word_preds[i])]
+        if paradigm == "sl":
+            if not label.startswith("B-"):
+                i += 1
+                continue
+            inside = "I-" + label[2:]
+        else:
+            if label in ["NA", "O"]:
+                i += 1
+                continue
+            inside = label
+        end = i + 1
+        while end < len(word_preds) and id2label[int(word_preds[end])] == inside:
+            end += 1
+        pred = get_pred_per_mention(i, end, word_preds, id2label, paradigm=paradigm, task=model.task)
+        if pred not in ["NA", "O"]:
+            spans.append((i, end, pred))
+        i = end
+    return spans
+
+
+def get_candidate_inputs(model, tokenizer, text, left, right):
+    """Tokenizes a trigger candidate for token classification as `EDTCProcessor` does."""
+    if model.insert_marker:
+        space = "" if model.language == "Chinese" else " "
+        marked_text = text[:left] + MARKERS[0] + space + text[left:right] + space + MARKERS[1] + text[right:]
+        outputs = tokenizer(marked_text, truncation=True, max_length=model.max_seq_length)
+        input_ids = outputs["input_ids"]
+        marker_ids = tokenizer.convert_tokens_to_ids(MARKERS)
+        if marker_ids[0] not in input_ids or marker_ids[1] not in input_ids:
+            return None
+        trigger_left, trigger_right = input_ids.index(marker_ids[0]), input_ids.index(marker_ids[1])
+    else:
+        words = text.split()
+        outputs = tokenizer(words, truncation=True, max_length=model.max_seq_length, is_split_into_words=True)
+        word_left, word_right = char_pos_to_word_pos(text, [left, right])
+        positions = [pos for pos, word_id in enumerate(outputs.word_ids()) if word_id is not None
+                     and word_left <= word_id < word_right]
+        if len(positions) == 0:
+            return None
+        trigger_left, trigger_right = positions[0], positions[-1]
+    if "token_type_ids" not in outputs:
+        outputs["token_type_ids"] = [0] * len(outputs["input_ids"])
+    return dict(input_ids=outputs["input_ids"],
+                attention_mask=outputs["attention_mask"],
+                token_type_ids=outputs["token_type_ids"],
+                trigger_left=trigger_left,
+                trigger_right=trigger_right)
+
+
+def classify_candidates(model, tokenizer, texts, device, batch_size=32) -> List[List[Dict]]:
+    """Event detection with token classification: every word of a text is classified as a trigger candidate."""
+    candidates = []
+    for i, text in enumerate(texts):
+        for left, right in get_word_offsets(text, model.language):
+            features = get_candidate_inputs(model, tokenizer, text, left, right)
+            if features is not None:
+                candidates.append((i, left, right, features))
+    events = [[] for _ in texts]
+    for start in range(0, len(candidates), batch_size):
+        batch = candidates[start:start+batch_size]
+        inputs = tokenizer.pad({key: [features[key] for *_, features in batch]
+                                for key in ["input_ids", "attention_mask", "token_type_ids"]},
+                               return_tensors="pt")
+        inputs = {key: value.to(device) for key, value in inputs.items()}
+        inputs["trigger_left"] = torch.tensor([features["trigger_left"] for *_, features in batch], device=device)
+        inputs["trigger_right"] = torch.tensor([features["trigger_right"] for *_, features in batch], device=device)
+        with torch.no_grad():
+            preds = model(**inputs)["logits"].argmax(-1).tolist()
+        for (i, left, right, _), pred in zip(batch, preds):
+            label = model.id2label[pred]
+            if label != "NA":
+                events[i].append({"type": label, "trigger": texts[i][left:right], "offset": [left, right]})
+    return events
+
+
+def do_event_detection_encoder(model, tokenizer, texts, device, batch_size=32) -> List[List[Dict]]:
+    """Event detection with an encoder-only model. Returns the events of every text in the format of `infer`."""
+    if model.paradigm == "token_classification":
+        return classify_candidates(model, tokenizer, texts, device, batch_size)
+    all_words = [get_words(text, model.language) for text in texts]
+    all_preds = predict_word_labels(model, tokenizer, all_words, device, batch_size)
+    events = []
+    for text, word_preds in zip(texts, all_preds):
+        offsets = get_word_offsets(text, model.language)
+        events_in_text = []
+        for start, end, label in get_spans(word_preds, model):
+            left, right = offsets[start][0], offsets[end - 1][1]
+            events_in_text.append({"type": label, "trigger": text[left:right], "offset": [left, right]})
+        events.append(events_in_text)
+    return events
+
+
+def do_event_argument_extraction_encoder(model, tokenizer, instances, device, batch_size=32) -> List[List[Dict]]:
+    """Event argument extraction with a sequence labeling model, marking each trigger as `EAESLProcessor` does.
+
+    Returns the arguments of every trigger, flattened over `instances`.
+    """
+    all_words, all_triggers, all_offsets = [], [], []
+    for instance in instances:
+        words = get_words(instance["text"], model.language)
+        offsets = get_word_offsets(instance["text"], model.language)
+        for trigger in instance["triggers"]:
+            left, right = char_pos_to_word_pos(instance["text"], trigger["offset"], model.language, True)
+            all_words.append(words[:left] + [MARKERS[0]] + words[left:right] + [MARKERS[1]] + words[right:])
+            all_triggers.append((left, right))
+            all_offsets.append((instance["text"], offsets))
+    all_preds = predict_word_labels(model, tokenizer, all_words, device, batch_size)
+    arguments = []
+    for (left, right), (text, offsets), preds in zip(all_triggers, all_offsets, all_preds):
+        # drop the predictions of the markers
+        word_preds = preds[:left] + preds[left+1:right+1] + preds[right+2:]
+        arguments_of_trigger = []
+        for start, end, role in get_spans(word_preds, model):
+            char_left, char_right = offsets[start][0], offsets[end - 1][1]
+            arguments_of_trigger.append({
+                "mention": text[char_left:char_right],
+                "offset": [char_left, char_right],
+                "role": role
+            })
+        arguments.append(arguments_of_trigger)
+    return arguments
+
+
+def prepare_for_eae_from_events(texts, events, schemas) -> List[Dict]:
+    """Builds EAE instances from the output of `do_event_detection_encoder`, keeping the predicted offsets."""
+    instances = []
+    for text, events_in_text, schema in zip(texts, events, schemas):
+        instances.append({
+            "text": text,
+            "schema": schema,
+            "triggers": [{"type": event["type"], "mention": event["trigger"], "offset": event["offset"]}
+                         for event in events_in_text]
+        })
+    return instances
+
+
+def get_encoder_ed_result(texts, events) -> List[Dict]:
+    return [{"text": text, "events": events_in_text} for text, events_in_text in zip(texts, events)]
+
+
+def get_encoder_eae_result(instances, arguments) -> List[Dict]:
+    results = []
+    start = 0
+    for instance in instances:
+        arguments_in_instance = arguments[start:start+len(instance["triggers"])]
+        start += len(instance["triggers"])
+        events = []
+        for trigger, event_arguments in zip(instance["triggers"], arguments_in_instance):
+            events.append({
+                "type": trigger["type"] if "type" in trigger else "NA",
+                "offset": trigger["offset"],
+                "trigger": trigger["mention"],
+                "arguments": event_arguments
+            })
+        results.append({"text": instance["text"], "events": events})
+    return results
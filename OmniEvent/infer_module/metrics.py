@@ -0,0 +1,200 @@
+import os
+import time
+import threading
+import functools
+
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# seconds, following the default buckets of the Prometheus client libraries
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+RATIO_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+
+
+class Histogram(object):
+    """A Prometheus-style histogram that also keeps the most recent values for exact percentiles.
+
+    Args:
+        buckets (`Tuple[float]`): Upper bounds of the buckets. An infinite bucket is always added.
+        window (`int`, `optional`, defaults to 1024): Number of recent values kept for `get_stats`.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...], window: int = 1024) -> None:
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+
+    def get_stats(self) -> Dict[str, float]:
+        recent = sorted(self.recent)
+        stats = {"count": self.count, "sum": self.sum, "mean": self.sum / self.count if self.count > 0 else 0.0}
+        for name, q in [("p50", 0.5), ("p90", 0.9), ("p99", 0.99)]:
+            stats[name] = recent[min(int(q * len(recent)), len(recent) - 1)] if len(recent) > 0 else 0.0
+        stats["max"] = recent[-1] if len(recent) > 0 else 0.0
+        return stats
+
+
+def format_labels(labels: Tuple[Tuple[str, str], ...], **extra) -> str:
+    labels = list(labels) + list(extra.items())
+    if len(labels) == 0:
+        return ""
+    return "{" + ",".join('%s="%s"' % (key, value) for key, value in labels) + "}"
+
+
+class Metrics(object):
+    """Thread-safe registry of histograms, counters and gauges of the inference pipeline.
+
+    Every metric is identified by a name and a set of labels, e.g. the histogram `stage_seconds` with the label
+    `stage="generate"`. Set the environment variable `OMNIEVENT_METRICS=0` to turn recording off.
+
+    Args:
+        prefix (`str`, `optional`, defaults to "omnievent"):
+            Prefix of the metric names in the Prometheus text format.
+    """
+
+    def __init__(self, prefix: str = "omnievent") -> None:
+        self.prefix = prefix
+        self.enabled = os.environ.get("OMNIEVENT_METRICS", "1") != "0"
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self.buckets = {}
+        self.descriptions = {}
+
+    def describe(self, name: str, description: str, buckets: Optional[Tuple[float, ...]] = None) -> None:
+        """Sets the help text and, for histograms, the buckets of a metric."""
+        self.descriptions[name] = description
+        if buckets is not None:
+            self.buckets[name] = buckets
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """Records a value of the histogram `name`."""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(self.buckets.get(name, LATENCY_BUCKETS))
+            self.histograms[key].observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """Increments the counter `name`."""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        """Sets the gauge `name`."""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    @contextmanager
+    def timer(self, stage: str, **labels) -> Iterator[None]:
+        """Records the wall time of the enclosed block in the histogram `stage_seconds`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("stage_seconds", time.perf_counter() - start, stage=stage, **labels)
+
+    def timed(self, stage: str) -> Callable:
+        """Decorator recording the wall time of every call of a function as `stage`."""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timer(stage):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def reset(self) -> None:
+        with self.lock:
+            self.histograms = {}
+            self.counters = {}
+            self.gauges = {}
+
+    def get_stats(self) -> Dict[str, Dict]:
+        """Returns a snapshot of all metrics.
+
+        Returns:
+            A dict mapping every metric name to a dict from its formatted labels (e.g. `{stage="generate"}`, or "" if
+            the metric has no labels) to its value. The value of a histogram is a dict with its count, sum, mean, max
+            and the p50/p90/p99 of its most recent values.
+        """
+        stats = {}
+        with self.lock:
+            for (name, labels), histogram in self.histograms.items():
+                stats.setdefault(name, {})[format_labels(labels)] = histogram.get_stats()
+            for (name, labels), value in list(self.counters.items()) + list(self.gauges.items()):
+                stats.setdefault(name, {})[format_labels(labels)] = value
+        return stats
+
+    def to_prometheus(self) -> str:
+        """Renders all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            for kind, metrics in [("histogram", self.histograms), ("counter", self.counters), ("gauge", self.gauges)]:
+                names = sorted(set(name for name, _ in metrics))
+                for name in names:
+                    full_name = "%s_%s" % (self.prefix, name)
+                    if name in self.descriptions:
+                        lines.append("# HELP %s %s" % (full_name, self.descriptions[name]))
+                    lines.append("# TYPE %s %s" % (full_name, kind))
+                    for (metric_name, labels), value in sorted(metrics.items(), key=lambda item: item[0]):
+                        if metric_name != name:
+                            continue
+                        if kind != "histogram":
+                            lines.append("%s%s %s" % (full_name, format_labels(labels), value))
+                            continue
+                        cumulative = 0
+                        for bound, count in zip(value.buckets, value.counts):
+                            cumulative += count
+                            le = "+Inf" if bound == float("inf") else repr(bound)
+                            lines.append("%s_bucket%s %d" % (full_name, format_labels(labels, le=le), cumulative))
+                        lines.append("%s_sum%s %s" % (full_name, format_labels(labels), value.sum))
+                        lines.append("%s_count%s %d" % (full_name, format_labels(labels), value.count))
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+metrics.describe("stage_seconds", "Wall time of every stage of the inference pipeline.")
+metrics.describe("batch_size", "Number of inputs per generate call.", SIZE_BUCKETS)
+metrics.describe("padding_ratio", "Fraction of padding tokens in the inputs of a generate call.", RATIO_BUCKETS)
+metrics.describe("generated_tokens", "Number of non-padding tokens generated per generate call.", SIZE_BUCKETS)
+
+
+def record_generate(input_ids, attention_mask, generated_tokens, pad_token_id: int) -> None:
+    """Records the batch size, padding ratio and number of generated tokens of a `generate` call."""
+    if not metrics.enabled:
+        return
+    metrics.observe("batch_size", input_ids.shape[0])
+    if attention_mask is not None and attention_mask.numel() > 0:
+        metrics.observe("padding_ratio", 1 - float(attention_mask.sum()) / attention_mask.numel())
+    metrics.observe("generated_tokens", int((generated_tokens != pad_token_id).sum()))
+
+
+def get_stats() -> Dict[str, Dict]:
+    """Returns a snapshot of the metrics recorded in this process. See `Metrics.get_stats`."""
+    return metrics.get_stats()
+
+
+def reset_stats() -> None:
+    """Clears the metrics recorded in this process."""
+    metrics.reset()
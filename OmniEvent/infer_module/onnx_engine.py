@@ -0,0 +1,311 @@
+import os
+import inspect
+import logging
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from typing import List, Optional, Tuple
+from transformers import AutoConfig, PretrainedConfig, PreTrainedModel
+from transformers.modeling_outputs import BaseModelOutput, Seq2SeqLMOutput
+
+logger = logging.getLogger(__name__)
+
+ENCODER_FILE = "encoder.onnx"
+DECODER_FILE = "decoder.onnx"
+DECODER_WITH_PAST_FILE = "decoder_with_past.onnx"
+
+
+def get_past_names(num_layers: int, prefix: str, with_cross: bool = True) -> List[str]:
+    """Returns the names of the flattened key/value cache, 4 tensors (self key/value, cross key/value) per layer."""
+    names = []
+    for i in range(num_layers):
+        names += [f"{prefix}.{i}.decoder.key", f"{prefix}.{i}.decoder.value"]
+        if with_cross:
+            names += [f"{prefix}.{i}.encoder.key", f"{prefix}.{i}.encoder.value"]
+    return names
+
+
+def get_lm_logits(model, hidden_states):
+    """Projects decoder hidden states to the vocabulary as `T5ForConditionalGeneration.forward` does."""
+    if getattr(model.config, "tie_word_embeddings", False):
+        hidden_states = hidden_states * (model.model_dim ** -0.5)
+    return model.lm_head(hidden_states)
+
+
+class _EncoderForExport(nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model.get_encoder()(input_ids=input_ids, attention_mask=attention_mask, return_dict=True)[0]
+
+
+class _DecoderForExport(nn.Module):
+    """First decoding step: computes the cross-attention cache from the encoder output."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, encoder_attention_mask, encoder_hidden_states):
+        outputs = self.model.get_decoder()(input_ids=input_ids,
+                                           encoder_hidden_states=encoder_hidden_states,
+                                           encoder_attention_mask=encoder_attention_mask,
+                                           use_cache=True,
+                                           return_dict=True)
+        present = [tensor for layer in outputs.past_key_values for tensor in layer]
+        return (get_lm_logits(self.model, outputs.last_hidden_state),) + tuple(present)
+
+
+class _DecoderWithPastForExport(nn.Module):
+    """Later decoding steps: reuse the cache and only return the updated self-attention cache."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, encoder_attention_mask, encoder_hidden_states, *past):
+        past_key_values = tuple(tuple(past[i:i+4]) for i in range(0, len(past), 4))
+        outputs = self.model.get_decoder()(input_ids=input_ids,
+                                           encoder_hidden_states=encoder_hidden_states,
+                                           encoder_attention_mask=encoder_attention_mask,
+                                           past_key_values=past_key_values,
+                                           use_cache=True,
+                                           return_dict=True)
+        present = [tensor for layer in outputs.past_key_values for tensor in layer[:2]]
+        return (get_lm_logits(self.model, outputs.last_hidden_state),) + tuple(present)
+
+
+def _onnx_export(module, args, path, input_names, output_names, dynamic_axes, opset_version):
+    # The exporter restores the train/eval mode of the wrapper afterwards, which would put the wrapped model back into
+    # training mode if the wrapper were left in its default mode.
+    module.eval()
+    kwargs = dict(input_names=input_names,
+                  output_names=output_names,
+                  dynamic_axes=dynamic_axes,
+                  opset_version=opset_version,
+                  do_constant_folding=True)
+    # Newer torch versions default to the dynamo exporter, which does not take `dynamic_axes`.
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        kwargs["dynamo"] = False
+    with torch.no_grad():
+        torch.onnx.export(module, args, path, **kwargs)
+
+
+def export_seq2seq_onnx(model, output_dir: str, tokenizer=None, opset_version: int = 14) -> str:
+    """Exports a seq2seq model (e.g. `s2s-mt5-ed`) as encoder, decoder and decoder-with-past ONNX graphs.
+
+    The three graphs, the model config and, if given, the tokenizer are saved to `output_dir`, which can then be loaded
+    by `OnnxSeq2SeqEngine.from_pretrained`.
+
+    Args:
+        model (`PreTrainedModel`):
+            A T5/mT5 model as returned by `get_model_cls(paradigm="seq2seq")`.
+        output_dir (`str`):
+            The directory the graphs are written to.
+        tokenizer (`PreTrainedTokenizer`, `optional`, defaults to `None`):
+            The tokenizer saved alongside the graphs.
+        opset_version (`int`, `optional`, defaults to 14):
+            The ONNX opset of the graphs.
+
+    Returns:
+        The output directory.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    model = model.to("cpu").float().eval()
+    config = model.config
+    num_layers = config.num_decoder_layers
+    batch_size, src_length = 2, 8
+    input_ids = torch.ones(batch_size, src_length, dtype=torch.long)
+    attention_mask = torch.ones(batch_size, src_length, dtype=torch.long)
+    decoder_input_ids = torch.full((batch_size, 1), config.decoder_start_token_id, dtype=torch.long)
+
+    _onnx_export(_EncoderForExport(model), (input_ids, attention_mask),
+                 os.path.join(output_dir, ENCODER_FILE),
+                 input_names=["input_ids", "attention_mask"],
+                 output_names=["last_hidden_state"],
+                 dynamic_axes={"input_ids": {0: "batch", 1: "src_length"},
+                               "attention_mask": {0: "batch", 1: "src_length"},
+                               "last_hidden_state": {0: "batch", 1: "src_length"}},
+                 opset_version=opset_version)
+
+    with torch.no_grad():
+        encoder_hidden_states = _EncoderForExport(model)(input_ids, attention_mask)
+        outputs = _DecoderForExport(model)(decoder_input_ids, attention_mask, encoder_hidden_states)
+    present_names = get_past_names(num_layers, "present")
+    cache_axes = {}
+    for name in present_names:
+        cache_axes[name] = {0: "batch", 2: "src_length" if ".encoder." in name else "past_length"}
+    _onnx_export(_DecoderForExport(model), (decoder_input_ids, attention_mask, encoder_hidden_states),
+                 os.path.join(output_dir, DECODER_FILE),
+                 input_names=["input_ids", "encoder_attention_mask", "encoder_hidden_states"],
+                 output_names=["logits"] + present_names,
+                 dynamic_axes={"input_ids": {0: "batch", 1: "tgt_length"},
+                               "encoder_attention_mask": {0: "batch", 1: "src_length"},
+                               "encoder_hidden_states": {0: "batch", 1: "src_length"},
+                               "logits": {0: "batch", 1: "tgt_length"},
+                               **cache_axes},
+                 opset_version=opset_version)
+
+    past_names = get_past_names(num_layers, "past_key_values")
+    past_axes = {}
+    for name in past_names:
+        past_axes[name] = {0: "batch", 2: "src_length" if ".encoder." in name else "past_length"}
+    self_present_names = get_past_names(num_layers, "present", with_cross=False)
+    _onnx_export(_DecoderWithPastForExport(model),
+                 (decoder_input_ids, attention_mask, encoder_hidden_states) + tuple(outputs[1:]),
+                 os.path.join(output_dir, DECODER_WITH_PAST_FILE),
+                 input_names=["input_ids", "encoder_attention_mask", "encoder_hidden_states"] + past_names,
+                 output_names=["logits"] + self_present_names,
+                 dynamic_axes={"input_ids": {0: "batch"},
+                               "encoder_attention_mask": {0: "batch", 1: "src_length"},
+                               "encoder_hidden_states": {0: "batch", 1: "src_length"},
+                               "logits": {0: "batch"},
+                               **past_axes,
+                               **{name: cache_axes[name] for name in self_present_names}},
+                 opset_version=opset_version)
+
+    config.save_pretrained(output_dir)
+    if tokenizer is not None:
+        tokenizer.save_pretrained(output_dir)
+    logger.info("Exported ONNX graphs to %s" % output_dir)
+    return output_dir
+
+
+def is_onnx_exported(path: str) -> bool:
+    """Checks whether `path` contains the graphs written by `export_seq2seq_onnx`."""
+    return all(os.path.exists(os.path.join(path, name))
+               for name in [ENCODER_FILE, DECODER_FILE, DECODER_WITH_PAST_FILE, "config.json"])
+
+
+def _to_numpy(tensor):
+    return tensor.detach().cpu().numpy()
+
+
+class _OnnxEncoder(nn.Module):
+    main_input_name = "input_ids"
+
+    def __init__(self, session):
+        super().__init__()
+        self.session = session
+
+    def forward(self, input_ids, attention_mask=None, **kwargs):
+        if attention_mask is None:
+            attention_mask = torch.ones_like(input_ids)
+        last_hidden_state = self.session.run(None, {"input_ids": _to_numpy(input_ids).astype(np.int64),
+                                                    "attention_mask": _to_numpy(attention_mask).astype(np.int64)})[0]
+        return BaseModelOutput(last_hidden_state=torch.from_numpy(last_hidden_state))
+
+
+class OnnxSeq2SeqEngine(PreTrainedModel):
+    """Runs a seq2seq model exported by `export_seq2seq_onnx` with ONNX Runtime on cpu.
+
+    The engine is a drop-in replacement of the PyTorch model for inference: `generate()` is inherited from
+    transformers, so beam search and the other decoding options behave as with the PyTorch model, while every forward
+    pass runs in ONNX Runtime. The decoder cache is kept between steps, so each step only decodes one token.
+
+    Attributes:
+        encoder_session, decoder_session, decoder_with_past_session (`onnxruntime.InferenceSession`):
+            The sessions of the three exported graphs.
+        num_layers (`int`):
+            The number of decoder layers, used to (un)flatten the key/value cache.
+    """
+    main_input_name = "input_ids"
+    config_class = PretrainedConfig
+
+    def __init__(self,
+                 config: PretrainedConfig,
+                 model_dir: str,
+                 num_threads: Optional[int] = None,
+                 providers: Optional[List[str]] = None) -> None:
+        """Constructs an `OnnxSeq2SeqEngine` from the graphs in `model_dir`."""
+        super().__init__(config)
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads is not None:
+            options.intra_op_num_threads = num_threads
+        providers = providers if providers is not None else ["CPUExecutionProvider"]
+
+        def create_session(name):
+            return onnxruntime.InferenceSession(os.path.join(model_dir, name), options, providers=providers)
+
+        self.encoder_session = create_session(ENCODER_FILE)
+        self.decoder_session = create_session(DECODER_FILE)
+        self.decoder_with_past_session = create_session(DECODER_WITH_PAST_FILE)
+        self.encoder = _OnnxEncoder(self.encoder_session)
+        self.num_layers = config.num_decoder_layers
+        # the exporter may prune inputs that the graph does not use
+        self.decoder_inputs = {x.name for x in self.decoder_session.get_inputs()}
+        self.decoder_with_past_inputs = {x.name for x in self.decoder_with_past_session.get_inputs()}
+
+    @classmethod
+    def from_pretrained(cls, model_dir: str, num_threads: Optional[int] = None, providers: Optional[List[str]] = None):
+        """Loads the engine from a directory written by `export_seq2seq_onnx`."""
+        return cls(AutoConfig.from_pretrained(model_dir), model_dir, num_threads, providers)
+
+    @property
+    def device(self) -> torch.device:
+        return torch.device("cpu")
+
+    @property
+    def dtype(self) -> torch.dtype:
+        return torch.float32
+
+    def get_encoder(self):
+        return self.encoder
+
+    def forward(self,
+                input_ids: Optional[torch.Tensor] = None,
+                attention_mask: Optional[torch.Tensor] = None,
+                decoder_input_ids: Optional[torch.Tensor] = None,
+                encoder_outputs: Optional[BaseModelOutput] = None,
+                past_key_values: Optional[Tuple[Tuple[torch.Tensor]]] = None,
+                **kwargs) -> Seq2SeqLMOutput:
+        if encoder_outputs is None:
+            encoder_outputs = self.encoder(input_ids, attention_mask)
+        encoder_hidden_states = encoder_outputs[0]
+        if attention_mask is None:
+            attention_mask = torch.ones(encoder_hidden_states.shape[:2], dtype=torch.long)
+        feed = {
+            "input_ids": _to_numpy(decoder_input_ids).astype(np.int64),
+            "encoder_attention_mask": _to_numpy(attention_mask).astype(np.int64),
+            "encoder_hidden_states": _to_numpy(encoder_hidden_states)
+        }
+        if past_key_values is None:
+            outputs = self.decoder_session.run(None, {k: v for k, v in feed.items() if k in self.decoder_inputs})
+            present = [torch.from_numpy(x) for x in outputs[1:]]
+            past_key_values = tuple(tuple(present[i:i+4]) for i in range(0, len(present), 4))
+        else:
+            past_names = get_past_names(self.num_layers, "past_key_values")
+            feed.update({name: _to_numpy(tensor) for name, tensor in
+                         zip(past_names, [tensor for layer in past_key_values for tensor in layer])})
+            outputs = self.decoder_with_past_session.run(
+                None, {k: v for k, v in feed.items() if k in self.decoder_with_past_inputs})
+            present = [torch.from_numpy(x) for x in outputs[1:]]
+            # the cross-attention cache does not change after the first step
+            past_key_values = tuple((present[2*i], present[2*i+1]) + tuple(past_key_values[i][2:])
+                                    for i in range(self.num_layers))
+        return Seq2SeqLMOutput(logits=torch.from_numpy(outputs[0]), past_key_values=past_key_values)
+
+    def prepare_inputs_for_generation(self,
+                                      input_ids,
+                                      past_key_values=None,
+                                      attention_mask=None,
+                                      encoder_outputs=None,
+                                      **kwargs):
+        if past_key_values is not None:
+            input_ids = input_ids[:, -1:]
+        return {
+            "decoder_input_ids": input_ids,
+            "past_key_values": past_key_values,
+            "encoder_outputs": encoder_outputs,
+            "attention_mask": attention_mask,
+        }
+
+    @staticmethod
+    def _reorder_cache(past_key_values, beam_idx):
+        return tuple(tuple(tensor.index_select(0, beam_idx) for tensor in layer) for layer in past_key_values)
@@ -0,0 +1,155 @@
+import torch
+import logging
+import torch.nn.quantized.dynamic as nnqd
+import threading
+
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_device(device: Union[str, torch.device]) -> str:
+    """Returns a canonical string for a device so that `"cuda"` and `torch.device("cuda")` share a cache entry."""
+    return str(torch.device(device))
+
+
+def normalize_dtype(dtype: Optional[Union[str, torch.dtype]]) -> Optional[torch.dtype]:
+    """Converts dtype names such as `"float16"` into `torch.dtype` objects."""
+    if dtype is None or isinstance(dtype, torch.dtype):
+        return dtype
+    return getattr(torch, dtype.replace("torch.", ""))
+
+
+def get_model_memory(model: torch.nn.Module) -> int:
+    """Returns the number of bytes held by the parameters and buffers of a model, including the packed weights of
+    dynamically quantized layers."""
+    tensors = list(model.parameters()) + list(model.buffers())
+    for module in model.modules():
+        if isinstance(module, nnqd.Linear):
+            tensors.extend(tensor for tensor in module._weight_bias() if tensor is not None)
+    n_bytes = 0
+    for tensor in tensors:
+        n_bytes += tensor.numel() * tensor.element_size()
+    return n_bytes
+
+
+class ModelRegistry(object):
+    """A thread-safe, process-wide cache of loaded models and tokenizers.
+
+    Entries are keyed by `(model_name_or_path, device, dtype)`, so each checkpoint is read from disk at most once per
+    placement. When `max_memory` is set, the least recently used entries are evicted until the resident size of all
+    cached models fits into the budget again. The most recently requested entry is never evicted.
+
+    Attributes:
+        loader (`Callable`):
+            A function `loader(model_name_or_path, device, dtype)` returning a `(model, tokenizer)` tuple.
+        max_memory (`int`, `optional`, defaults to `None`):
+            Upper bound of the resident memory (in bytes) of all cached models. `None` means unbounded.
+    """
+
+    def __init__(self,
+                 loader: Callable,
+                 max_memory: Optional[int] = None) -> None:
+        """Constructs a `ModelRegistry`."""
+        self.loader = loader
+        self.max_memory = max_memory
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._loading_locks = {}
+
+    @staticmethod
+    def make_key(model_name_or_path: str,
+                 device: Union[str, torch.device],
+                 dtype: Optional[Union[str, torch.dtype]] = None) -> Tuple[str, str, str]:
+        """Builds the cache key of a model."""
+        return (model_name_or_path, normalize_device(device), str(normalize_dtype(dtype)))
+
+    def get(self,
+            model_name_or_path: str,
+            device: Union[str, torch.device],
+            dtype: Optional[Union[str, torch.dtype]] = None):
+        """Returns the cached `(model, tokenizer)` of a model, loading it on the first request."""
+        key = self.make_key(model_name_or_path, device, dtype)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][:2]
+            loading_lock = self._loading_locks.setdefault(key, threading.Lock())
+        # Load outside the registry lock so that different models can be loaded concurrently, while concurrent
+        # requests for the same model wait for a single load.
+        with loading_lock:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    return self._entries[key][:2]
+            model, tokenizer = self.loader(model_name_or_path, key[1], normalize_dtype(dtype))
+            model.eval()
+            n_bytes = get_model_memory(model)
+            with self._lock:
+                self._entries[key] = (model, tokenizer, n_bytes)
+                self._loading_locks.pop(key, None)
+                self._shrink()
+        logger.info("Loaded %s on %s (%s): %.1f MB" % (key[0], key[1], key[2], n_bytes / 2**20))
+        return model, tokenizer
+
+    def preload(self,
+                model_names_or_paths: Iterable[str],
+                device: Union[str, torch.device],
+                dtype: Optional[Union[str, torch.dtype]] = None) -> None:
+        """Loads models ahead of the first request, e.g. at service start-up."""
+        if isinstance(model_names_or_paths, str):
+            model_names_or_paths = [model_names_or_paths]
+        for model_name_or_path in model_names_or_paths:
+            self.get(model_name_or_path, device, dtype)
+
+    def evict(self,
+              model_name_or_path: Optional[str] = None,
+              device: Optional[Union[str, torch.device]] = None,
+              dtype: Optional[Union[str, torch.dtype]] = None) -> int:
+        """Removes the matching entries from the cache and returns how many were removed.
+
+        Arguments left as `None` match any value, so `evict()` clears the whole registry.
+        """
+        device = normalize_device(device) if device is not None else None
+        dtype = str(normalize_dtype(dtype)) if dtype is not None else None
+        with self._lock:
+            keys = [key for key in self._entries
+                    if (model_name_or_path is None or key[0] == model_name_or_path)
+                    and (device is None or key[1] == device)
+                    and (dtype is None or key[2] == dtype)]
+            for key in keys:
+                self._remove(key)
+        return len(keys)
+
+    def memory_usage(self) -> int:
+        """Returns the resident memory (in bytes) of all cached models."""
+        with self._lock:
+            return sum(entry[2] for entry in self._entries.values())
+
+    def keys(self):
+        """Returns the cached keys, from the least to the most recently used."""
+        with self._lock:
+            return list(self._entries.keys())
+
+    def _shrink(self) -> None:
+        """Evicts least recently used entries until the cache fits into `max_memory`."""
+        if self.max_memory is None:
+            return
+        while len(self._entries) > 1 and self.memory_usage() > self.max_memory:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key) -> None:
+        """Drops an entry and releases cached device memory."""
+        del self._entries[key]
+        logger.info("Evicted %s on %s (%s)" % key)
+        if key[1].startswith("cuda") and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
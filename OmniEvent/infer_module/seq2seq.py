@@ -1,8 +1,7 @@
 import re 
 import torch 
 
-from collections import defaultdict
-from .io_format import Result, Event
+from .metrics import metrics, record_generate
 
 
 split_word = ":"
@@ -17,42 +16,47 @@ def get_words(text, language):
     return words
 
 
+CHINESE_SCHEMAS = ["<duee>", "<fewfc>", "<leven>"]
+
+
+def get_language(schema):
+    return "Chinese" if schema in CHINESE_SCHEMAS else "English"
+
+
 class EDProcessor():
     def __init__(self, tokenizer, max_seq_length=160):
         self.tokenizer = tokenizer 
         self.max_seq_length = max_seq_length
 
-    def tokenize_per_instance(self, text, schema):
-        if schema in ["<duee>", "<fewfc>", "<leven>"]:
-            words = get_words(schema+text, "Chinese")
-        else:
-            words = get_words(schema+text, "English")
-        input_context = self.tokenizer(words,
-                                       truncation=True,
-                                       padding="max_length",
-                                       max_length=self.max_seq_length,
-                                       is_split_into_words=True)
+    def get_words(self, text, schema):
+        return get_words(schema+text, get_language(schema))
+
+    def encode(self, batch_words, padding=False, return_tensors=None):
+        """Tokenizes a batch of word lists with a single call of the (fast) tokenizer."""
+        return self.tokenizer(batch_words,
+                              truncation=True,
+                              padding=padding,
+                              max_length=self.max_seq_length,
+                              is_split_into_words=True,
+                              return_tensors=return_tensors)
+
+    def tokenize_per_instance(self, text, schema, padding="max_length"):
+        input_context = self.encode([self.get_words(text, schema)], padding)
         return dict(
-            input_ids=torch.tensor(input_context["input_ids"], dtype=torch.long),
-            attention_mask=torch.tensor(input_context["attention_mask"], dtype=torch.float32)
+            input_ids=torch.tensor(input_context["input_ids"][0], dtype=torch.long),
+            attention_mask=torch.tensor(input_context["attention_mask"][0], dtype=torch.float32)
         )
 
+    def get_input_ids(self, texts, schemas):
+        """Returns the unpadded input ids of every text."""
+        if len(texts) == 0:
+            return []
+        return self.encode([self.get_words(text, schema) for text, schema in zip(texts, schemas)])["input_ids"]
 
+    @metrics.timed("tokenize")
     def tokenize(self, texts, schemas, device):
-        batch = []
-        for text, schema in zip(texts, schemas):
-            batch.append(self.tokenize_per_instance(text, schema))
-        # output batch features 
-        output_batch = defaultdict(list)
-        for key in batch[0].keys():
-            output_batch[key] = torch.stack([x[key] for x in batch], dim=0)
-        # truncate
-        input_length = int(output_batch["attention_mask"].sum(-1).max())
-        for key in ["input_ids", "attention_mask", "token_type_ids"]:
-            if key not in output_batch:
-                continue
-            output_batch[key] = output_batch[key][:, :input_length].to(device)
-        return output_batch
+        batch_words = [self.get_words(text, schema) for text, schema in zip(texts, schemas)]
+        return to_device(self.encode(batch_words, "longest", "pt"), device)
 
 
 class EAEProcessor():
@@ -62,53 +66,95 @@ class EAEProcessor():
 
     def insert_marker(self, text, trigger_pos, whitespace=True):
         space = " " if whitespace else ""
-        markered_text = ""
-        tokens = text.split()
+        parts = []
         char_pos = 0
-        for i, token in enumerate(tokens):
+        for token in text.split():
             if char_pos == trigger_pos[0]:
-                markered_text += "<event>" + space
+                parts.append("<event>")
             char_pos += len(token) + len(space)
-            markered_text += token + space
+            parts.append(token)
             if char_pos == trigger_pos[1] + len(space):
-                markered_text += "</event>" + space
-        markered_text = markered_text.strip()
-        return markered_text
-
-    def tokenize_per_instance(self, text, trigger, schema):
-        if schema in ["<duee>", "<fewfc>", "<leven>"]:
-            language = "Chinese"
-        else:
-            language = "English"
-        whitespace = True if language == "English" else False
-        text = self.insert_marker(text, trigger["offset"], whitespace)
-        words = get_words(text, language)
-        input_context = self.tokenizer(words,
-                                       truncation=True,
-                                       padding="max_length",
-                                       max_length=self.max_seq_length,
-                                       is_split_into_words=True)
+                parts.append("</event>")
+        return space.join(parts)
+
+    def get_words(self, text, trigger, schema):
+        language = get_language(schema)
+        return get_words(self.insert_marker(text, trigger["offset"], language == "English"), language)
+
+    def encode(self, batch_words, padding=False, return_tensors=None):
+        """Tokenizes a batch of word lists with a single call of the (fast) tokenizer."""
+        return self.tokenizer(batch_words,
+                              truncation=True,
+                              padding=padding,
+                              max_length=self.max_seq_length,
+                              is_split_into_words=True,
+                              return_tensors=return_tensors)
+
+    def tokenize_per_instance(self, text, trigger, schema, padding="max_length"):
+        input_context = self.encode([self.get_words(text, trigger, schema)], padding)
         return dict(
-            input_ids=torch.tensor(input_context["input_ids"], dtype=torch.long),
-            attention_mask=torch.tensor(input_context["attention_mask"], dtype=torch.float32)
+            input_ids=torch.tensor(input_context["input_ids"][0], dtype=torch.long),
+            attention_mask=torch.tensor(input_context["attention_mask"][0], dtype=torch.float32)
         )
 
+    def get_batch_words(self, instances):
+        return [self.get_words(instance["text"], trigger, instance["schema"])
+                for instance in instances for trigger in instance["triggers"]]
+
+    def get_input_ids(self, instances):
+        """Returns the unpadded input ids of every (text, trigger) pair, flattened over `instances`."""
+        batch_words = self.get_batch_words(instances)
+        if len(batch_words) == 0:
+            return []
+        return self.encode(batch_words)["input_ids"]
+
+    @metrics.timed("tokenize")
     def tokenize(self, instances, device):
-        batch = []
-        for i, instance in enumerate(instances):
-            for trigger in instance["triggers"]:
-                batch.append(self.tokenize_per_instance(instance["text"], trigger, instance["schema"]))
-        # output batch features 
-        output_batch = defaultdict(list)
-        for key in batch[0].keys():
-            output_batch[key] = torch.stack([x[key] for x in batch], dim=0)
-        # truncate
-        input_length = int(output_batch["attention_mask"].sum(-1).max())
-        for key in ["input_ids", "attention_mask", "token_type_ids"]:
-            if key not in output_batch:
-                continue
-            output_batch[key] = output_batch[key][:, :input_length].to(device)
-        return output_batch
+        return to_device(self.encode(self.get_batch_words(instances), "longest", "pt"), device)
+
+
+def to_device(inputs, device):
+    """Moves a batch of features to `device`, with the attention mask as float.
+
+    For cuda devices the tensors are copied from pinned memory without blocking, so that the host can prepare the
+    next batch while the copy is running.
+    """
+    inputs = {"input_ids": inputs["input_ids"], "attention_mask": inputs["attention_mask"].float()}
+    if torch.device(device).type != "cuda":
+        return {key: value.to(device) for key, value in inputs.items()}
+    return {key: value.pin_memory().to(device, non_blocking=True) for key, value in inputs.items()}
+
+
+def pad_input_ids(all_input_ids, indices, pad_token_id):
+    """Pads the input ids of `indices` to the longest of them and builds their attention mask on cpu."""
+    length = max(len(all_input_ids[i]) for i in indices)
+    input_ids = torch.full((len(indices), length), pad_token_id, dtype=torch.long)
+    attention_mask = torch.zeros((len(indices), length), dtype=torch.float32)
+    for row, i in enumerate(indices):
+        input_ids[row, :len(all_input_ids[i])] = torch.tensor(all_input_ids[i], dtype=torch.long)
+        attention_mask[row, :len(all_input_ids[i])] = 1
+    return {"input_ids": input_ids, "attention_mask": attention_mask}
+
+
+def get_length_batches(lengths, batch_size=32, max_tokens=None):
+    """Groups indices of inputs with similar lengths into batches.
+
+    Indices are sorted by length and cut into batches holding at most `batch_size` inputs and, if `max_tokens` is
+    set, at most `max_tokens` tokens after padding to the longest input of the batch.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    batches = []
+    batch = []
+    for index in order:
+        # `order` is ascending, so the current input is the longest of the batch.
+        exceeds_tokens = max_tokens is not None and lengths[index] * (len(batch) + 1) > max_tokens
+        if len(batch) > 0 and (len(batch) >= batch_size or exceeds_tokens):
+            batches.append(batch)
+            batch = []
+        batch.append(index)
+    if len(batch) > 0:
+        batches.append(batch)
+    return batches
 
 
 def find_position(mention, text):
@@ -117,18 +163,80 @@ def find_position(mention, text):
     return [char_start, char_end]
 
 
+def span_distance(start, end, anchor):
+    """Number of chars between the span `[start, end)` and the span `anchor`, 0 if they overlap."""
+    return max(0, start - anchor[1], anchor[0] - end)
+
+
+class SpanIndex(object):
+    """Resolves the mentions generated for a text to char offsets.
+
+    All occurrences of a mention are found once per text and shared by every prediction with that mention, and a
+    mention that occurs several times resolves to the occurrence nearest to an anchor, e.g. the trigger of an
+    argument, instead of always the first one. Triggers resolve to their own char offsets if they come with any.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.occurrences = {}
+
+    def find_all(self, mention):
+        """Returns the start offsets of all (possibly overlapping) occurrences of `mention` in ascending order."""
+        if mention not in self.occurrences:
+            starts = []
+            start = self.text.find(mention)
+            while start != -1:
+                starts.append(start)
+                start = self.text.find(mention, start + 1)
+            self.occurrences[mention] = starts
+        return self.occurrences[mention]
+
+    def resolve(self, mention, anchor=None):
+        """Returns the `[start, end]` offset of the occurrence of `mention` nearest to `anchor`, the first occurrence
+        if no anchor is given, or `None` if `mention` does not occur in the text."""
+        starts = self.find_all(mention)
+        if len(starts) == 0:
+            return None
+        start = starts[0]
+        if anchor is not None:
+            start = min(starts, key=lambda start: (span_distance(start, start + len(mention), anchor), start))
+        return [start, start + len(mention)]
+
+    def resolve_trigger(self, mention, offset=None):
+        """Returns `offset` if it spans `mention` in the text, the occurrence of `mention` nearest to `offset` if it
+        does not, and the first occurrence if no offset is given. Returns `None` if `mention` does not occur."""
+        if offset is not None and self.text[offset[0]:offset[1]] == mention:
+            return [offset[0], offset[1]]
+        return self.resolve(mention, offset)
+
+
+def get_trigger_offset(trigger, start=3):
+    """Returns the `[start, end]` char offset of a trigger tuple, stored from position `start` on, or `None`."""
+    if isinstance(trigger, str) or len(trigger) < start + 2:
+        return None
+    return [trigger[start], trigger[start + 1]]
+
+
+def group_by_instance(triggers, n_instances):
+    """Groups `(instance id, type, mention[, start, end])` predictions by instance id in a single pass."""
+    grouped = [[] for _ in range(n_instances)]
+    for trigger in triggers:
+        grouped[trigger[0]].append(trigger)
+    return grouped
+
+
+@metrics.timed("result")
 def get_ed_result(texts, triggers):
     results = []
-    for i, text in enumerate(texts):
-        triggers_in_text = [trigger for trigger in triggers if trigger[0]==i]
-        result = Result()
+    for text, triggers_in_text in zip(texts, group_by_instance(triggers, len(texts))):
+        index = SpanIndex(text)
         events = []
         for trigger in triggers_in_text:
             type = trigger[1]
             mention = trigger[2]
-            if mention not in text:
+            offset = index.resolve_trigger(mention, get_trigger_offset(trigger))
+            if offset is None:
                 continue
-            offset = find_position(mention, text)
             event = {
                 "type": type,
                 "trigger": mention,
@@ -142,20 +250,24 @@ def get_ed_result(texts, triggers):
     return results
 
 
+@metrics.timed("result")
 def get_eae_result(instances, arguments):
     results = []
+    # `arguments` is flattened over the triggers of all instances.
+    start = 0
     for i, instance in enumerate(instances):
-        result = Result()
+        index = SpanIndex(instance["text"])
         events = []
-        for trigger, argus_in_trigger in zip(instance["triggers"], arguments):
-            event = Event()
+        arguments_in_instance = arguments[start:start+len(instance["triggers"])]
+        start += len(instance["triggers"])
+        for trigger, argus_in_trigger in zip(instance["triggers"], arguments_in_instance):
             event_arguments = []
             for argu in argus_in_trigger:
                 role = argu[1]
                 mention = argu[2]
-                if mention not in instance["text"]:
+                offset = index.resolve(mention, trigger["offset"])
+                if offset is None:
                     continue
-                offset = find_position(mention, instance["text"])
                 argument = {
                     "mention": mention,
                     "offset": offset,
@@ -176,17 +288,26 @@ def get_eae_result(instances, arguments):
         
 
 def prepare_for_eae_from_input(texts, all_triggers, schemas):
+    """Builds the EAE instances of `(mention, start, end)` triggers given by the user. A trigger given as its mention
+    only resolves to the first occurrence of the mention."""
     instances = []
     for text, triggers, schema in zip(texts, all_triggers, schemas):
+        index = SpanIndex(text)
         instance = {
             "text": text,
             "schema": schema,
             "triggers": []
         }
         for trigger in triggers:
+            mention = trigger if isinstance(trigger, str) else trigger[0]
+            offset = get_trigger_offset(trigger, start=1)
+            if offset is None:
+                offset = index.resolve(mention)
+                if offset is None:
+                    continue
             instance["triggers"].append({
-                "mention": trigger[0],
-                "offset": [trigger[1], trigger[2]]
+                "mention": mention,
+                "offset": offset
             })
         instances.append(instance)
     return instances
@@ -194,8 +315,8 @@ def prepare_for_eae_from_input(texts, all_triggers, schemas):
 
 def prepare_for_eae_from_pred(texts, triggers, schemas):
     instances = []
-    for i, text in enumerate(texts):
-        triggers_in_text = [trigger for trigger in triggers if trigger[0]==i]
+    for i, (text, triggers_in_text) in enumerate(zip(texts, group_by_instance(triggers, len(texts)))):
+        index = SpanIndex(text)
         instance = {
             "text": text,
             "schema": schemas[i],
@@ -204,9 +325,9 @@ def prepare_for_eae_from_pred(texts, triggers, schemas):
         for trigger in triggers_in_text:
             type = trigger[1]
             mention = trigger[2]
-            if mention not in text:
+            offset = index.resolve_trigger(mention, get_trigger_offset(trigger))
+            if offset is None:
                 continue
-            offset = find_position(mention, text)
             instance["triggers"].append({
                 "type": type, 
                 "mention": mention,
@@ -216,6 +337,22 @@ def prepare_for_eae_from_pred(texts, triggers, schemas):
     return instances 
 
 
+def prepare_for_eae_from_result(result, schema):
+    """Builds the EAE instance of an ED result in the format of `infer`."""
+    instance = {
+        "text": result["text"],
+        "schema": schema,
+        "triggers": []
+    }
+    for event in result["events"]:
+        instance["triggers"].append({
+            "type": event["type"],
+            "mention": event["trigger"],
+            "offset": event["offset"]
+        })
+    return instance
+
+
 def extract_argument(raw_text, instance_id, template=re.compile(r"<|>")):
     arguments = []
     for span in template.split(raw_text):
@@ -232,10 +369,10 @@ def extract_argument(raw_text, instance_id, template=re.compile(r"<|>")):
     return arguments
 
 
-def generate(model, tokenizer, inputs):
+def generate(model, tokenizer, inputs, max_length=128, num_beams=4):
     gen_kwargs = {
-        "max_length": 128,
-        "num_beams": 4,
+        "max_length": max_length,
+        "num_beams": num_beams,
         "synced_gpus": False,
         "prefix_allowed_tokens_fn": None 
     }
@@ -245,40 +382,99 @@ def generate(model, tokenizer, inputs):
 
     generation_inputs = inputs["input_ids"]
 
-    generated_tokens = model.generate(
-        generation_inputs,
-        **gen_kwargs,
-    )
-    return tokenizer.batch_decode(generated_tokens, skip_special_tokens=False)
+    with metrics.timer("generate"):
+        generated_tokens = model.generate(
+            generation_inputs,
+            **gen_kwargs,
+        )
+    record_generate(generation_inputs, gen_kwargs.get("attention_mask"), generated_tokens, tokenizer.pad_token_id)
+    with metrics.timer("decode"):
+        return tokenizer.batch_decode(generated_tokens, skip_special_tokens=False)
+
+
+def clean_str(tokenizer, x_str):
+    for to_remove_token in [tokenizer.eos_token, tokenizer.pad_token]:
+        x_str = x_str.replace(to_remove_token, '')
+    return x_str.strip()
 
 
-def do_event_detection(model, tokenizer, texts, schemas, device):
+def do_event_detection(model, tokenizer, texts, schemas, device, **gen_kwargs):
     data_processor = EDProcessor(tokenizer)
     inputs = data_processor.tokenize(texts, schemas, device)
-    decoded_preds = generate(model, tokenizer, inputs)
-    def clean_str(x_str):
-        for to_remove_token in [tokenizer.eos_token, tokenizer.pad_token]:
-            x_str = x_str.replace(to_remove_token, '')
-        return x_str.strip()
-    pred_triggers = []
-    for i, pred in enumerate(decoded_preds):
-        pred = clean_str(pred)
-        pred_triggers.extend(extract_argument(pred, i))
-    return pred_triggers
+    decoded_preds = generate(model, tokenizer, inputs, **gen_kwargs)
+    return decode_triggers([clean_str(tokenizer, pred) for pred in decoded_preds])
 
 
-def do_event_argument_extraction(model, tokenizer, instances, device):
+def do_event_argument_extraction(model, tokenizer, instances, device, **gen_kwargs):
     data_processor = EAEProcessor(tokenizer)
     inputs = data_processor.tokenize(instances, device)
-    decoded_preds = generate(model, tokenizer, inputs)
-    def clean_str(x_str):
-        for to_remove_token in [tokenizer.eos_token, tokenizer.pad_token]:
-            x_str = x_str.replace(to_remove_token, '')
-        return x_str.strip()
+    decoded_preds = generate(model, tokenizer, inputs, **gen_kwargs)
+    return decode_arguments([clean_str(tokenizer, pred) for pred in decoded_preds])
+
+
+@metrics.timed("tokenize")
+def get_ed_batches(tokenizer, texts, schemas, batch_size=32, max_tokens=None):
+    """Tokenizes texts for event detection and groups them into length-bucketed `(indices, inputs)` batches.
+
+    Texts are sorted by token length and grouped into batches of at most `batch_size` texts and `max_tokens` padded
+    tokens, so that `generate` runs once per batch with little padding. Inputs stay on cpu.
+    """
+    input_ids = EDProcessor(tokenizer).get_input_ids(texts, schemas)
+    lengths = [len(ids) for ids in input_ids]
+    return [(batch, pad_input_ids(input_ids, batch, tokenizer.pad_token_id))
+            for batch in get_length_batches(lengths, batch_size, max_tokens)]
+
+
+@metrics.timed("tokenize")
+def get_eae_batches(tokenizer, instances, batch_size=32, max_tokens=None):
+    """Tokenizes every (text, trigger) pair of `instances` and groups them into length-bucketed `(indices, inputs)`
+    batches. Indices refer to the triggers flattened over `instances`."""
+    input_ids = EAEProcessor(tokenizer).get_input_ids(instances)
+    lengths = [len(ids) for ids in input_ids]
+    return [(batch, pad_input_ids(input_ids, batch, tokenizer.pad_token_id))
+            for batch in get_length_batches(lengths, batch_size, max_tokens)]
+
+
+def generate_batches(model, tokenizer, batches, device, **gen_kwargs):
+    """Runs `generate` once per batch and returns the cleaned predictions in the order of the inputs."""
+    preds = {}
+    for indices, inputs in batches:
+        inputs = to_device(inputs, device)
+        decoded_preds = generate(model, tokenizer, inputs, **gen_kwargs)
+        for i, pred in zip(indices, decoded_preds):
+            preds[i] = clean_str(tokenizer, pred)
+    return [preds[i] for i in range(len(preds))]
+
+
+@metrics.timed("extract")
+def decode_triggers(preds):
     pred_triggers = []
-    for i, pred in enumerate(decoded_preds):
-        pred = clean_str(pred)
-        pred_triggers.append(extract_argument(pred, i))
+    for i, pred in enumerate(preds):
+        pred_triggers.extend(extract_argument(pred, i))
     return pred_triggers
 
-    
\ No newline at end of file
+
+@metrics.timed("extract")
+def decode_arguments(preds):
+    return [extract_argument(pred, i) for i, pred in enumerate(preds)]
+
+
+def do_event_detection_batch(model, tokenizer, texts, schemas, device, batch_size=32, max_tokens=None,
+                             **gen_kwargs):
+    """Event detection over many texts with length-bucketed batching.
+
+    The returned triggers have the same format as `do_event_detection`, with instance ids referring to positions in
+    `texts`. `gen_kwargs` (`max_length`, `num_beams`) are passed to `generate`.
+    """
+    batches = get_ed_batches(tokenizer, texts, schemas, batch_size, max_tokens)
+    return decode_triggers(generate_batches(model, tokenizer, batches, device, **gen_kwargs))
+
+
+def do_event_argument_extraction_batch(model, tokenizer, instances, device, batch_size=32, max_tokens=None,
+                                       **gen_kwargs):
+    """Event argument extraction over many instances with length-bucketed batching.
+
+    Returns the arguments of every trigger, flattened over `instances` in input order, as `do_event_argument_extraction`.
+    """
+    batches = get_eae_batches(tokenizer, instances, batch_size, max_tokens)
+    return decode_arguments(generate_batches(model, tokenizer, batches, device, **gen_kwargs))
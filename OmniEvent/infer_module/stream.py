@@ -0,0 +1,224 @@
+import os
+import json
+import queue
+import threading
+
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .seq2seq import prepare_for_eae_from_input
+
+
+class _StageError(object):
+    def __init__(self, exception):
+        self.exception = exception
+
+
+_END = object()
+
+
+def prefetch(iterator: Iterable, size: int) -> Iterator:
+    """Runs `iterator` in a background thread and buffers at most `size` of its items.
+
+    Exceptions raised by `iterator` are re-raised in the consumer. Closing the returned generator stops the producer.
+    """
+    buffer = queue.Queue(maxsize=size)
+    stopped = threading.Event()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterator:
+                if not put(item):
+                    return
+        except BaseException as e:
+            put(_StageError(e))
+        put(_END)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _END:
+                break
+            if isinstance(item, _StageError):
+                raise item.exception
+            yield item
+    finally:
+        stopped.set()
+
+
+def read_jsonl(source: Union[str, Iterable], start_line: int = 0) -> Iterator[Tuple[int, Dict]]:
+    """Lazily reads unified-format items as `(line number, item)` pairs, skipping the first `start_line` lines.
+
+    `source` is either a path to a jsonl file or an iterable of items, where an item is a dict with at least a `text`
+    field, a json string or a plain text string.
+    """
+    if isinstance(source, str):
+        with open(source, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(islice(f, start_line, None), start_line):
+                if line.strip() == "":
+                    continue
+                yield line_no, json.loads(line)
+    else:
+        for line_no, item in enumerate(islice(source, start_line, None), start_line):
+            if isinstance(item, str):
+                item = json.loads(item) if item.lstrip().startswith("{") else {"text": item}
+            yield line_no, item
+
+
+def chunk(items: Iterable, chunk_size: int) -> Iterator[List]:
+    """Groups an iterable into lists of at most `chunk_size` items."""
+    items = iter(items)
+    while True:
+        block = list(islice(items, chunk_size))
+        if len(block) == 0:
+            return
+        yield block
+
+
+def get_input_triggers(item: Dict) -> List[Tuple]:
+    """Collects the `(trigger word, char start, char end)` triggers of a unified-format item."""
+    triggers = []
+    for event in item.get("events", []):
+        for trigger in event["triggers"]:
+            triggers.append((trigger["trigger_word"], trigger["position"][0], trigger["position"][1]))
+    return triggers
+
+
+class StreamStages(object):
+    """The stages of the streaming pipeline. Each stage maps one chunk of lines to the input of the next stage.
+
+    The models run through `engine.detect_events` and `engine.extract_arguments`, so the stream batches, decodes and
+    caches exactly like the other inference paths, and works for seq2seq and encoder-only models alike.
+
+    Attributes:
+        task (`str`): Task type. Selected in ['ED', 'EAE', 'EE'].
+        engine (`InferenceEngine`): Engine with the models of the task; its `batch_size` and `max_tokens` bound the
+            batches of a chunk.
+        schema (`str`): Schema of items without a `source` field, e.g. `"<ace>"`.
+    """
+
+    def __init__(self, task, engine, schema) -> None:
+        self.task = task
+        self.engine = engine
+        self.schema = schema
+
+    def prepare(self, lines: List[Tuple[int, Dict]]) -> Dict:
+        texts = [item["text"] for _, item in lines]
+        schemas = [item.get("source", self.schema) for _, item in lines]
+        data = dict(lines=lines, texts=texts, schemas=schemas)
+        if self.task == "EAE":
+            data["instances"] = prepare_for_eae_from_input(texts, [get_input_triggers(item) for _, item in lines],
+                                                           schemas)
+        return data
+
+    def detect(self, data: Dict) -> Dict:
+        if self.task != "EAE":
+            data["results"], data["instances"] = self.engine.detect_events(data["texts"], data["schemas"])
+        return data
+
+    def extract(self, data: Dict) -> Dict:
+        """Runs the EAE model on the instances of a chunk. This stage gets its own thread, so for EE, ED of the next
+        chunk overlaps with EAE of the current one."""
+        if self.task != "ED":
+            data["results"] = self.engine.extract_arguments(data.pop("instances"))
+        return data
+
+    def align(self, data: Dict) -> Tuple[List[Tuple[int, Dict]], List[Dict]]:
+        for (_, item), result in zip(data["lines"], data["results"]):
+            if "id" in item:
+                result["id"] = item["id"]
+        return data["lines"], data["results"]
+
+
+def stream_predictions(source: Union[str, Iterable],
+                       stages: StreamStages,
+                       start_line: int = 0,
+                       chunk_size: int = 256,
+                       queue_size: int = 2) -> Iterator[Tuple[List[Tuple[int, Dict]], List[Dict]]]:
+    """Streams `(lines, results)` chunk by chunk through read -> prepare -> ED -> EAE -> attach ids, skipping the
+    model stage the task does not use.
+
+    Every stage runs in its own thread and hands its output over through a queue holding at most `queue_size` chunks,
+    so memory is bounded by roughly `(number of stages + 1) * queue_size * chunk_size` items, regardless of the size
+    of `source`.
+    """
+    lines = prefetch(chunk(read_jsonl(source, start_line), chunk_size), queue_size)
+    data = prefetch(map(stages.prepare, lines), queue_size)
+    if stages.task != "EAE":
+        data = prefetch(map(stages.detect, data), queue_size)
+    if stages.task != "ED":
+        data = prefetch(map(stages.extract, data), queue_size)
+    return map(stages.align, data)
+
+
+def load_checkpoint(checkpoint_path: str) -> Dict[str, int]:
+    """Loads the number of consumed input lines and the matching output size, or zeros if there is no checkpoint."""
+    if checkpoint_path is None or not os.path.exists(checkpoint_path):
+        return {"line": 0, "out_offset": 0}
+    with open(checkpoint_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_checkpoint(checkpoint_path: str, line: int, out_offset: int) -> None:
+    """Atomically replaces the checkpoint."""
+    tmp_path = checkpoint_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"line": line, "out_offset": out_offset}, f)
+    os.replace(tmp_path, checkpoint_path)
+
+
+def write_stream(source: Union[str, Iterable],
+                 out_path: str,
+                 stages: StreamStages,
+                 checkpoint_path: Optional[str] = None,
+                 chunk_size: int = 256,
+                 queue_size: int = 2) -> int:
+    """Writes the results of `stream_predictions` to `out_path` as jsonl and checkpoints after every chunk.
+
+    If `checkpoint_path` exists, the output is truncated to the checkpointed size and reading resumes at the
+    checkpointed line, so an interrupted run neither loses nor duplicates results.
+
+    Returns:
+        The number of consumed input lines, including those of previous runs.
+    """
+    checkpoint = load_checkpoint(checkpoint_path)
+    line, out_offset = checkpoint["line"], checkpoint["out_offset"]
+    mode = "r+" if out_offset > 0 and os.path.exists(out_path) else "w"
+    with open(out_path, mode, encoding="utf-8") as out:
+        out.seek(out_offset)
+        out.truncate()
+        for lines, results in stream_predictions(source, stages, line, chunk_size, queue_size):
+            for result in results:
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            line = lines[-1][0] + 1
+            if checkpoint_path is not None:
+                os.fsync(out.fileno())
+                save_checkpoint(checkpoint_path, line, out.tell())
+    return line
+
+
+def pipelined_event_extraction(engine, texts, schemas, chunk_size=64, queue_size=2) -> List[Dict]:
+    """Event extraction with ED and EAE running concurrently on consecutive chunks of `texts`.
+
+    ED of chunk N+1 runs in one worker thread while EAE consumes the triggers of chunk N in another; the two are
+    connected by a queue of at most `queue_size` chunks. Results are identical to sequential EE and keep the order of
+    `texts`.
+    """
+    stages = StreamStages("EE", engine, None)
+    items = ({"text": text, "source": schema} for text, schema in zip(texts, schemas))
+    results = []
+    for _, chunk_results in stream_predictions(items, stages, 0, chunk_size, queue_size):
+        results.extend(chunk_results)
+    return results
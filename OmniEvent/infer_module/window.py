@@ -0,0 +1,135 @@
+from typing import Dict, List, Optional, Tuple
+
+from .encoder import get_word_offsets
+
+
+def get_windows(tokenizer, text: str, language: str, window_size: int, window_overlap: int) -> List[Tuple[int, int]]:
+    """Splits a text into overlapping windows of whole words.
+
+    Every window holds at most `window_size` tokens (a single word longer than that forms its own window), and
+    consecutive windows share the trailing words of the previous window that fit into `window_overlap` tokens.
+
+    Returns:
+        The `(char start, char end)` of every window.
+    """
+    offsets = get_word_offsets(text, language)
+    if len(offsets) == 0:
+        return [(0, len(text))]
+    words = [text[start:end] for start, end in offsets]
+    encoding = tokenizer(words, is_split_into_words=True, add_special_tokens=False)
+    counts = [0] * len(words)
+    for word_id in encoding.word_ids():
+        if word_id is not None:
+            counts[word_id] += 1
+    windows = []
+    start = 0
+    while True:
+        end, n_tokens = start, 0
+        while end < len(words) and (end == start or n_tokens + counts[end] <= window_size):
+            n_tokens += counts[end]
+            end += 1
+        windows.append((offsets[start][0], offsets[end - 1][1]))
+        if end == len(words):
+            return windows
+        # step back over the words that are read again by the next window
+        next_start, n_overlap = end, 0
+        while next_start - 1 > start and n_overlap + counts[next_start - 1] <= window_overlap:
+            next_start -= 1
+            n_overlap += counts[next_start]
+        start = next_start
+
+
+def get_window_triggers(windows: List[Tuple[int, int]], triggers: List[Tuple]) -> Tuple[List[Tuple[int, int]],
+                                                                                        List[List[Tuple]]]:
+    """Assigns every `(trigger word, char start, char end)` trigger to the windows containing it, with offsets
+    relative to the window. A trigger crossing a window border gets a window of its own."""
+    windows = list(windows)
+    window_triggers = [[] for _ in windows]
+    for trigger in triggers:
+        word, start, end = trigger[0], trigger[1], trigger[2]
+        inside = [i for i, (left, right) in enumerate(windows) if left <= start and end <= right]
+        if len(inside) == 0:
+            left = max([window[0] for window in windows if window[0] <= start], default=0)
+            windows.append((left, end))
+            window_triggers.append([])
+            inside = [len(windows) - 1]
+        for i in inside:
+            window_triggers[i].append((word, start - windows[i][0], end - windows[i][0]))
+    return windows, window_triggers
+
+
+def get_border_distance(offset: List[int], window: Tuple[int, int], text_length: int) -> float:
+    """Distance between a prediction and the nearest window border that is not a border of the whole text.
+    Predictions far from the borders have seen more context."""
+    left = offset[0] - window[0] if window[0] > 0 else float("inf")
+    right = window[1] - offset[1] if window[1] < text_length else float("inf")
+    return min(left, right)
+
+
+def shift(offset: List[int], delta: int) -> List[int]:
+    return [offset[0] + delta, offset[1] + delta]
+
+
+def merge_window_results(text: str, windows: List[Tuple[int, int]], results: List[Dict]) -> Dict:
+    """Merges the results of the windows of a text into one result with offsets relative to the text.
+
+    Events are de-duplicated by trigger offset and arguments by argument offset. When windows disagree, the
+    prediction that lies farthest from a window border wins.
+    """
+    events = {}
+    for window, result in zip(windows, results):
+        for event in result["events"]:
+            offset = shift(event["offset"], window[0])
+            distance = get_border_distance(offset, window, len(text))
+            key = tuple(offset)
+            if key not in events or distance > events[key][0]:
+                merged = dict(event, offset=offset)
+                if "arguments" in event:
+                    merged["arguments"] = events[key][1]["arguments"] if key in events else {}
+                events[key] = (distance, merged)
+            if "arguments" not in event:
+                continue
+            arguments = events[key][1]["arguments"]
+            for argument in event["arguments"]:
+                argument_offset = shift(argument["offset"], window[0])
+                argument_distance = get_border_distance(argument_offset, window, len(text))
+                argument_key = tuple(argument_offset)
+                if argument_key not in arguments or argument_distance > arguments[argument_key][0]:
+                    arguments[argument_key] = (argument_distance, dict(argument, offset=argument_offset))
+    merged_events = []
+    for key in sorted(events):
+        event = events[key][1]
+        if "arguments" in event:
+            event["arguments"] = [event["arguments"][k][1] for k in sorted(event["arguments"])]
+        merged_events.append(event)
+    return {"text": text, "events": merged_events}
+
+
+def split_documents(tokenizer, texts: List[str], languages: List[str], window_size: int, window_overlap: int,
+                    triggers: Optional[List[List[Tuple]]] = None):
+    """Splits all documents into windows.
+
+    Returns:
+        The windows of every document, the texts of all windows, the index of the document of every window and, if
+        `triggers` is given, the triggers of every window.
+    """
+    all_windows, window_texts, owners, window_triggers = [], [], [], []
+    for i, text in enumerate(texts):
+        windows = get_windows(tokenizer, text, languages[i], window_size, window_overlap)
+        if triggers is not None:
+            windows, triggers_per_window = get_window_triggers(windows, triggers[i])
+            window_triggers.extend(triggers_per_window)
+        all_windows.append(windows)
+        window_texts.extend(text[left:right] for left, right in windows)
+        owners.extend([i] * len(windows))
+    return all_windows, window_texts, owners, window_triggers if triggers is not None else None
+
+
+def merge_documents(texts: List[str], all_windows: List[List[Tuple[int, int]]], owners: List[int],
+                    window_results: List[Dict]) -> List[Dict]:
+    """Merges the results of all windows back into one result per document."""
+    results_per_text = [[] for _ in texts]
+    for owner, result in zip(owners, window_results):
+        results_per_text[owner].append(result)
+    return [merge_window_results(text, windows, results)
+            for text, windows, results in zip(texts, all_windows, results_per_text)]
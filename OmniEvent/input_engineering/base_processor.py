@@ -4,7 +4,11 @@ import torch
 import logging
 
 from torch.utils.data import Dataset
-from typing import Dict, List, Optional, Union
+from tqdm import tqdm
+from typing import Dict, Iterable, List, Optional, Union
+
+from .feature_cache import load_or_convert_features, read_cached_examples
+from .feature_store import FeatureStore, collate_features, get_pad_values
 
 logger = logging.getLogger(__name__)
 
@@ -238,15 +242,57 @@ class EDDataProcessor(Dataset):
         self.input_features = []
         self.is_overflow = []
 
+    @property
+    def examples(self) -> List[EDInputExample]:
+        """The `EDInputExample`s of the dataset, read from the input file on first access if the features were loaded
+        from the cache."""
+        if self._examples is None:
+            read_cached_examples(self)
+        return self._examples
+
+    @examples.setter
+    def examples(self, examples: Optional[List[EDInputExample]]) -> None:
+        self._examples = examples
+
+    def load_input(self,
+                   input_file: Optional[str]) -> None:
+        """Reads the examples of `input_file` and converts them into features, unless their features are cached.
+        Without `input_file` the processor stays empty, e.g. to convert streamed lines with `convert_lines`."""
+        if input_file is None:
+            return
+        self.load_or_convert_features(input_file)
+
     def read_examples(self,
-                      input_file: str):
+                      input_file: str) -> None:
         """Obtains a collection of `EDInputExample`s for the dataset."""
+        with open(input_file, "r", encoding="utf-8") as f:
+            self.read_lines(tqdm(f.readlines(), desc="Reading from %s" % input_file), input_file)
+
+    def read_lines(self,
+                   lines: Iterable[str],
+                   input_file: str) -> None:
+        """Obtains a collection of `EDInputExample`s from the json lines of `input_file`."""
         raise NotImplementedError
 
+    def convert_lines(self,
+                      lines: Iterable[str],
+                      input_file: str) -> List[EDInputFeatures]:
+        """Converts some json lines of `input_file` into features in this process and without caching them, replacing
+        the examples and features of the processor."""
+        self.is_overflow = []
+        self.read_lines(lines, input_file)
+        self.convert_examples_to_features()
+        return self.input_features
+
     def convert_examples_to_features(self):
         """Converts the `EDInputExample`s into `EDInputFeatures`s."""
         raise NotImplementedError
 
+    def load_or_convert_features(self,
+                                 input_file: str) -> None:
+        """Loads the features of `input_file` from `config.feature_cache_dir`, or reads, converts and caches them."""
+        load_or_convert_features(self, EDInputFeatures, input_file)
+
     def _truncate(self,
                   outputs: dict,
                   max_seq_length: int):
@@ -272,10 +318,17 @@ class EDDataProcessor(Dataset):
         """Returns the length of the examples."""
         return len(self.input_features)
 
+    def get_features(self,
+                     index: int):
+        """Returns the features of a given example index, without padding if `collate_fn` pads them in batches."""
+        if isinstance(self.input_features, FeatureStore):
+            return self.input_features.get(index, padded=not self.config.truncate_in_batch)
+        return self.input_features[index]
+
     def __getitem__(self,
                     index: int) -> Dict[str, torch.Tensor]:
         """Obtains the features of a given example index and converts them into a dictionary."""
-        features = self.input_features[index]
+        features = self.get_features(index)
         data_dict = dict(
             input_ids=torch.tensor(features.input_ids, dtype=torch.long),
             attention_mask=torch.tensor(features.attention_mask, dtype=torch.float32)
@@ -291,23 +344,8 @@ class EDDataProcessor(Dataset):
         return data_dict
 
     def collate_fn(self, batch) -> Dict[str, torch.Tensor]:
-        """Collates the samples in batches."""
-        output_batch = dict()
-        for key in batch[0].keys():
-            output_batch[key] = torch.stack([x[key] for x in batch], dim=0)
-        if self.config.truncate_in_batch:
-            input_length = int(output_batch["attention_mask"].sum(-1).max())
-            for key in ["input_ids", "attention_mask", "token_type_ids"]:
-                if key not in output_batch:
-                    continue
-                output_batch[key] = output_batch[key][:, :input_length]
-            if "labels" in output_batch and len(output_batch["labels"].shape) == 2:
-                if self.config.truncate_seq2seq_output:
-                    output_length = int((output_batch["labels"] != -100).sum(-1).max())
-                    output_batch["labels"] = output_batch["labels"][:, :output_length]
-                else:
-                    output_batch["labels"] = output_batch["labels"][:, :input_length]
-        return output_batch
+        """Collates the samples in batches, padding them to the longest sample of the batch."""
+        return collate_features(batch, self.config, get_pad_values(self.tokenizer))
 
 
 class EAEDataProcessor(Dataset):
@@ -342,6 +380,7 @@ class EAEDataProcessor(Dataset):
         self.config = config
         self.tokenizer = tokenizer
         self.is_training = is_training
+        self.pred_file = pred_file
         if hasattr(config, "role2id"):
             self.config.role2id["X"] = -100
         self.examples = []
@@ -360,15 +399,57 @@ class EAEDataProcessor(Dataset):
             logger.warning("Event predictions is none! We use golden triggers.")
             self.event_preds = None
 
+    @property
+    def examples(self) -> List[EAEInputExample]:
+        """The `EAEInputExample`s of the dataset, read from the input file on first access if the features were loaded
+        from the cache."""
+        if self._examples is None:
+            read_cached_examples(self)
+        return self._examples
+
+    @examples.setter
+    def examples(self, examples: Optional[List[EAEInputExample]]) -> None:
+        self._examples = examples
+
+    def load_input(self,
+                   input_file: Optional[str]) -> None:
+        """Reads the examples of `input_file` and converts them into features, unless their features are cached.
+        Without `input_file` the processor stays empty, e.g. to convert streamed lines with `convert_lines`."""
+        if input_file is None:
+            return
+        self.load_or_convert_features(input_file)
+
     def read_examples(self,
-                      input_file: str):
+                      input_file: str) -> None:
         """Obtains a collection of `EAEInputExample`s for the dataset."""
+        with open(input_file, "r", encoding="utf-8") as f:
+            self.read_lines(tqdm(f.readlines(), desc="Reading from %s" % input_file), input_file)
+
+    def read_lines(self,
+                   lines: Iterable[str],
+                   input_file: str) -> None:
+        """Obtains a collection of `EAEInputExample`s from the json lines of `input_file`."""
         raise NotImplementedError
 
+    def convert_lines(self,
+                      lines: Iterable[str],
+                      input_file: str) -> List[EAEInputFeatures]:
+        """Converts some json lines of `input_file` into features in this process and without caching them, replacing
+        the examples and features of the processor."""
+        self.is_overflow = []
+        self.read_lines(lines, input_file)
+        self.convert_examples_to_features()
+        return self.input_features
+
     def convert_examples_to_features(self):
         """Converts the `EAEInputExample`s into `EAEInputFeatures`s."""
         raise NotImplementedError
 
+    def load_or_convert_features(self,
+                                 input_file: str) -> None:
+        """Loads the features of `input_file` from `config.feature_cache_dir`, or reads, converts and caches them."""
+        load_or_convert_features(self, EAEInputFeatures, input_file, self.pred_file)
+
     def get_data_for_evaluation(self) -> Dict[str, Union[int, List[str]]]:
         """Obtains the data for evaluation."""
         self.data_for_evaluation["pred_types"] = self.get_pred_types()
@@ -439,10 +520,17 @@ class EAEDataProcessor(Dataset):
         """Returns the length of the examples."""
         return len(self.input_features)
 
+    def get_features(self,
+                     index: int):
+        """Returns the features of a given example index, without padding if `collate_fn` pads them in batches."""
+        if isinstance(self.input_features, FeatureStore):
+            return self.input_features.get(index, padded=not self.config.truncate_in_batch)
+        return self.input_features[index]
+
     def __getitem__(self,
                     index: int) -> Dict[str, torch.Tensor]:
         """Returns the features of a given example index in a dictionary."""
-        features = self.input_features[index]
+        features = self.get_features(index)
         data_dict = dict(
             input_ids=torch.tensor(features.input_ids, dtype=torch.long),
             attention_mask=torch.tensor(features.attention_mask, dtype=torch.float32)
@@ -466,20 +554,5 @@ class EAEDataProcessor(Dataset):
         return data_dict
 
     def collate_fn(self, batch) -> Dict[str, torch.Tensor]:
-        """Collates the samples in batches."""
-        output_batch = dict()
-        for key in batch[0].keys():
-            output_batch[key] = torch.stack([x[key] for x in batch], dim=0)
-        if self.config.truncate_in_batch:
-            input_length = int(output_batch["attention_mask"].sum(-1).max())
-            for key in ["input_ids", "attention_mask", "token_type_ids"]:
-                if key not in output_batch:
-                    continue
-                output_batch[key] = output_batch[key][:, :input_length]
-            if "labels" in output_batch and len(output_batch["labels"].shape) == 2:
-                if self.config.truncate_seq2seq_output:
-                    output_length = int((output_batch["labels"] != -100).sum(-1).max())
-                    output_batch["labels"] = output_batch["labels"][:, :output_length]
-                else:
-                    output_batch["labels"] = output_batch["labels"][:, :input_length]
-        return output_batch
+        """Collates the samples in batches, padding them to the longest sample of the batch."""
+        return collate_features(batch, self.config, get_pad_values(self.tokenizer))
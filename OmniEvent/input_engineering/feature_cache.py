@@ -0,0 +1,168 @@
+import os
+import copy
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+
+from typing import Any, Dict, Optional
+
+from .multiprocess import convert_features
+from .feature_store import FeatureStore, get_pad_values
+
+logger = logging.getLogger(__name__)
+
+# attributes that `read_examples` and `convert_examples_to_features` set besides `examples` and `input_features`
+CACHED_STATE = ["is_overflow", "data_for_evaluation", "positive_candidate_indices"]
+# the key of the state under which the settings of the config changed by `read_examples` are cached
+CONFIG_STATE = "config"
+# the data files of the splits are hashed separately, so that a change of one split does not invalidate the others
+SPLIT_FILES = ["train_file", "validation_file", "test_file", "train_pred_file", "validation_pred_file",
+               "test_pred_file"]
+# bumped when the layout of the cache changes, so that caches of older layouts are not read
+CACHE_VERSION = 3
+
+
+def hash_file(path: str, chunk_size: int = 1 << 20) -> str:
+    """Returns the sha256 of the contents of a file."""
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def get_tokenizer_fingerprint(tokenizer) -> str:
+    """Identifies a tokenizer by its class, name, special tokens, truncation settings and vocabulary."""
+    content = [
+        type(tokenizer).__name__,
+        getattr(tokenizer, "name_or_path", ""),
+        len(tokenizer),
+        getattr(tokenizer, "padding_side", None),
+        getattr(tokenizer, "truncation_side", None),
+        sorted(tokenizer.get_vocab().items()),
+    ]
+    return hashlib.sha256(json.dumps(content, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+
+def get_config_fingerprint(config) -> Dict[str, Any]:
+    """Returns the settings of `config` that features depend on, with paths of auxiliary files (templates, prompts,
+    label maps) replaced by the hash of their contents."""
+    settings = {}
+    for key, value in sorted(vars(config).items()):
+        if key in SPLIT_FILES or key in ["feature_cache_dir", "num_proc", "shuffle_buffer_size"]:
+            continue
+        if isinstance(value, str) and (key.endswith("_file") or key.endswith("_path")) and os.path.isfile(value):
+            value = hash_file(value)
+        settings[key] = value
+    return settings
+
+
+def get_cache_key(processor, input_file: str, pred_file: Optional[str] = None) -> str:
+    """Returns the key of the features of `processor` for `input_file`: a hash of the processor class, the contents of
+    the input (and prediction) file, the tokenizer and the data arguments."""
+    content = [
+        CACHE_VERSION,
+        type(processor).__name__,
+        hash_file(input_file),
+        hash_file(pred_file) if pred_file is not None and os.path.isfile(pred_file) else None,
+        getattr(processor, "is_training", None),
+        get_tokenizer_fingerprint(processor.tokenizer),
+        get_config_fingerprint(processor.config),
+    ]
+    return hashlib.sha256(json.dumps(content, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+
+def save_features(path: str, store: FeatureStore, state: Dict[str, Any]) -> None:
+    """Saves the columns of `store`, plus `state` as json, see `FeatureStore.save`.
+
+    The directory is written next to `path` first and then renamed, so readers never see a partial cache.
+    """
+    tmp_path = tempfile.mkdtemp(prefix=".tmp-", dir=os.path.dirname(path))
+    try:
+        store.state = state
+        store.save(tmp_path)
+        os.rename(tmp_path, path)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+
+def to_store(processor, features_cls: type) -> None:
+    """Replaces the list of features of `processor` by a `FeatureStore`, keeping the list if the features have
+    non-integer fields."""
+    try:
+        processor.input_features = FeatureStore.from_features(processor.input_features, features_cls,
+                                                              get_pad_values(processor.tokenizer))
+    except (ValueError, TypeError) as e:
+        logger.warning("Features are kept as python objects: %s" % e)
+
+
+def get_config_changes(config, settings: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns the plain settings of `config` that differ from `settings`, i.e. `vars(config)` at an earlier time."""
+    changes = {}
+    for key, value in vars(config).items():
+        if isinstance(value, (str, int, float, bool, type(None))) and (key not in settings or settings[key] != value):
+            changes[key] = value
+    return changes
+
+
+def read_cached_examples(processor) -> None:
+    """Reads the examples of a processor whose features were loaded from the cache, keeping the state loaded with the
+    features."""
+    state = {key: copy.copy(getattr(processor, key)) for key in CACHED_STATE if hasattr(processor, key)}
+    logger.info("Reading the examples of %s" % processor.input_file)
+    processor.read_examples(processor.input_file)
+    for key, value in state.items():
+        setattr(processor, key, value)
+
+
+def load_or_convert_features(processor, features_cls: type, input_file: str, pred_file: Optional[str] = None) -> None:
+    """Sets the features of `processor` as a `FeatureStore`, loaded from the cache in `config.feature_cache_dir` or
+    read, converted with `convert_features` and cached on a miss. Without `feature_cache_dir` the features are always
+    converted.
+
+    The cache is looked up before the examples are read: on a hit, `processor.examples` is set to `None` and the
+    examples are only read from `input_file` (by `read_cached_examples`) once they are needed, e.g. for evaluation.
+    """
+    processor.input_file = input_file
+    cache_dir = getattr(processor.config, "feature_cache_dir", None)
+    if cache_dir is None:
+        processor.read_examples(input_file)
+        convert_features(processor)
+        to_store(processor, features_cls)
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, get_cache_key(processor, input_file, pred_file))
+    if os.path.isdir(path):
+        # the examples are read from `input_file` when they are first accessed
+        processor.examples = None
+    else:
+        settings = dict(vars(processor.config))
+        processor.read_examples(input_file)
+        convert_features(processor)
+        to_store(processor, features_cls)
+        if not isinstance(processor.input_features, FeatureStore):
+            logger.warning("Features of %s are not cached." % input_file)
+            return
+        state = {key: getattr(processor, key) for key in CACHED_STATE if hasattr(processor, key)}
+        state[CONFIG_STATE] = get_config_changes(processor.config, settings)
+        try:
+            save_features(path, processor.input_features, state)
+        except TypeError as e:
+            logger.warning("Features of %s are not cached: %s" % (input_file, e))
+            return
+        except OSError:
+            # another process wrote the same cache first
+            if not os.path.isdir(path):
+                raise
+    logger.info("Loading cached features of %s from %s" % (input_file, path))
+    store = FeatureStore.load(path, features_cls)
+    processor.input_features = store
+    for key, value in store.state.items():
+        if key == CONFIG_STATE:
+            for name, setting in value.items():
+                setattr(processor.config, name, setting)
+        else:
+            setattr(processor, key, value)
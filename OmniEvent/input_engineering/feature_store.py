@@ -0,0 +1,215 @@
+import os
+import json
+
+import numpy as np
+import torch
+
+from typing import Any, Dict, Iterator, List, Optional
+
+# kinds of the value of a field in a single feature
+NONE, SCALAR, SEQUENCE = 0, 1, 2
+# fields aligned with the input tokens, padded to the longest input of a batch
+INPUT_KEYS = ["input_ids", "attention_mask", "token_type_ids"]
+
+
+def get_pad_values(tokenizer) -> Dict[str, int]:
+    """Returns the padding value of the sequence fields that are not padded with 0."""
+    pad_token_id = getattr(tokenizer, "pad_token_id", None)
+    return {"input_ids": pad_token_id if pad_token_id is not None else 0, "labels": -100}
+
+
+def get_dtype(array: np.ndarray) -> type:
+    """Returns the smallest integer type that holds the values of `array`."""
+    for dtype in [np.int8, np.int16, np.int32]:
+        info = np.iinfo(dtype)
+        if array.size == 0 or (info.min <= array.min() and array.max() <= info.max):
+            return dtype
+    return np.int64
+
+
+class FeatureStore(object):
+    """Read-only sequence of features, stored as one column of numpy arrays per field.
+
+    The values of a field are concatenated over all features into `<field>.values`, with `<field>.offsets` holding the
+    start of every feature and `<field>.kinds` whether a feature has no value, a scalar or a sequence. Sequences are
+    stored without their trailing padding and in the smallest integer type that holds them, and are padded again by
+    `get` or, to the longest sequence of a batch only, by `collate_features`.
+
+    Attributes:
+        features_cls (`type`):
+            `EDInputFeatures` or `EAEInputFeatures`, the type of the features returned by indexing.
+        example_ids (`list`):
+            The example id of every feature.
+        arrays (`Dict[str, tuple]`):
+            The values, offsets and kinds of every field.
+        widths (`Dict[str, int]`):
+            The padded length of every field, i.e. the length of its sequences before their padding was removed.
+        pad_values (`Dict[str, int]`):
+            The padding value of every field that is not padded with 0.
+        state (`Dict[str, Any]`):
+            Other state of the processor stored along with the features, see `feature_cache`.
+    """
+
+    def __init__(self,
+                 features_cls: type,
+                 example_ids: List,
+                 arrays: Dict[str, tuple],
+                 widths: Dict[str, int],
+                 pad_values: Dict[str, int],
+                 state: Optional[Dict[str, Any]] = None) -> None:
+        """Constructs a `FeatureStore`."""
+        self.features_cls = features_cls
+        self.example_ids = example_ids
+        self.arrays = arrays
+        self.widths = widths
+        self.pad_values = pad_values
+        self.state = state if state is not None else {}
+
+    @classmethod
+    def from_features(cls,
+                      features: List,
+                      features_cls: type,
+                      pad_values: Dict[str, int]) -> "FeatureStore":
+        """Builds the columns of a list of features, removing the trailing padding of their sequences.
+
+        Raises:
+            ValueError: If a field holds values that are neither integers nor flat integer sequences.
+        """
+        fields = [key for key in vars(features[0]) if key != "example_id"] if len(features) > 0 else []
+        arrays, widths = {}, {}
+        for field in fields:
+            pad_value = pad_values.get(field, 0)
+            kinds = np.zeros(len(features), dtype=np.int8)
+            offsets = np.zeros(len(features) + 1, dtype=np.int64)
+            values = []
+            width, total = 0, 0
+            for i, feature in enumerate(features):
+                value = getattr(feature, field)
+                if value is None:
+                    kinds[i] = NONE
+                elif isinstance(value, (list, tuple, np.ndarray)):
+                    kinds[i] = SEQUENCE
+                    sequence = np.asarray(value)
+                    if sequence.ndim != 1:
+                        raise ValueError("Field %s is not an integer or a sequence of integers" % field)
+                    width = max(width, len(sequence))
+                    # strip the trailing padding
+                    not_pad = np.flatnonzero(sequence != pad_value)
+                    values.append(sequence[:not_pad[-1] + 1 if len(not_pad) > 0 else 0])
+                else:
+                    kinds[i] = SCALAR
+                    values.append(np.asarray([value]))
+                if kinds[i] != NONE:
+                    total += len(values[-1])
+                offsets[i + 1] = total
+            array = np.concatenate(values) if len(values) > 0 else np.zeros(0, dtype=np.int32)
+            if array.size > 0 and not np.issubdtype(array.dtype, np.integer):
+                raise ValueError("Field %s is not an integer or a sequence of integers" % field)
+            arrays[field] = (array.astype(get_dtype(array)), offsets, kinds)
+            widths[field] = width
+        return cls(features_cls, [feature.example_id for feature in features], arrays, widths, pad_values)
+
+    @classmethod
+    def load(cls,
+             path: str,
+             features_cls: type) -> "FeatureStore":
+        """Memory-maps the columns written by `save`, so that only the pages of the accessed features are read."""
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = {}
+        for field in meta["fields"]:
+            arrays[field] = tuple(np.load(os.path.join(path, "%s.%s.npy" % (field, part)), mmap_mode="r")
+                                  for part in ["values", "offsets", "kinds"])
+        return cls(features_cls, meta["example_ids"], arrays, meta["widths"], meta["pad_values"], meta["state"])
+
+    def save(self,
+             path: str) -> None:
+        """Writes the columns as `.npy` files and the rest as `meta.json` into the directory `path`."""
+        for field, arrays in self.arrays.items():
+            for part, array in zip(["values", "offsets", "kinds"], arrays):
+                np.save(os.path.join(path, "%s.%s.npy" % (field, part)), array)
+        meta = {
+            "fields": list(self.arrays),
+            "example_ids": self.example_ids,
+            "widths": self.widths,
+            "pad_values": self.pad_values,
+            "state": self.state
+        }
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+    @property
+    def nbytes(self) -> int:
+        """The size of the columns in bytes."""
+        return sum(array.nbytes for arrays in self.arrays.values() for array in arrays)
+
+    def get_lengths(self,
+                    field: str = "attention_mask") -> np.ndarray:
+        """Returns the unpadded length of `field` of every feature."""
+        return np.diff(self.arrays[field][1])
+
+    def get(self,
+            index: int,
+            padded: bool = False):
+        """Returns the feature at `index` with zero-copy slices of the columns as sequences, or with the sequences
+        padded to their full width if `padded`."""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("FeatureStore index out of range")
+        kwargs = {}
+        for field, (values, offsets, kinds) in self.arrays.items():
+            kind = kinds[index]
+            if kind == NONE:
+                kwargs[field] = None
+            elif kind == SCALAR:
+                kwargs[field] = int(values[offsets[index]])
+            else:
+                kwargs[field] = values[offsets[index]:offsets[index + 1]]
+                if padded:
+                    sequence = np.full(self.widths[field], self.pad_values.get(field, 0), dtype=values.dtype)
+                    sequence[:len(kwargs[field])] = kwargs[field]
+                    kwargs[field] = sequence
+        return self.features_cls(example_id=self.example_ids[index], **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.example_ids)
+
+    def __getitem__(self, index: int):
+        return self.get(index)
+
+    def __iter__(self) -> Iterator:
+        for index in range(len(self)):
+            yield self[index]
+
+
+def collate_features(batch: List[Dict[str, torch.Tensor]],
+                     config,
+                     pad_values: Dict[str, int]) -> Dict[str, torch.Tensor]:
+    """Collates samples whose sequences may have different lengths, padding every sequence field to the longest one of
+    the batch.
+
+    With `config.truncate_in_batch`, the fields aligned with the input are padded (or cut) to the longest input of the
+    batch, and so are 2-d labels unless `config.truncate_seq2seq_output` cuts them to the longest output instead.
+    """
+    output_batch = dict()
+    input_length = None
+    if config.truncate_in_batch:
+        input_length = max(int(x["attention_mask"].sum()) for x in batch)
+    for key in batch[0].keys():
+        values = [x[key] for x in batch]
+        if values[0].dim() == 0:
+            output_batch[key] = torch.stack(values, dim=0)
+            continue
+        length = max(len(value) for value in values)
+        if input_length is not None:
+            if key in INPUT_KEYS or (key == "labels" and not config.truncate_seq2seq_output):
+                length = input_length
+            elif key == "labels":
+                length = max(int((value != -100).sum()) for value in values)
+        padded = torch.full((len(values), length), pad_values.get(key, 0), dtype=values[0].dtype)
+        for i, value in enumerate(values):
+            value = value[:length]
+            padded[i, :len(value)] = value
+        output_batch[key] = padded
+    return output_batch
@@ -0,0 +1,130 @@
+import copy
+import random
+import logging
+import itertools
+
+import torch
+
+from torch.utils.data import IterableDataset, get_worker_info
+from typing import Dict, Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class IterableProcessor(IterableDataset):
+    """Streams a unified-format file through a data processor without materializing all of its examples.
+
+    The lines of `input_file` are read lazily and sharded across the DataLoader workers: worker `i` of `n` keeps the
+    lines `i`, `i + n`, `i + 2n`, ... Every worker converts its lines in chunks of `chunk_size` with `processor_cls`,
+    so only one chunk of examples and features (plus the shuffle buffer) is held in memory per worker. If
+    `config.shuffle_buffer_size` is larger than 1, the features pass through a shuffle buffer of that size, seeded by
+    `seed`, the epoch and the worker.
+
+    Meant for training data: example ids restart in every chunk, and the predictions of a `pred_file` are looked up by
+    the index of the trigger within a chunk, so EAE processors should be streamed with golden event types.
+
+    Attributes:
+        processor_cls (`type`):
+            A subclass of `EDDataProcessor` or `EAEDataProcessor`, e.g. `EDSeq2SeqProcessor`.
+        config:
+            The pre-defined configurations of the execution.
+        tokenizer:
+            The tokenizer method proposed for the tokenization process.
+        input_file (`str`):
+            The unified-format jsonl file to stream.
+        args (`tuple`), kwargs (`dict`):
+            The further arguments of `processor_cls`, such as `pred_file` and `is_training` of EAE processors.
+        chunk_size (`int`):
+            The number of lines converted at once.
+        seed (`int`):
+            The seed of the shuffle buffer.
+        epoch (`int`):
+            The current epoch, set by the `Trainer` through `set_epoch` to reshuffle every epoch.
+        collator:
+            An empty `processor_cls` whose `collate_fn` collates the batches.
+    """
+
+    def __init__(self,
+                 processor_cls: type,
+                 config,
+                 tokenizer,
+                 input_file: str,
+                 *args,
+                 chunk_size: int = 256,
+                 seed: int = 42,
+                 **kwargs) -> None:
+        """Constructs an `IterableProcessor`."""
+        self.processor_cls = processor_cls
+        self.config = config
+        self.tokenizer = tokenizer
+        self.input_file = input_file
+        self.args = args
+        self.kwargs = kwargs
+        self.chunk_size = chunk_size
+        self.seed = seed
+        self.epoch = 0
+        self.collator = self.build_processor()
+
+    def set_epoch(self, epoch: int) -> None:
+        """Sets the epoch, which changes the order of the shuffle buffer."""
+        self.epoch = epoch
+
+    @staticmethod
+    def get_shard() -> Tuple[int, int]:
+        """Returns the id of the current DataLoader worker and the number of workers."""
+        worker_info = get_worker_info()
+        if worker_info is None:
+            return 0, 1
+        return worker_info.id, worker_info.num_workers
+
+    def read_lines(self,
+                   worker_id: int,
+                   num_workers: int) -> Iterator[str]:
+        """Yields the non-empty lines of the input file that belong to the worker."""
+        with open(self.input_file, "r", encoding="utf-8") as f:
+            for idx, line in enumerate(f):
+                if idx % num_workers == worker_id and line.strip():
+                    yield line
+
+    def build_processor(self):
+        """Builds an empty `processor_cls`, whose `convert_lines` converts the chunks of the input file."""
+        config = copy.copy(self.config)
+        # the chunks are neither cached nor converted in subprocesses of the DataLoader workers
+        config.feature_cache_dir = None
+        config.num_proc = 1
+        return self.processor_cls(config, self.tokenizer, None, *self.args, **self.kwargs)
+
+    def iter_features(self) -> Iterator[Dict[str, torch.Tensor]]:
+        """Yields the features of the lines of the current worker in the order of the file."""
+        processor = self.build_processor()
+        lines = self.read_lines(*self.get_shard())
+        while True:
+            chunk = list(itertools.islice(lines, self.chunk_size))
+            if len(chunk) == 0:
+                return
+            processor.convert_lines(chunk, self.input_file)
+            for idx in range(len(processor)):
+                yield processor[idx]
+
+    def __iter__(self) -> Iterator[Dict[str, torch.Tensor]]:
+        """Yields the features of the current worker, shuffled within a buffer of `config.shuffle_buffer_size`."""
+        buffer_size = getattr(self.config, "shuffle_buffer_size", 0) or 0
+        if buffer_size <= 1:
+            yield from self.iter_features()
+            return
+        worker_id, _ = self.get_shard()
+        rng = random.Random("%d-%d-%d" % (self.seed, self.epoch, worker_id))
+        buffer = []
+        for features in self.iter_features():
+            if len(buffer) < buffer_size:
+                buffer.append(features)
+                continue
+            idx = rng.randrange(buffer_size)
+            yield buffer[idx]
+            buffer[idx] = features
+        rng.shuffle(buffer)
+        yield from buffer
+
+    def collate_fn(self, batch) -> Dict[str, torch.Tensor]:
+        """Collates the samples in batches like `processor_cls` does."""
+        return self.collator.collate_fn(batch)
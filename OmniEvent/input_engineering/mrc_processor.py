@@ -14,17 +14,19 @@ from .base_processor import (
 from .mrc_converter import read_query_templates
 from .input_utils import get_words, get_left_and_right_pos, get_word_ids
 from collections import defaultdict
-from typing import List, Dict, Optional, Union
+from typing import Iterable, List, Dict, Optional, Union
 
 logger = logging.getLogger(__name__)
 
+# the query put before every text by `EDMRCProcessor`
+ED_MRC_QUERY = "verb".split()
 
 
 class EDMRCProcessor(EDDataProcessor):
     """Data processor for sequence labeling for event detection.
 
     Data processor for sequence labeling for event detection. The class is inherited from the `EDDataProcessor` class,
-    in which the undefined functions, including `read_examples()` and `convert_examples_to_features()` are  implemented;
+    in which the undefined functions, including `read_lines()` and `convert_examples_to_features()` are  implemented;
     a new function entitled `get_final_labels()` is defined to obtain final results, and the rest of the attributes and
     functions are multiplexed from the `EDDataProcessor` class.
 
@@ -38,45 +40,44 @@ class EDMRCProcessor(EDDataProcessor):
                  input_file: str) -> None:
         """Constructs a EDMRCProcessor."""
         super().__init__(config, tokenizer)
-        self.read_examples(input_file)
-        self.convert_examples_to_features()
+        self.load_input(input_file)
 
-    def read_examples(self,
-                      input_file: str) -> None:
-        """Obtains a collection of `EDInputExample`s for the dataset."""
+    def read_lines(self,
+                   lines: Iterable[str],
+                   input_file: str) -> None:
+        """Obtains a collection of `EDInputExample`s from the json lines of `input_file`."""
         self.examples = []
         language = self.config.language
 
-        with open(input_file, "r", encoding="utf-8") as f:
-            for line in tqdm(f.readlines(), desc="Reading from %s" % input_file):
-                item = json.loads(line.strip())
-                text = item["text"]
-                words = get_words(text=text, language=language)
-                labels = ["NA"] * len(words)
-
-                if "events" in item:
-                    for event in item["events"]:
-                        for trigger in event["triggers"]:
-                            left_pos, right_pos = get_left_and_right_pos(text, trigger, language, True)
-                            labels[left_pos] = f"{event['type']}"
-                            for i in range(left_pos + 1, right_pos):
-                                labels[i] = f"{event['type']}"
+        for line in lines:
+            item = json.loads(line.strip())
+            text = item["text"]
+            words = get_words(text=text, language=language)
+            labels = ["NA"] * len(words)
+
+            if "events" in item:
+                for event in item["events"]:
+                    for trigger in event["triggers"]:
+                        left_pos, right_pos = get_left_and_right_pos(text, trigger, language, True)
+                        labels[left_pos] = f"{event['type']}"
+                        for i in range(left_pos + 1, right_pos):
+                            labels[i] = f"{event['type']}"
+                example = EDInputExample(
+                                example_id=item["id"], 
+                                text=words, 
+                                labels=labels
+                            )
+                self.examples.append(example)
+            
+            # test set 
+            elif "candidates" in item:
+                for candidate in item["candidates"]:
                     example = EDInputExample(
-                                    example_id=item["id"], 
-                                    text=words, 
-                                    labels=labels
-                                )
+                        example_id=candidate["id"],
+                        text=words,
+                        labels=labels,
+                    )
                     self.examples.append(example)
-                
-                # test set 
-                elif "candidates" in item:
-                    for candidate in item["candidates"]:
-                        example = EDInputExample(
-                            example_id=candidate["id"],
-                            text=words,
-                            labels=labels,
-                        )
-                        self.examples.append(example)
 
 
     def get_final_labels(self,
@@ -100,10 +101,8 @@ class EDMRCProcessor(EDDataProcessor):
     def convert_examples_to_features(self) -> None:
         """Converts the `EDInputExample`s into `EDInputFeatures`s."""
         self.input_features = []
-        query_question = "verb".split()
-
         for example in tqdm(self.examples, desc="Processing features for SL"):
-            query = self.tokenizer(query_question,
+            query = self.tokenizer(ED_MRC_QUERY,
                                      truncation=False,
                                      is_split_into_words=True)
             max_seq_length = self.config.max_seq_length-len(query["input_ids"])
@@ -142,7 +141,7 @@ class EAEMRCProcessor(EAEDataProcessor):
     """Data processor for Machine Reading Comprehension (MRC) for event argument extraction.
 
     Data processor for Machine Reading Comprehension (MRC) for event argument extraction. The class is inherited from
-    the `EAEDataProcessor` class, in which the undefined functions, including `read_examples()` and
+    the `EAEDataProcessor` class, in which the undefined functions, including `read_lines()` and
     `convert_examples_to_features()` are implemented; a new function entitled `remove_sub_word()` is defined to remove
     the annotations whose word is a sub-word, the rest of the attributes and functions are multiplexed from the
     `EAEDataProcessor` class.
@@ -156,12 +155,12 @@ class EAEMRCProcessor(EAEDataProcessor):
                  is_training: bool = False) -> None:
         """Constructs a `EAEMRCProcessor`."""
         super().__init__(config, tokenizer, pred_file, is_training)
-        self.read_examples(input_file)
-        self.convert_examples_to_features()
+        self.load_input(input_file)
 
-    def read_examples(self,
-                      input_file: str) -> None:
-        """Obtains a collection of `EAEInputExample`s for the dataset."""
+    def read_lines(self,
+                   lines: Iterable[str],
+                   input_file: str) -> None:
+        """Obtains a collection of `EAEInputExample`s from the json lines of `input_file`."""
         self.examples = []
         self.data_for_evaluation["golden_arguments"] = []
         trigger_idx = 0
@@ -169,77 +168,61 @@ class EAEMRCProcessor(EAEDataProcessor):
                                                translate=self.config.dataset_name == "ACE2005-ZH")
         template_id = self.config.mrc_template_id
         language = self.config.language
-        with open(input_file, "r", encoding="utf-8") as f:
-            for idx, line in enumerate(tqdm(f.readlines(), desc="Reading from %s" % input_file)):
-                item = json.loads(line.strip())
-                text = item["text"]
-                words = get_words(text=text, language=language)
-                if "events" in item:
-                    for event in item["events"]:
-                        for trigger in event["triggers"]:
-                            pred_type = self.get_single_pred(trigger_idx, input_file, true_type=event["type"])
-                            trigger_idx += 1
-
-                            # Evaluation mode for EAE
-                            # If predicted event type is NA:
-                            #   in [default] and [loose] modes, we don't consider the trigger
-                            #   in [strict] mode, we consider the trigger
-                            if self.config.eae_eval_mode in ["default", "loose"] and pred_type == "NA":
-                                continue
-
-                            # golden label for the trigger
-                            arguments_per_trigger = dict(id=idx,
-                                                         arguments=[],
-                                                         pred_type=pred_type,
-                                                         true_type=event["type"])
-                            for argument in trigger["arguments"]:
-                                arguments_per_role = dict(role=argument["role"], mentions=[])
-                                for mention in argument["mentions"]:
-                                    left_pos, right_pos = get_left_and_right_pos(text, mention, language)
-                                    arguments_per_role["mentions"].append({
-                                        "position": [left_pos, right_pos - 1]
-                                    })
-                                arguments_per_trigger["arguments"].append(arguments_per_role)
-                            self.data_for_evaluation["golden_arguments"].append(arguments_per_trigger)
-
-                            if pred_type == "NA":
-                                assert self.config.eae_eval_mode == "strict"
-                                # in strict mode, we add the gold args for the trigger but do not make predictions
-                                continue
-
-                            trigger_left, trigger_right = get_left_and_right_pos(text, trigger, language)
-
-                            for role in query_templates[pred_type].keys():
-                                query = query_templates[pred_type][role][template_id]
-                                query = query.replace("[trigger]", self.tokenizer.tokenize(trigger["trigger_word"])[0])
-                                query = get_words(text=query, language=language)
-                                if self.is_training:
-                                    no_answer = True
-                                    for argument in trigger["arguments"]:
-                                        if argument["role"] not in query_templates[pred_type]:
-                                            logger.warning(
-                                                "No template for %s in %s" % (argument["role"], pred_type))
-                                            pass
-                                        if argument["role"] != role:
-                                            continue
-                                        no_answer = False
-                                        for mention in argument["mentions"]:
-                                            left_pos, right_pos = get_left_and_right_pos(text, mention, language)
-                                            example = EAEInputExample(
-                                                example_id=idx,
-                                                trigger_id=trigger_idx-1,
-                                                text=words,
-                                                pred_type=pred_type,
-                                                true_type=event["type"],
-                                                input_template=query,
-                                                trigger_left=trigger_left,
-                                                trigger_right=trigger_right,
-                                                argument_left=left_pos,
-                                                argument_right=right_pos - 1,
-                                                argument_role=role,
-                                            )
-                                            self.examples.append(example)
-                                    if no_answer:
+        for idx, line in enumerate(lines):
+            item = json.loads(line.strip())
+            text = item["text"]
+            words = get_words(text=text, language=language)
+            if "events" in item:
+                for event in item["events"]:
+                    for trigger in event["triggers"]:
+                        pred_type = self.get_single_pred(trigger_idx, input_file, true_type=event["type"])
+                        trigger_idx += 1
+
+                        # Evaluation mode for EAE
+                        # If predicted event type is NA:
+                        #   in [default] and [loose] modes, we don't consider the trigger
+                        #   in [strict] mode, we consider the trigger
+                        if self.config.eae_eval_mode in ["default", "loose"] and pred_type == "NA":
+                            continue
+
+                        # golden label for the trigger
+                        arguments_per_trigger = dict(id=idx,
+                                                     arguments=[],
+                                                     pred_type=pred_type,
+                                                     true_type=event["type"])
+                        for argument in trigger["arguments"]:
+                            arguments_per_role = dict(role=argument["role"], mentions=[])
+                            for mention in argument["mentions"]:
+                                left_pos, right_pos = get_left_and_right_pos(text, mention, language)
+                                arguments_per_role["mentions"].append({
+                                    "position": [left_pos, right_pos - 1]
+                                })
+                            arguments_per_trigger["arguments"].append(arguments_per_role)
+                        self.data_for_evaluation["golden_arguments"].append(arguments_per_trigger)
+
+                        if pred_type == "NA":
+                            assert self.config.eae_eval_mode == "strict"
+                            # in strict mode, we add the gold args for the trigger but do not make predictions
+                            continue
+
+                        trigger_left, trigger_right = get_left_and_right_pos(text, trigger, language)
+
+                        for role in query_templates[pred_type].keys():
+                            query = query_templates[pred_type][role][template_id]
+                            query = query.replace("[trigger]", self.tokenizer.tokenize(trigger["trigger_word"])[0])
+                            query = get_words(text=query, language=language)
+                            if self.is_training:
+                                no_answer = True
+                                for argument in trigger["arguments"]:
+                                    if argument["role"] not in query_templates[pred_type]:
+                                        logger.warning(
+                                            "No template for %s in %s" % (argument["role"], pred_type))
+                                        pass
+                                    if argument["role"] != role:
+                                        continue
+                                    no_answer = False
+                                    for mention in argument["mentions"]:
+                                        left_pos, right_pos = get_left_and_right_pos(text, mention, language)
                                         example = EAEInputExample(
                                             example_id=idx,
                                             trigger_id=trigger_idx-1,
@@ -249,13 +232,12 @@ class EAEMRCProcessor(EAEDataProcessor):
                                             input_template=query,
                                             trigger_left=trigger_left,
                                             trigger_right=trigger_right,
-                                            argument_left=-1,
-                                            argument_right=-1,
+                                            argument_left=left_pos,
+                                            argument_right=right_pos - 1,
                                             argument_role=role,
                                         )
                                         self.examples.append(example)
-                                else:
-                                    # one instance per query
+                                if no_answer:
                                     example = EAEInputExample(
                                         example_id=idx,
                                         trigger_id=trigger_idx-1,
@@ -270,59 +252,14 @@ class EAEMRCProcessor(EAEDataProcessor):
                                         argument_role=role,
                                     )
                                     self.examples.append(example)
-                    # negative triggers
-                    for neg_trigger in item["negative_triggers"]:
-                        pred_type = self.get_single_pred(trigger_idx, input_file, true_type="NA")
-                        trigger_idx += 1
-
-                        if self.config.eae_eval_mode == "loose":
-                            continue
-                        elif self.config.eae_eval_mode in ["default", "strict"]:
-                            if pred_type == "NA":
-                                continue
-                            trigger_left, trigger_right = get_left_and_right_pos(text, neg_trigger, language)
-
-                            for role in query_templates[pred_type].keys():
-                                query = query_templates[pred_type][role][template_id]
-                                query = query.replace("[trigger]",
-                                                      self.tokenizer.tokenize(neg_trigger["trigger_word"])[0])
-                                query = get_words(text=query, language=self.config.language)
-                                # one instance per query
-                                example = EAEInputExample(
-                                    example_id=idx,
-                                    trigger_id=trigger_idx-1,
-                                    text=words,
-                                    pred_type=pred_type,
-                                    true_type="NA",
-                                    input_template=query,
-                                    trigger_left=trigger_left,
-                                    trigger_right=trigger_right,
-                                    argument_left=-1,
-                                    argument_right=-1,
-                                    argument_role=role,
-                                )
-                                self.examples.append(example)
-
-                        else:
-                            raise ValueError("Invalid eae_eval_mode: %s" % self.config.eae_eval_mode)
-                else:
-                    for candi in item["candidates"]:
-                        trigger_left, trigger_right = get_left_and_right_pos(text, candi, language)
-
-                        pred_type = self.event_preds[trigger_idx]
-                        trigger_idx += 1
-                        if pred_type != "NA":
-                            for role in query_templates[pred_type].keys():
-                                query = query_templates[pred_type][role][template_id]
-                                query = query.replace("[trigger]", self.tokenizer.tokenize(candi["trigger_word"])[0])
-                                query = get_words(text=query, language=language)
+                            else:
                                 # one instance per query
                                 example = EAEInputExample(
                                     example_id=idx,
                                     trigger_id=trigger_idx-1,
                                     text=words,
                                     pred_type=pred_type,
-                                    true_type="NA",
+                                    true_type=event["type"],
                                     input_template=query,
                                     trigger_left=trigger_left,
                                     trigger_right=trigger_right,
@@ -331,8 +268,69 @@ class EAEMRCProcessor(EAEDataProcessor):
                                     argument_role=role,
                                 )
                                 self.examples.append(example)
-            if self.event_preds is not None:
-                assert trigger_idx == len(self.event_preds)
+                # negative triggers
+                for neg_trigger in item["negative_triggers"]:
+                    pred_type = self.get_single_pred(trigger_idx, input_file, true_type="NA")
+                    trigger_idx += 1
+
+                    if self.config.eae_eval_mode == "loose":
+                        continue
+                    elif self.config.eae_eval_mode in ["default", "strict"]:
+                        if pred_type == "NA":
+                            continue
+                        trigger_left, trigger_right = get_left_and_right_pos(text, neg_trigger, language)
+
+                        for role in query_templates[pred_type].keys():
+                            query = query_templates[pred_type][role][template_id]
+                            query = query.replace("[trigger]",
+                                                  self.tokenizer.tokenize(neg_trigger["trigger_word"])[0])
+                            query = get_words(text=query, language=self.config.language)
+                            # one instance per query
+                            example = EAEInputExample(
+                                example_id=idx,
+                                trigger_id=trigger_idx-1,
+                                text=words,
+                                pred_type=pred_type,
+                                true_type="NA",
+                                input_template=query,
+                                trigger_left=trigger_left,
+                                trigger_right=trigger_right,
+                                argument_left=-1,
+                                argument_right=-1,
+                                argument_role=role,
+                            )
+                            self.examples.append(example)
+
+                    else:
+                        raise ValueError("Invalid eae_eval_mode: %s" % self.config.eae_eval_mode)
+            else:
+                for candi in item["candidates"]:
+                    trigger_left, trigger_right = get_left_and_right_pos(text, candi, language)
+
+                    pred_type = self.event_preds[trigger_idx]
+                    trigger_idx += 1
+                    if pred_type != "NA":
+                        for role in query_templates[pred_type].keys():
+                            query = query_templates[pred_type][role][template_id]
+                            query = query.replace("[trigger]", self.tokenizer.tokenize(candi["trigger_word"])[0])
+                            query = get_words(text=query, language=language)
+                            # one instance per query
+                            example = EAEInputExample(
+                                example_id=idx,
+                                trigger_id=trigger_idx-1,
+                                text=words,
+                                pred_type=pred_type,
+                                true_type="NA",
+                                input_template=query,
+                                trigger_left=trigger_left,
+                                trigger_right=trigger_right,
+                                argument_left=-1,
+                                argument_right=-1,
+                                argument_role=role,
+                            )
+                            self.examples.append(example)
+        if self.event_preds is not None:
+            assert trigger_idx == len(self.event_preds)
 
     def convert_examples_to_features(self) -> None:
         """Converts the `EAEInputExample`s into `EAEInputFeatures`s."""
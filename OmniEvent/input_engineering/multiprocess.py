@@ -0,0 +1,74 @@
+import math
+import logging
+import multiprocessing
+
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# the processor being converted and its state before conversion, inherited by the forked workers instead of pickled
+_processor = None
+_examples = None
+_data_for_evaluation = None
+
+
+def _convert_chunk(bounds: Tuple[int, int]) -> Tuple[List, List, Dict]:
+    """Converts `examples[start:end]` of the inherited processor and returns its features and state."""
+    start, end = bounds
+    processor = _processor
+    processor.examples = _examples[start:end]
+    processor.is_overflow = []
+    if hasattr(processor, "data_for_evaluation"):
+        processor.data_for_evaluation = dict(_data_for_evaluation)
+    processor.convert_examples_to_features()
+    # only the entries rebound by the conversion are sent back, those set by `read_examples` are kept by the parent
+    data_for_evaluation = {key: value for key, value in getattr(processor, "data_for_evaluation", {}).items()
+                           if value is not _data_for_evaluation.get(key)}
+    return processor.input_features, processor.is_overflow, data_for_evaluation
+
+
+def get_chunks(n_examples: int, num_proc: int, chunks_per_proc: int = 4) -> List[Tuple[int, int]]:
+    """Cuts `range(n_examples)` into contiguous chunks, a few per process so that slow chunks even out."""
+    chunk_size = max(1, math.ceil(n_examples / (num_proc * chunks_per_proc)))
+    return [(start, min(start + chunk_size, n_examples)) for start in range(0, n_examples, chunk_size)]
+
+
+def convert_features(processor) -> None:
+    """Runs `convert_examples_to_features` of `processor`, in `config.num_proc` processes if it is larger than 1.
+
+    The examples are cut into contiguous chunks that are converted by a pool of forked processes, and the
+    `input_features`, `is_overflow` and the `data_for_evaluation` lists set by the conversion are concatenated in the
+    order of the examples, so the result is identical to a serial conversion. Falls back to a serial conversion on
+    platforms that cannot fork.
+
+    Raises:
+        ValueError: If the conversion sets a `data_for_evaluation` entry that is not a list, or not in every chunk,
+            since the entries of the chunks cannot be merged then.
+    """
+    global _processor, _examples, _data_for_evaluation
+    num_proc = getattr(processor.config, "num_proc", 1) or 1
+    if num_proc <= 1 or len(processor.examples) < 2:
+        processor.convert_examples_to_features()
+        return
+    if "fork" not in multiprocessing.get_all_start_methods():
+        logger.warning("Converting features in a single process, because processes cannot be forked here.")
+        processor.convert_examples_to_features()
+        return
+    examples = processor.examples
+    chunks = get_chunks(len(examples), num_proc)
+    _processor, _examples = processor, examples
+    _data_for_evaluation = dict(getattr(processor, "data_for_evaluation", {}))
+    try:
+        with multiprocessing.get_context("fork").Pool(min(num_proc, len(chunks))) as pool:
+            results = pool.map(_convert_chunk, chunks, chunksize=1)
+    finally:
+        _processor, _examples, _data_for_evaluation = None, None, None
+    processor.input_features = [features for chunk_features, _, _ in results for features in chunk_features]
+    processor.is_overflow = [flag for _, chunk_is_overflow, _ in results for flag in chunk_is_overflow]
+    keys = dict.fromkeys(key for _, _, chunk_data in results for key in chunk_data)
+    for key in keys:
+        values = [chunk_data.get(key) for _, _, chunk_data in results]
+        if not all(isinstance(value, list) for value in values):
+            raise ValueError("`data_for_evaluation[%r]` of the chunks cannot be merged, since it is not a list set "
+                             "by every chunk. Convert the features with `num_proc=1`." % key)
+        processor.data_for_evaluation[key] = [x for value in values for x in value]
@@ -0,0 +1,124 @@
+import numpy as np
+
+from torch.utils.data import Sampler
+from typing import Iterator, List, Optional, Union
+
+from .feature_store import FeatureStore
+from ..infer_module.seq2seq import get_length_batches
+
+
+def get_lengths(dataset) -> np.ndarray:
+    """Returns the number of input tokens of every sample of a data processor."""
+    if isinstance(dataset.input_features, FeatureStore):
+        return dataset.input_features.get_lengths("attention_mask")
+    return np.asarray([int(np.sum(features.attention_mask)) for features in dataset.input_features])
+
+
+def nested_reorder(tensors, indices: np.ndarray):
+    """Reorders the rows of (nested lists/tuples of) arrays."""
+    if isinstance(tensors, (list, tuple)):
+        return type(tensors)(nested_reorder(t, indices) for t in tensors)
+    return tensors[indices]
+
+
+class TokenBudgetBatchSampler(Sampler):
+    """Batch sampler grouping samples of similar length into batches under a token budget.
+
+    A batch holds samples while its size times its longest sample is at most `max_tokens` (and, if set, at most
+    `batch_size` samples), so that short samples form large batches and a long sample no longer pads a whole batch.
+    With `shuffle`, the samples are shuffled and cut into buckets of `bucket_size` once, each bucket is sorted by length
+    and cut into batches, and the batches of all buckets are shuffled again every epoch. Since only their order changes,
+    the number of batches is the same in every epoch. Without `shuffle`, all samples are sorted by length once, and
+    `get_order` tells the position of every sample.
+
+    Attributes:
+        lengths (`np.ndarray`):
+            The number of tokens of every sample.
+        max_tokens (`int`):
+            The maximum number of tokens of a batch after padding.
+        batch_size (`int`, `optional`):
+            The maximum number of samples of a batch.
+        bucket_size (`int`):
+            The number of samples sorted by length together when shuffling.
+        shuffle (`bool`):
+            Whether to shuffle the samples, for training.
+        seed (`int`):
+            The seed of the shuffling.
+        num_replicas (`int`), rank (`int`):
+            The number of distributed processes and the rank of the current one, which gets every `num_replicas`-th
+            batch.
+        epoch (`int`):
+            The current epoch, set by the `Trainer` through `set_epoch` to shuffle the batches every epoch.
+    """
+
+    def __init__(self,
+                 lengths: Union[List[int], np.ndarray],
+                 max_tokens: int,
+                 batch_size: Optional[int] = None,
+                 bucket_size: int = 1000,
+                 shuffle: bool = True,
+                 seed: int = 42,
+                 num_replicas: int = 1,
+                 rank: int = 0) -> None:
+        """Constructs a `TokenBudgetBatchSampler`."""
+        self.lengths = np.asarray(lengths)
+        self.max_tokens = max_tokens
+        self.batch_size = batch_size
+        self.bucket_size = bucket_size
+        self.shuffle = shuffle
+        self.seed = seed
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.epoch = 0
+        self._partition = None
+        self._batches = None
+
+    def set_epoch(self, epoch: int) -> None:
+        """Sets the epoch, which changes the order of the batches when shuffling."""
+        self.epoch = epoch
+
+    def get_partition(self) -> List[List[int]]:
+        """Returns the batches of all processes, in the order of the buckets they were cut from."""
+        if self._partition is not None:
+            return self._partition
+        batch_size = self.batch_size if self.batch_size is not None else max(1, len(self.lengths))
+        if not self.shuffle:
+            self._partition = get_length_batches(self.lengths.tolist(), batch_size, self.max_tokens)
+            return self._partition
+        permutation = np.random.RandomState(self.seed).permutation(len(self.lengths))
+        self._partition = []
+        for start in range(0, len(permutation), self.bucket_size):
+            bucket = permutation[start:start + self.bucket_size]
+            for batch in get_length_batches(self.lengths[bucket].tolist(), batch_size, self.max_tokens):
+                self._partition.append([int(bucket[idx]) for idx in batch])
+        return self._partition
+
+    def get_batches(self) -> List[List[int]]:
+        """Returns the batches of the current epoch for the current process."""
+        if self._batches is not None and self._batches[0] == self.epoch:
+            return self._batches[1]
+        batches = list(self.get_partition())
+        if self.shuffle:
+            np.random.RandomState(self.seed + self.epoch).shuffle(batches)
+        if self.num_replicas > 1:
+            # every process gets the same number of batches
+            batches += batches[:(-len(batches)) % self.num_replicas]
+            batches = batches[self.rank::self.num_replicas]
+        self._batches = (self.epoch, batches)
+        return batches
+
+    def get_order(self) -> np.ndarray:
+        """Returns the indices of the samples in the order they are batched."""
+        return np.asarray([idx for batch in self.get_batches() for idx in batch], dtype=np.int64)
+
+    def get_padding_ratio(self) -> float:
+        """Returns the share of padding tokens in the batches."""
+        padded = sum(len(batch) * int(self.lengths[batch].max()) for batch in self.get_batches())
+        tokens = sum(int(self.lengths[batch].sum()) for batch in self.get_batches())
+        return 1 - tokens / padded if padded > 0 else 0.0
+
+    def __iter__(self) -> Iterator[List[int]]:
+        return iter(self.get_batches())
+
+    def __len__(self) -> int:
+        return len(self.get_batches())
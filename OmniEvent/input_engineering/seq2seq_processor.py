@@ -1,7 +1,7 @@
 import re
 import json
 import logging
-from typing import List, Union, Tuple, Optional
+from typing import Iterable, List, Union, Tuple, Optional
 
 from tqdm import tqdm
 from collections import defaultdict
@@ -59,7 +59,7 @@ class EDSeq2SeqProcessor(EDDataProcessor):
     """Data processor for Sequence-to-Sequence (Seq2Seq) for event detection.
 
     Data processor for Sequence-to-Sequence (Seq2Seq) for event detection. The class is inherited from the
-    `EDDataProcessor` class, in which the undefined functions, including `read_examples()` and
+    `EDDataProcessor` class, in which the undefined functions, including `read_lines()` and
     `convert_examples_to_features()` are  implemented; the rest of the attributes and functions are multiplexed from the
     `EDDataProcessor` class.
     """
@@ -70,45 +70,44 @@ class EDSeq2SeqProcessor(EDDataProcessor):
                  input_file: str) -> None:
         """Constructs a `EDSeq2SeqProcessor`."""
         super().__init__(config, tokenizer)
-        self.read_examples(input_file)
-        self.convert_examples_to_features()
+        self.load_input(input_file)
     
-    def read_examples(self,
-                      input_file: str) -> None:
-        """Obtains a collection of `EDInputExample`s for the dataset."""
+    def read_lines(self,
+                   lines: Iterable[str],
+                   input_file: str) -> None:
+        """Obtains a collection of `EDInputExample`s from the json lines of `input_file`."""
         self.examples = []
-        with open(input_file, "r", encoding="utf-8") as f:
-            for idx, line in enumerate(tqdm(f.readlines(), desc="Reading from %s" % input_file)):
-                item = json.loads(line.strip())
-                if "source" in item:
-                    kwargs = {"source": [item["source"]]}
-                    if item["source"] in ["<duee>", "<fewfc>", "<leven>"]:
-                        self.config.language = "Chinese"
-                    else:
-                        self.config.language = "English"
+        for idx, line in enumerate(lines):
+            item = json.loads(line.strip())
+            if "source" in item:
+                kwargs = {"source": [item["source"]]}
+                if item["source"] in ["<duee>", "<fewfc>", "<leven>"]:
+                    self.config.language = "Chinese"
                 else:
-                    kwargs = {"source": []}
+                    self.config.language = "English"
+            else:
+                kwargs = {"source": []}
 
-                words = get_words(text=item["text"], language=self.config.language)
-                # training and valid set
-                if "events" in item:
-                    labels = []
-                    for event in item["events"]:
-                        type = get_plain_label(event["type"])
-                        for trigger in event["triggers"]:
-                            labels.append(f"{type_start} {type}{split_word} {trigger['trigger_word']} {type_end}")
-                    labels = "".join(labels)
+            words = get_words(text=item["text"], language=self.config.language)
+            # training and valid set
+            if "events" in item:
+                labels = []
+                for event in item["events"]:
+                    type = get_plain_label(event["type"])
+                    for trigger in event["triggers"]:
+                        labels.append(f"{type_start} {type}{split_word} {trigger['trigger_word']} {type_end}")
+                labels = "".join(labels)
 
-                    example = EDInputExample(
-                        example_id=idx,
-                        text=words,
-                        labels=labels,
-                        **kwargs,
-                    )
-                    self.examples.append(example)
-                else:
-                    example = EDInputExample(example_id=idx, text=words, labels="", **kwargs)
-                    self.examples.append(example)
+                example = EDInputExample(
+                    example_id=idx,
+                    text=words,
+                    labels=labels,
+                    **kwargs,
+                )
+                self.examples.append(example)
+            else:
+                example = EDInputExample(example_id=idx, text=words, labels="", **kwargs)
+                self.examples.append(example)
 
     def convert_examples_to_features(self) -> None:
         """Converts the `EDInputExample`s into `EDInputFeatures`s."""
@@ -143,7 +142,7 @@ class EAESeq2SeqProcessor(EAEDataProcessor):
     """Data processor for sequence to sequence for event argument extraction.
 
     Data processor for token classification for event argument extraction. The class is inherited from the
-    `EAEDataProcessor` class, in which the undefined functions, including `read_examples()` and
+    `EAEDataProcessor` class, in which the undefined functions, including `read_lines()` and
     `convert_examples_to_features()` are  implemented; a new function entitled `insert_marker()` is defined, and
     the rest of the attributes and functions are multiplexed from the `EAEDataProcessor` class.
     """
@@ -156,95 +155,73 @@ class EAESeq2SeqProcessor(EAEDataProcessor):
                  is_training: Optional[bool] = False) -> None:
         """Constructs a `EAESeq2SeqProcessor`."""
         super().__init__(config, tokenizer, pred_file, is_training)
-        self.read_examples(input_file)
-        self.convert_examples_to_features()
+        self.load_input(input_file)
     
-    def read_examples(self,
-                      input_file: str) -> None:
-        """Obtains a collection of `EAEInputExample`s for the dataset."""
+    def read_lines(self,
+                   lines: Iterable[str],
+                   input_file: str) -> None:
+        """Obtains a collection of `EAEInputExample`s from the json lines of `input_file`."""
         self.examples = []
         self.data_for_evaluation["golden_arguments"] = []
         self.data_for_evaluation["roles"] = []
         language = self.config.language
         trigger_idx = 0
-        with open(input_file, "r", encoding="utf-8") as f:
-            for line in tqdm(f.readlines(), desc="Reading from %s" % input_file):
-                item = json.loads(line.strip())
-                if "source" in item:
-                    kwargs = {"source": [item["source"]]}
-                    if item["source"] in ["<duee>", "<fewfc>", "<leven>"]:
-                        self.config.language = "Chinese"
-                    else:
-                        self.config.language = "English"
+        for line in lines:
+            item = json.loads(line.strip())
+            if "source" in item:
+                kwargs = {"source": [item["source"]]}
+                if item["source"] in ["<duee>", "<fewfc>", "<leven>"]:
+                    self.config.language = "Chinese"
                 else:
-                    kwargs = {"source": []}
-
-                text = item["text"]
-                words = get_words(text=text, language=language)
-
-                if "events" in item:
-                    for event in item["events"]:
-                        for trigger in event["triggers"]:
-                            pred_type = self.get_single_pred(trigger_idx, input_file, true_type=event["type"])
-                            pred_type = get_plain_label(pred_type)
-                            trigger_idx += 1
-
-                            # Evaluation mode for EAE
-                            # If the predicted event type is NA, We don't consider the trigger
-                            if self.config.eae_eval_mode in ["default", "loose"] and pred_type == "NA":
-                                continue
+                    self.config.language = "English"
+            else:
+                kwargs = {"source": []}
 
-                            labels = []
-                            arguments_per_trigger = defaultdict(list)
-                            for argument in trigger["arguments"]:
-                                role = get_plain_label(argument["role"])
-                                for mention in argument["mentions"]:
-                                    arguments_per_trigger[role].append(mention["mention"])
-                                    labels.append(f"{type_start} {role}{split_word} {mention['mention']} {type_end}")
-                            labels = "".join(labels)
+            text = item["text"]
+            words = get_words(text=text, language=language)
 
-                            self.data_for_evaluation["golden_arguments"].append(dict(arguments_per_trigger))
-                            example = EAEInputExample(
-                                example_id=trigger_idx - 1,
-                                text=words,
-                                pred_type=pred_type,
-                                true_type=get_plain_label(event["type"]),
-                                trigger_left=trigger["position"][0],
-                                trigger_right=trigger["position"][1],
-                                labels=labels,
-                                **kwargs,
-                            )
-                            self.examples.append(example)
-                    # negative triggers 
-                    for neg_trigger in item["negative_triggers"]:
-                        pred_type = self.get_single_pred(trigger_idx, input_file, true_type="NA")
+            if "events" in item:
+                for event in item["events"]:
+                    for trigger in event["triggers"]:
+                        pred_type = self.get_single_pred(trigger_idx, input_file, true_type=event["type"])
                         pred_type = get_plain_label(pred_type)
                         trigger_idx += 1
 
-                        if self.config.eae_eval_mode == "loose":
+                        # Evaluation mode for EAE
+                        # If the predicted event type is NA, We don't consider the trigger
+                        if self.config.eae_eval_mode in ["default", "loose"] and pred_type == "NA":
                             continue
-                        elif self.config.eae_eval_mode in ["default", "strict"]:
-                            if pred_type != "NA":
-                                arguments_per_trigger = {}
-                                self.data_for_evaluation["golden_arguments"].append(dict(arguments_per_trigger))
-                                example = EAEInputExample(
-                                    example_id=trigger_idx - 1,
-                                    text=words,
-                                    pred_type=pred_type,
-                                    true_type="NA",
-                                    trigger_left=neg_trigger["position"][0],
-                                    trigger_right=neg_trigger["position"][1],
-                                    labels="",
-                                    **kwargs,
-                                )
-                                self.examples.append(example)
-                        else:
-                            raise ValueError("Invaild eac_eval_mode: %s" % self.config.eae_eval_mode)
-                else:
-                    for candi in item["candidates"]:
-                        pred_type = self.event_preds[trigger_idx]
-                        pred_type = get_plain_label(pred_type)
-                        trigger_idx += 1
+
+                        labels = []
+                        arguments_per_trigger = defaultdict(list)
+                        for argument in trigger["arguments"]:
+                            role = get_plain_label(argument["role"])
+                            for mention in argument["mentions"]:
+                                arguments_per_trigger[role].append(mention["mention"])
+                                labels.append(f"{type_start} {role}{split_word} {mention['mention']} {type_end}")
+                        labels = "".join(labels)
+
+                        self.data_for_evaluation["golden_arguments"].append(dict(arguments_per_trigger))
+                        example = EAEInputExample(
+                            example_id=trigger_idx - 1,
+                            text=words,
+                            pred_type=pred_type,
+                            true_type=get_plain_label(event["type"]),
+                            trigger_left=trigger["position"][0],
+                            trigger_right=trigger["position"][1],
+                            labels=labels,
+                            **kwargs,
+                        )
+                        self.examples.append(example)
+                # negative triggers 
+                for neg_trigger in item["negative_triggers"]:
+                    pred_type = self.get_single_pred(trigger_idx, input_file, true_type="NA")
+                    pred_type = get_plain_label(pred_type)
+                    trigger_idx += 1
+
+                    if self.config.eae_eval_mode == "loose":
+                        continue
+                    elif self.config.eae_eval_mode in ["default", "strict"]:
                         if pred_type != "NA":
                             arguments_per_trigger = {}
                             self.data_for_evaluation["golden_arguments"].append(dict(arguments_per_trigger))
@@ -252,16 +229,37 @@ class EAESeq2SeqProcessor(EAEDataProcessor):
                                 example_id=trigger_idx - 1,
                                 text=words,
                                 pred_type=pred_type,
-                                true_type="NA",  # true type not given, set to NA.
-                                trigger_left=candi["position"][0],
-                                trigger_right=candi["position"][1],
+                                true_type="NA",
+                                trigger_left=neg_trigger["position"][0],
+                                trigger_right=neg_trigger["position"][1],
                                 labels="",
                                 **kwargs,
                             )
                             self.examples.append(example)
-            if self.event_preds is not None and not self.config.golden_trigger:
-                assert trigger_idx == len(self.event_preds)
-            print('there are {} examples'.format(len(self.examples)))
+                    else:
+                        raise ValueError("Invaild eac_eval_mode: %s" % self.config.eae_eval_mode)
+            else:
+                for candi in item["candidates"]:
+                    pred_type = self.event_preds[trigger_idx]
+                    pred_type = get_plain_label(pred_type)
+                    trigger_idx += 1
+                    if pred_type != "NA":
+                        arguments_per_trigger = {}
+                        self.data_for_evaluation["golden_arguments"].append(dict(arguments_per_trigger))
+                        example = EAEInputExample(
+                            example_id=trigger_idx - 1,
+                            text=words,
+                            pred_type=pred_type,
+                            true_type="NA",  # true type not given, set to NA.
+                            trigger_left=candi["position"][0],
+                            trigger_right=candi["position"][1],
+                            labels="",
+                            **kwargs,
+                        )
+                        self.examples.append(example)
+        if self.event_preds is not None and not self.config.golden_trigger:
+            assert trigger_idx == len(self.event_preds)
+        print('there are {} examples'.format(len(self.examples)))
 
     @staticmethod
     def insert_marker(tokens: List[str],
@@ -1,6 +1,6 @@
 import json
 import logging
-from typing import List, Union, Any, Optional
+from typing import Iterable, List, Union, Any, Optional
 
 from tqdm import tqdm
 from .input_utils import get_words, get_left_and_right_pos, get_word_ids
@@ -20,7 +20,7 @@ class EDSLProcessor(EDDataProcessor):
     """Data processor for sequence labeling for event detection.
 
     Data processor for sequence labeling for event detection. The class is inherited from the `EDDataProcessor` class,
-    in which the undefined functions, including `read_examples()` and `convert_examples_to_features()` are  implemented;
+    in which the undefined functions, including `read_lines()` and `convert_examples_to_features()` are  implemented;
     a new function entitled `get_final_labels()` is defined to obtain final results, and the rest of the attributes and
     functions are multiplexed from the `EDDataProcessor` class.
 
@@ -34,32 +34,31 @@ class EDSLProcessor(EDDataProcessor):
                  input_file: str) -> None:
         """Constructs a EDSLProcessor."""
         super().__init__(config, tokenizer)
-        self.read_examples(input_file)
-        self.convert_examples_to_features()
+        self.load_input(input_file)
 
-    def read_examples(self,
-                      input_file: str) -> None:
-        """Obtains a collection of `EDInputExample`s for the dataset."""
+    def read_lines(self,
+                   lines: Iterable[str],
+                   input_file: str) -> None:
+        """Obtains a collection of `EDInputExample`s from the json lines of `input_file`."""
         self.examples = []
         language = self.config.language
 
-        with open(input_file, "r", encoding="utf-8") as f:
-            for line in tqdm(f.readlines(), desc="Reading from %s" % input_file):
-                item = json.loads(line.strip())
-                text = item["text"]
-                words = get_words(text=text, language=language)
-                labels = ["O"] * len(words)
+        for line in lines:
+            item = json.loads(line.strip())
+            text = item["text"]
+            words = get_words(text=text, language=language)
+            labels = ["O"] * len(words)
 
-                if "events" in item:
-                    for event in item["events"]:
-                        for trigger in event["triggers"]:
-                            left_pos, right_pos = get_left_and_right_pos(text, trigger, language, True)
-                            labels[left_pos] = f"B-{event['type']}"
-                            for i in range(left_pos + 1, right_pos):
-                                labels[i] = f"I-{event['type']}"
+            if "events" in item:
+                for event in item["events"]:
+                    for trigger in event["triggers"]:
+                        left_pos, right_pos = get_left_and_right_pos(text, trigger, language, True)
+                        labels[left_pos] = f"B-{event['type']}"
+                        for i in range(left_pos + 1, right_pos):
+                            labels[i] = f"I-{event['type']}"
 
-                example = EDInputExample(example_id=item["id"], text=words, labels=labels)
-                self.examples.append(example)
+            example = EDInputExample(example_id=item["id"], text=words, labels=labels)
+            self.examples.append(example)
 
     def get_final_labels(self,
                          example: EDInputExample,
@@ -113,7 +112,7 @@ class EAESLProcessor(EAEDataProcessor):
     """Data processor for sequence labeling for event argument extraction.
 
     Data processor for sequence labeling for event argument extraction. The class is inherited from the
-    `EAEDataProcessor` class, in which the undefined functions, including `read_examples()` and
+    `EAEDataProcessor` class, in which the undefined functions, including `read_lines()` and
     `convert_examples_to_features()` are  implemented; twp new functions, entitled `get_final_labels()` and
     `insert_markers()` are defined, and the rest of the attributes and functions are multiplexed from the
     `EAEDataProcessor` class.
@@ -135,93 +134,92 @@ class EAESLProcessor(EAEDataProcessor):
         super().__init__(config, tokenizer, pred_file, is_training)
         self.positive_candidate_indices = []
         self.config.role2id["X"] = -100
-        self.read_examples(input_file)
-        self.convert_examples_to_features()
+        self.load_input(input_file)
 
-    def read_examples(self,
-                      input_file: str) -> None:
-        """Obtains a collection of `EAEInputExample`s for the dataset."""
+    def read_lines(self,
+                   lines: Iterable[str],
+                   input_file: str) -> None:
+        """Obtains a collection of `EAEInputExample`s from the json lines of `input_file`."""
         self.examples = []
         language = self.config.language
         trigger_idx = 0
-        with open(input_file, "r", encoding="utf-8") as f:
-            for line in tqdm(f.readlines(), desc="Reading from %s" % input_file):
-                item = json.loads(line.strip())
-                text = item["text"]
-                words = get_words(text=text, language=language)
-
-                if "events" in item:
-                    for event in item["events"]:
-                        for trigger in event["triggers"]:
-                            pred_type = self.get_single_pred(trigger_idx, input_file, true_type=event["type"])
-                            trigger_idx += 1
-
-                            # Evaluation mode for EAE
-                            # If the predicted event type is NA, We don't consider the trigger
-                            if self.config.eae_eval_mode in ["default", "loose"] and pred_type == "NA":
-                                continue
-                            trigger_left, trigger_right = get_left_and_right_pos(text, trigger, language, True)
-                            labels = ["O"] * len(words)
-
-                            for argument in trigger["arguments"]:
-                                for mention in argument["mentions"]:
-                                    left_pos, right_pos = get_left_and_right_pos(text, mention, language, True)
-                                    labels[left_pos] = f"B-{argument['role']}"
-                                    for i in range(left_pos + 1, right_pos):
-                                        labels[i] = f"I-{argument['role']}"
-
-                            example = EAEInputExample(
-                                example_id=item["id"],
-                                text=words,
-                                pred_type=pred_type,
-                                true_type=event["type"],
-                                trigger_left=trigger_left,
-                                trigger_right=trigger_right,
-                                labels=labels,
-                            )
-                            self.examples.append(example)
+        for line in lines:
+            item = json.loads(line.strip())
+            text = item["text"]
+            words = get_words(text=text, language=language)
+
+            if "events" in item:
+                for event in item["events"]:
+                    for trigger in event["triggers"]:
+                        pred_type = self.get_single_pred(trigger_idx, input_file, true_type=event["type"])
+                        trigger_idx += 1
 
-                    # negative triggers
-                    for neg in item["negative_triggers"]:
-                        pred_type = self.get_single_pred(trigger_idx, input_file, true_type="NA")
-                        trigger_idx += 1         
-                        if self.config.eae_eval_mode == "loose":
+                        # Evaluation mode for EAE
+                        # If the predicted event type is NA, We don't consider the trigger
+                        if self.config.eae_eval_mode in ["default", "loose"] and pred_type == "NA":
                             continue
-                        elif self.config.eae_eval_mode in ["default", "strict"]:
-                            if pred_type != "NA":
-                                neg_left, neg_right = get_left_and_right_pos(text, neg, language, True)
-                                example = EAEInputExample(
-                                    example_id=item["id"],
-                                    text=words,
-                                    pred_type=pred_type,
-                                    true_type="NA",
-                                    trigger_left=neg_left,
-                                    trigger_right=neg_right,
-                                    labels=["O"] * len(words),
-                                )
-                                self.examples.append(example)
-                        else:
-                            raise ValueError("Invalid eac_eval_mode: %s" % self.config.eae_eval_mode)
-                else:
-                    for can in item["candidates"]:
-                        can_left, can_right = get_left_and_right_pos(text, can, language, True)
+                        trigger_left, trigger_right = get_left_and_right_pos(text, trigger, language, True)
                         labels = ["O"] * len(words)
-                        pred_type = self.event_preds[trigger_idx]
-                        trigger_idx += 1
+
+                        for argument in trigger["arguments"]:
+                            for mention in argument["mentions"]:
+                                left_pos, right_pos = get_left_and_right_pos(text, mention, language, True)
+                                labels[left_pos] = f"B-{argument['role']}"
+                                for i in range(left_pos + 1, right_pos):
+                                    labels[i] = f"I-{argument['role']}"
+
+                        example = EAEInputExample(
+                            example_id=item["id"],
+                            text=words,
+                            pred_type=pred_type,
+                            true_type=event["type"],
+                            trigger_left=trigger_left,
+                            trigger_right=trigger_right,
+                            labels=labels,
+                        )
+                        self.examples.append(example)
+
+                # negative triggers
+                for neg in item["negative_triggers"]:
+                    pred_type = self.get_single_pred(trigger_idx, input_file, true_type="NA")
+                    trigger_idx += 1         
+                    if self.config.eae_eval_mode == "loose":
+                        continue
+                    elif self.config.eae_eval_mode in ["default", "strict"]:
                         if pred_type != "NA":
+                            neg_left, neg_right = get_left_and_right_pos(text, neg, language, True)
                             example = EAEInputExample(
                                 example_id=item["id"],
                                 text=words,
                                 pred_type=pred_type,
-                                true_type="NA",  # true type not given, set to NA.
-                                trigger_left=can_left,
-                                trigger_right=can_right,
-                                labels=labels,
+                                true_type="NA",
+                                trigger_left=neg_left,
+                                trigger_right=neg_right,
+                                labels=["O"] * len(words),
                             )
                             self.examples.append(example)
-                            self.positive_candidate_indices.append(trigger_idx-1)
-            if self.event_preds is not None:
-                assert trigger_idx == len(self.event_preds)
+                    else:
+                        raise ValueError("Invalid eac_eval_mode: %s" % self.config.eae_eval_mode)
+            else:
+                for can in item["candidates"]:
+                    can_left, can_right = get_left_and_right_pos(text, can, language, True)
+                    labels = ["O"] * len(words)
+                    pred_type = self.event_preds[trigger_idx]
+                    trigger_idx += 1
+                    if pred_type != "NA":
+                        example = EAEInputExample(
+                            example_id=item["id"],
+                            text=words,
+                            pred_type=pred_type,
+                            true_type="NA",  # true type not given, set to NA.
+                            trigger_left=can_left,
+                            trigger_right=can_right,
+                            labels=labels,
+                        )
+                        self.examples.append(example)
+                        self.positive_candidate_indices.append(trigger_idx-1)
+        if self.event_preds is not None:
+            assert trigger_idx == len(self.event_preds)
 
     def get_final_labels(self,
                          labels: dict,
@@ -2,7 +2,7 @@ import json
 import logging
 
 from tqdm import tqdm
-from typing import List, Optional, Dict
+from typing import Iterable, List, Optional, Dict
 
 from .input_utils import check_is_argument, get_negative_argument_candidates, get_word_ids, char_pos_to_word_pos
 from .base_processor import (
@@ -21,7 +21,7 @@ class EDTCProcessor(EDDataProcessor):
     """Data processor for token classification for event detection.
 
     Data processor for token classification for event detection. The class is inherited from the`EDDataProcessor` class,
-    in which the undefined functions, including `read_examples()` and `convert_examples_to_features()` are  implemented;
+    in which the undefined functions, including `read_lines()` and `convert_examples_to_features()` are  implemented;
     the rest of the attributes and functions are multiplexed from the `EDDataProcessor` class.
     """
 
@@ -31,49 +31,48 @@ class EDTCProcessor(EDDataProcessor):
                  input_file: str) -> None:
         """Constructs an EDTCProcessor."""
         super().__init__(config, tokenizer)
-        self.read_examples(input_file)
-        self.convert_examples_to_features()
+        self.load_input(input_file)
 
-    def read_examples(self,
-                      input_file: str) -> None:
-        """Obtains a collection of `EDInputExample`s for the dataset."""
+    def read_lines(self,
+                   lines: Iterable[str],
+                   input_file: str) -> None:
+        """Obtains a collection of `EDInputExample`s from the json lines of `input_file`."""
         self.examples = []
-        with open(input_file, "r") as f:
-            for line in tqdm(f.readlines(), desc="Reading from %s" % input_file):
-                item = json.loads(line.strip())
-                # training and valid set
-                if "events" in item:
-                    for event in item["events"]:
-                        for trigger in event["triggers"]:
-                            example = EDInputExample(
-                                example_id=trigger["id"],
-                                text=item["text"],
-                                trigger_left=trigger["position"][0],
-                                trigger_right=trigger["position"][1],
-                                labels=event["type"],
-                            )
-                            self.examples.append(example)
-                if "negative_triggers" in item:
-                    for neg in item["negative_triggers"]:
+        for line in lines:
+            item = json.loads(line.strip())
+            # training and valid set
+            if "events" in item:
+                for event in item["events"]:
+                    for trigger in event["triggers"]:
                         example = EDInputExample(
-                            example_id=neg["id"],
+                            example_id=trigger["id"],
                             text=item["text"],
-                            trigger_left=neg["position"][0],
-                            trigger_right=neg["position"][1],
-                            labels="NA",
-                        )
-                        self.examples.append(example)
-                # test set 
-                if "candidates" in item:
-                    for candidate in item["candidates"]:
-                        example = EDInputExample(
-                            example_id=candidate["id"],
-                            text=item["text"],
-                            trigger_left=candidate["position"][0],
-                            trigger_right=candidate["position"][1],
-                            labels="NA",
+                            trigger_left=trigger["position"][0],
+                            trigger_right=trigger["position"][1],
+                            labels=event["type"],
                         )
                         self.examples.append(example)
+            if "negative_triggers" in item:
+                for neg in item["negative_triggers"]:
+                    example = EDInputExample(
+                        example_id=neg["id"],
+                        text=item["text"],
+                        trigger_left=neg["position"][0],
+                        trigger_right=neg["position"][1],
+                        labels="NA",
+                    )
+                    self.examples.append(example)
+            # test set 
+            if "candidates" in item:
+                for candidate in item["candidates"]:
+                    example = EDInputExample(
+                        example_id=candidate["id"],
+                        text=item["text"],
+                        trigger_left=candidate["position"][0],
+                        trigger_right=candidate["position"][1],
+                        labels="NA",
+                    )
+                    self.examples.append(example)
 
     def convert_examples_to_features(self) -> None:
         """Converts the `EDInputExample`s into `EDInputFeatures`s."""
@@ -143,7 +142,7 @@ class EAETCProcessor(EAEDataProcessor):
     """Data processor for token classification for event argument extraction.
 
     Data processor for token classification for event argument extraction. The class is inherited from the
-    `EAEDataProcessor` class, in which the undefined functions, including `read_examples()` and
+    `EAEDataProcessor` class, in which the undefined functions, including `read_lines()` and
     `convert_examples_to_features()` are  implemented; a new function entitled `insert_marker()` is defined, and
     the rest of the attributes and functions are multiplexed from the `EAEDataProcessor` class.
     """
@@ -156,65 +155,63 @@ class EAETCProcessor(EAEDataProcessor):
                  is_training: Optional[bool] = False):
         """Constructs a `EAETCProcessor`."""
         super().__init__(config, tokenizer, pred_file, is_training)
-        self.read_examples(input_file)
-        self.convert_examples_to_features()
+        self.load_input(input_file)
 
-    def read_examples(self,
-                      input_file: str) -> None:
-        """Obtains a collection of `EAEInputExample`s for the dataset."""
+    def read_lines(self,
+                   lines: Iterable[str],
+                   input_file: str) -> None:
+        """Obtains a collection of `EAEInputExample`s from the json lines of `input_file`."""
         self.examples = []
         trigger_idx = 0
-        with open(input_file, "r") as f:
-            all_lines = f.readlines()
-            for line in tqdm(all_lines, desc="Reading from %s" % input_file):
-                item = json.loads(line.strip())
-                if "events" in item:
-                    for event in item["events"]:
-                        for trigger in event["triggers"]:
-                            pred_type = self.get_single_pred(trigger_idx, input_file, true_type=event["type"])
-                            trigger_idx += 1
-
-                            if self.config.eae_eval_mode in ['default', 'loose'] and pred_type == "NA":
-                                continue
-
-                            positive_offsets = []
-                            for argument in trigger["arguments"]:
-                                for mention in argument["mentions"]:
-                                    example = EAEInputExample(
-                                        example_id=trigger["id"],
-                                        text=item["text"],
-                                        pred_type=pred_type,
-                                        true_type=event["type"],
-                                        trigger_left=trigger["position"][0],
-                                        trigger_right=trigger["position"][1],
-                                        argument_left=mention["position"][0],
-                                        argument_right=mention["position"][1],
-                                        labels=argument["role"],
-                                    )
-                                    positive_offsets.append(mention["position"])
-                                    self.examples.append(example)
-
-                            self.add_negative_arguments(item=item, trigger=trigger, pred_type=pred_type,
-                                                        true_type=event["type"], positive_offsets=positive_offsets)
-
-                    # negative triggers
-                    for trigger in item["negative_triggers"]:
-                        if self.config.eae_eval_mode in ['default', 'strict']:
-                            pred_type = self.get_single_pred(trigger_idx, input_file, true_type="NA")
-                            if pred_type != "NA":
-                                self.add_negative_arguments(item=item, trigger=trigger, pred_type=pred_type,
-                                                            true_type="NA")
+        for line in lines:
+            item = json.loads(line.strip())
+            if "events" in item:
+                for event in item["events"]:
+                    for trigger in event["triggers"]:
+                        pred_type = self.get_single_pred(trigger_idx, input_file, true_type=event["type"])
                         trigger_idx += 1
 
-                if "candidates" in item:
-                    for candi in item["candidates"]:
-                        pred_type = self.event_preds[trigger_idx]   # we can only use pred type here, gold not available
+                        if self.config.eae_eval_mode in ['default', 'loose'] and pred_type == "NA":
+                            continue
+
+                        positive_offsets = []
+                        for argument in trigger["arguments"]:
+                            for mention in argument["mentions"]:
+                                example = EAEInputExample(
+                                    example_id=trigger["id"],
+                                    text=item["text"],
+                                    pred_type=pred_type,
+                                    true_type=event["type"],
+                                    trigger_left=trigger["position"][0],
+                                    trigger_right=trigger["position"][1],
+                                    argument_left=mention["position"][0],
+                                    argument_right=mention["position"][1],
+                                    labels=argument["role"],
+                                )
+                                positive_offsets.append(mention["position"])
+                                self.examples.append(example)
+
+                        self.add_negative_arguments(item=item, trigger=trigger, pred_type=pred_type,
+                                                    true_type=event["type"], positive_offsets=positive_offsets)
+
+                # negative triggers
+                for trigger in item["negative_triggers"]:
+                    if self.config.eae_eval_mode in ['default', 'strict']:
+                        pred_type = self.get_single_pred(trigger_idx, input_file, true_type="NA")
                         if pred_type != "NA":
-                            self.add_negative_arguments(item=item, trigger=candi, pred_type=pred_type, true_type="NA")
-                        trigger_idx += 1
-
-            if self.event_preds is not None:
-                assert trigger_idx == len(self.event_preds)
+                            self.add_negative_arguments(item=item, trigger=trigger, pred_type=pred_type,
+                                                        true_type="NA")
+                    trigger_idx += 1
+
+            if "candidates" in item:
+                for candi in item["candidates"]:
+                    pred_type = self.event_preds[trigger_idx]   # we can only use pred type here, gold not available
+                    if pred_type != "NA":
+                        self.add_negative_arguments(item=item, trigger=candi, pred_type=pred_type, true_type="NA")
+                    trigger_idx += 1
+
+        if self.event_preds is not None:
+            assert trigger_idx == len(self.event_preds)
 
     @staticmethod
     def insert_marker(text: str,
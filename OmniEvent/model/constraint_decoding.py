@@ -7,6 +7,8 @@ from typing import List, Dict
 import os
 import re 
 import sys 
+import math
+import torch
 sys.path.append("../")
 import pdb
 
@@ -15,6 +17,7 @@ import pdb
 debug = False
 debug_step = False 
 
+from transformers import LogitsProcessor
 from ..input_engineering.seq2seq_processor import type_start, type_end
 
 
@@ -61,20 +64,93 @@ def find_bracket_position(generated_text, _type_start, _type_end):
     return bracket_position
 
 
-def generated_search_src_sequence(generated, src_sequence, end_sequence_search_tokens=None):
+class SourceIndex(object):
+    """Suffix automaton over a source token sequence.
+
+    Finds the tokens that can follow a generated span in the source without rescanning the source: the span is
+    matched by following the automaton transitions, and the states of spans seen before are memoized, so extending the
+    span of the previous decoding step by one token is a single dict lookup.
+
+    Attributes:
+        sequence (`List[int]`):
+            The indexed source sequence.
+    """
+
+    def __init__(self, sequence: List[int]) -> None:
+        """Constructs a `SourceIndex` in O(len(sequence))."""
+        self.sequence = sequence
+        self.transitions = [dict()]
+        self.link = [-1]
+        self.length = [0]
+        last = 0
+        for token in sequence:
+            current = self._add_state(self.length[last] + 1, dict(), 0)
+            state = last
+            while state != -1 and token not in self.transitions[state]:
+                self.transitions[state][token] = current
+                state = self.link[state]
+            if state != -1:
+                next_state = self.transitions[state][token]
+                if self.length[state] + 1 == self.length[next_state]:
+                    self.link[current] = next_state
+                else:
+                    clone = self._add_state(self.length[state] + 1, dict(self.transitions[next_state]),
+                                            self.link[next_state])
+                    while state != -1 and self.transitions[state].get(token) == next_state:
+                        self.transitions[state][token] = clone
+                        state = self.link[state]
+                    self.link[next_state] = clone
+                    self.link[current] = clone
+            last = current
+        self._span_states = {(): 0}
+
+    def _add_state(self, length, transitions, link):
+        self.length.append(length)
+        self.transitions.append(transitions)
+        self.link.append(link)
+        return len(self.length) - 1
+
+    def get_state(self, span: List[int]) -> int:
+        """Returns the automaton state of `span`, or -1 if `span` does not occur in the source."""
+        key = tuple(span)
+        state = self._span_states.get(key)
+        if state is not None:
+            return state
+        parent = self._span_states.get(key[:-1])
+        if parent is not None:
+            state = self.transitions[parent].get(key[-1], -1) if parent != -1 else -1
+        else:
+            state = 0
+            for token in key:
+                state = self.transitions[state].get(token, -1)
+                if state == -1:
+                    break
+        self._span_states[key] = state
+        return state
+
+    def next_tokens(self, span: List[int]) -> List[int]:
+        """Returns the tokens that follow an occurrence of `span` in the source."""
+        state = self.get_state(span)
+        return list(self.transitions[state].keys()) if state != -1 else []
+
+
+def generated_search_src_sequence(generated, src_sequence, end_sequence_search_tokens=None, src_index=None):
     # print(generated, src_sequence) if debug else None
 
     if len(generated) == 0:
         # It has not been generated yet. All SRC are valid.
         return src_sequence
 
-    matched_tuples = match_sublist(the_list=src_sequence, to_match=generated)
+    if src_index is not None:
+        valid_token = src_index.next_tokens(generated)
+    else:
+        matched_tuples = match_sublist(the_list=src_sequence, to_match=generated)
 
-    valid_token = list()
-    for _, end in matched_tuples:
-        next_index = end + 1
-        if next_index < len(src_sequence):
-            valid_token += [src_sequence[next_index]]
+        valid_token = list()
+        for _, end in matched_tuples:
+            next_index = end + 1
+            if next_index < len(src_sequence):
+                valid_token += [src_sequence[next_index]]
 
     if end_sequence_search_tokens:
         valid_token += end_sequence_search_tokens
@@ -93,10 +169,25 @@ class ConstraintDecoder:
         self.source_prefix_tokenized = tokenizer.encode(source_prefix,
                                                         add_special_tokens=False) if source_prefix else []
 
-    def get_state_valid_tokens(self, src_sentence: List[str], tgt_generated: List[str]) -> List[str]:
+    def get_copy_source(self, src_sentence: List[int]) -> List[int]:
+        """Returns the part of a source sentence (without prefix) that generated spans are copied from."""
+        if self.tokenizer.eos_token_id in src_sentence:
+            src_sentence = src_sentence[:src_sentence.index(self.tokenizer.eos_token_id)]
+        return src_sentence
+
+    def build_src_index(self, src_sentence: torch.Tensor) -> SourceIndex:
+        """Builds the `SourceIndex` of an encoder input, to be shared by all beams and steps of its generation."""
+        if self.source_prefix_tokenized:
+            src_sentence = src_sentence[len(self.source_prefix_tokenized):]
+        return SourceIndex(self.get_copy_source(src_sentence.tolist()))
+
+    def get_state_valid_tokens(self, src_sentence: List[str], tgt_generated: List[str],
+                               src_index: SourceIndex = None) -> List[str]:
         pass
 
-    def constraint_decoding(self, batch_id, src_sentence, tgt_generated):
+    def constraint_decoding(self, batch_id, src_sentence, tgt_generated, src_index=None):
+        """Returns the tokens allowed after `tgt_generated`. `src_index` is the optional `build_src_index` of
+        `src_sentence`; without it, spans are matched by scanning the source."""
         if self.source_prefix_tokenized:
             # Remove Source Prefix for Generation
             src_sentence = src_sentence[len(self.source_prefix_tokenized):]
@@ -109,7 +200,8 @@ class ConstraintDecoder:
 
         valid_token_ids = self.get_state_valid_tokens(
             src_sentence.tolist(),
-            tgt_generated.tolist()
+            tgt_generated.tolist(),
+            src_index
         )
         # pdb.set_trace()
 
@@ -164,13 +256,14 @@ class StruConstraintDecoder(ConstraintDecoder):
         return state, last_special_index
 
     def search_prefix_tree_and_sequence(self, generated: List[str], prefix_tree: Dict, src_sentence: List[str],
-                                        end_sequence_search_tokens: List[str] = None):
+                                        end_sequence_search_tokens: List[str] = None, src_index: SourceIndex = None):
         """
         Generate Type Name + Text Span
         :param generated:
         :param prefix_tree:
         :param src_sentence:
         :param end_sequence_search_tokens:
+        :param src_index: optional `SourceIndex` of `src_sentence`
         :return:
         """
         tree = prefix_tree
@@ -183,6 +276,7 @@ class StruConstraintDecoder(ConstraintDecoder):
                     generated=generated[index + 1:],
                     src_sequence=src_sentence,
                     end_sequence_search_tokens=end_sequence_search_tokens,
+                    src_index=src_index,
                 )
                 return valid_token
 
@@ -192,6 +286,7 @@ class StruConstraintDecoder(ConstraintDecoder):
                         generated=generated[index + 1:],
                         src_sequence=src_sentence,
                         end_sequence_search_tokens=end_sequence_search_tokens,
+                        src_index=src_index,
                     )
                     return valid_token
                 except IndexError:
@@ -201,16 +296,15 @@ class StruConstraintDecoder(ConstraintDecoder):
         valid_token = list(tree.keys())
         return valid_token
 
-    def get_state_valid_tokens(self, src_sentence, tgt_generated):
+    def get_state_valid_tokens(self, src_sentence, tgt_generated, src_index=None):
         """
         :param src_sentence:
         :param tgt_generated:
+        :param src_index: optional `SourceIndex` of `src_sentence`
         :return:
             List[str], valid token list
         """
-        if self.tokenizer.eos_token_id in src_sentence:
-            src_sentence = src_sentence[:src_sentence.index(
-                self.tokenizer.eos_token_id)]
+        src_sentence = self.get_copy_source(src_sentence)
 
         state, index = self.check_state(tgt_generated)
 
@@ -244,7 +338,8 @@ class StruConstraintDecoder(ConstraintDecoder):
                         generated=tgt_generated[index + 1:],
                         prefix_tree=self.type_tree,
                         src_sentence=src_sentence,
-                        end_sequence_search_tokens=[self.type_end]
+                        end_sequence_search_tokens=[self.type_end],
+                        src_index=src_index
                     )
                 except:
                     print("Warning! An unexpected token is generated due to len(valid_tokens) < num_beams.")
@@ -299,10 +394,14 @@ class SpanConstraintDecoder(ConstraintDecoder):
                 break 
         return src_sentence[:index]
 
-    def get_state_valid_tokens(self, src_sentence, tgt_generated):
+    def get_copy_source(self, src_sentence):
+        return self.truncate_src(super().get_copy_source(src_sentence))
+
+    def get_state_valid_tokens(self, src_sentence, tgt_generated, src_index=None):
         """
         :param src_sentence:
         :param tgt_generated:
+        :param src_index: optional `SourceIndex` of `src_sentence`
         :return:
             List[str], valid token list
         """
@@ -332,6 +431,7 @@ class SpanConstraintDecoder(ConstraintDecoder):
                         generated=tgt_generated[index:],
                         src_sequence=src_sentence,
                         end_sequence_search_tokens=[self.tokenizer.eos_token_id],
+                        src_index=src_index,
                     )
             valid_tokens = valid_special_tokens + valid_tokens
         else:
@@ -339,4 +439,218 @@ class SpanConstraintDecoder(ConstraintDecoder):
                 'State `%s` for %s is not implemented.' % (state, self.__class__))
 
         print("Valid: %s" % valid_tokens) if debug else None
-        return valid_tokens
\ No newline at end of file
+        return valid_tokens
+
+
+class ConstrainedLogitsProcessor(LogitsProcessor):
+    """Batched and incremental replacement of `prefix_allowed_tokens_fn=constraint_decoder.constraint_decoding`.
+
+    `StruConstraintDecoder.get_state_valid_tokens` rescans the whole generated sequence of every beam at every step.
+    This processor instead keeps the decoding state of every beam as tensors (bracket counts, the current node of the
+    role/type label trie and the source positions the copied span can continue from), advances it by the last token
+    only, and builds the mask of the whole batch with tensor operations. The label trie is compiled into sorted
+    `(node, token) -> child` tables. Beams are matched to their parent beam of the previous step by their prefix.
+
+    The allowed tokens are exactly those of `constraint_decoder.constraint_decoding`. Beams in irregular states (e.g.
+    unbalanced brackets) and decoders other than `StruConstraintDecoder` fall back to calling the decoder itself,
+    with the `SourceIndex` of their source. The index of a source is built at its first use and lives as long as the
+    processor, i.e. for the `generate` call of one batch.
+
+    Attributes:
+        constraint_decoder (`ConstraintDecoder`):
+            The decoder whose constraints are applied.
+        src_input_ids (`torch.Tensor`):
+            The encoder input ids of the batch, of shape `[batch_size, src_length]`.
+        num_beams (`int`):
+            The number of beams per input.
+    """
+    # decoding modes of a beam after its last `type_start`
+    NONE, LABEL, SPAN, BAD = 0, 1, 2, 3
+    # fixed entries of the allowed-token table, followed by one entry per trie node
+    START, START_FIRST, EOS = 0, 1, 2
+    NUM_FIXED_ENTRIES = 3
+
+    def __init__(self,
+                 constraint_decoder: ConstraintDecoder,
+                 src_input_ids: torch.Tensor,
+                 num_beams: int) -> None:
+        """Constructs a `ConstrainedLogitsProcessor`."""
+        self.constraint_decoder = constraint_decoder
+        self.src_input_ids = src_input_ids
+        self.num_beams = num_beams
+        self.is_structured = isinstance(constraint_decoder, StruConstraintDecoder)
+        self._compiled = False
+        self._prev_input_ids = None
+        self._state = None
+        self.src_indices = dict()
+
+    def get_src_index(self, batch_id: int) -> SourceIndex:
+        """Returns the `SourceIndex` of row `batch_id` of the batch."""
+        if batch_id not in self.src_indices:
+            self.src_indices[batch_id] = self.constraint_decoder.build_src_index(self.src_input_ids[batch_id])
+        return self.src_indices[batch_id]
+
+    def _compile(self, vocab_size: int, device: torch.device) -> None:
+        """Compiles the label trie and the source sequences into tensors."""
+        tokenizer = self.constraint_decoder.tokenizer
+        self.vocab_size = vocab_size
+        self.pad_token_id = tokenizer.pad_token_id
+        self.eos_token_id = tokenizer.eos_token_id
+        # source without prefix, valid up to the first eos
+        prefix_length = len(self.constraint_decoder.source_prefix_tokenized)
+        src = self.src_input_ids[:, prefix_length:].to(device)
+        is_eos = src == self.eos_token_id
+        src_length = torch.where(is_eos.any(-1), is_eos.int().argmax(-1), torch.full_like(src[:, 0], src.shape[1]))
+        self.src = src
+        self.src_valid = torch.arange(src.shape[1], device=device)[None, :] < src_length[:, None]
+        if self.is_structured:
+            self.type_start = self.constraint_decoder.type_start
+            self.type_end = self.constraint_decoder.type_end
+            tree_end = self.constraint_decoder.tree_end
+            nodes, children, transitions = [self.constraint_decoder.type_tree], [], []
+            for node_id, node in enumerate(iter(nodes)):
+                children.append([token for token in node if token != tree_end])
+                for token in children[-1]:
+                    transitions.append((node_id * 2**32 + token, len(nodes)))
+                    nodes.append(node[token])
+            transitions.sort()
+            self.trie_keys = torch.tensor([key for key, _ in transitions], dtype=torch.long, device=device)
+            self.trie_children = torch.tensor([child for _, child in transitions], dtype=torch.long, device=device)
+            self.trie_has_end = torch.tensor([tree_end in node for node in nodes], dtype=torch.bool, device=device)
+            entries = [[self.type_start], [self.type_start, self.type_end], [self.eos_token_id]] + children
+            width = max(len(entry) for entry in entries)
+            self.entries = torch.tensor([entry + [vocab_size] * (width - len(entry)) for entry in entries],
+                                        dtype=torch.long, device=device)
+        self._compiled = True
+
+    def _init_state(self, n_rows: int, device: torch.device) -> Dict[str, torch.Tensor]:
+        zeros = torch.zeros(n_rows, dtype=torch.long, device=device)
+        row_batch = torch.arange(n_rows, device=device) // self.num_beams
+        return dict(
+            n_start=zeros.clone(),
+            n_end=zeros.clone(),
+            n_special=zeros.clone(),
+            first_special=zeros.clone(),
+            mode=zeros.clone(),
+            node=zeros.clone(),
+            span_nonempty=torch.zeros(n_rows, dtype=torch.bool, device=device),
+            next_positions=self.src_valid[row_batch].clone(),
+        )
+
+    def _lookup(self, node: torch.Tensor, token: torch.Tensor):
+        """Returns the child of `node` along `token` and whether it exists."""
+        if len(self.trie_keys) == 0:
+            return node, torch.zeros_like(node, dtype=torch.bool)
+        key = node * 2**32 + token
+        position = torch.searchsorted(self.trie_keys, key).clamp(max=len(self.trie_keys) - 1)
+        return self.trie_children[position], self.trie_keys[position] == key
+
+    def _advance(self, state: Dict[str, torch.Tensor], token: torch.Tensor, row_batch: torch.Tensor) -> None:
+        """Advances the state of every beam by its last generated token."""
+        is_start = token == self.type_start
+        is_end = token == self.type_end
+        is_special = is_start | is_end
+        state["first_special"] = torch.where((state["n_special"] == 0) & is_special, token, state["first_special"])
+        state["n_special"] += is_special.long()
+        state["n_start"] += is_start.long()
+        state["n_end"] += is_end.long()
+
+        mode = state["mode"]
+        in_label = (mode == self.LABEL) & ~is_special
+        in_span = (mode == self.SPAN) & ~is_special
+        # label: walk the trie, the label ends at the first node that can end a label
+        child, found = self._lookup(state["node"], token)
+        enters_span = in_label & found & self.trie_has_end[child]
+        new_mode = mode.clone()
+        new_mode[in_label & ~found] = self.BAD
+        new_mode[enters_span] = self.SPAN
+        new_mode[is_start] = self.LABEL
+        new_mode[is_end] = self.NONE
+        state["mode"] = new_mode
+        state["node"] = torch.where(in_label & found, child, state["node"])
+        state["node"][is_start] = 0
+        # span: positions right after the occurrences of the copied span in the source
+        src = self.src[row_batch]
+        src_valid = self.src_valid[row_batch]
+        matched = state["next_positions"] & (src == token[:, None])
+        shifted = torch.zeros_like(matched)
+        shifted[:, 1:] = matched[:, :-1]
+        shifted &= src_valid
+        next_positions = torch.where(in_span[:, None], shifted, state["next_positions"])
+        state["next_positions"] = torch.where(enters_span[:, None], src_valid, next_positions)
+        state["span_nonempty"] = (state["span_nonempty"] | in_span) & ~(enters_span | is_start)
+
+    def _update_state(self, input_ids: torch.Tensor) -> None:
+        """Reuses the state of the parent beams if possible, otherwise replays the whole prefix."""
+        n_rows, cur_len = input_ids.shape
+        row_batch = torch.arange(n_rows, device=input_ids.device) // self.num_beams
+        parent = None
+        if self._prev_input_ids is not None and self._prev_input_ids.shape == (n_rows, cur_len - 1):
+            prefix = input_ids[:, :-1].view(-1, self.num_beams, cur_len - 1)
+            previous = self._prev_input_ids.view(-1, self.num_beams, cur_len - 1)
+            is_parent = (prefix[:, :, None, :] == previous[:, None, :, :]).all(-1)
+            if bool(is_parent.any(-1).all()):
+                parent = is_parent.int().argmax(-1) + torch.arange(len(prefix), device=input_ids.device)[:, None] \
+                    * self.num_beams
+        if parent is not None:
+            self._state = {key: value[parent.view(-1)] for key, value in self._state.items()}
+            self._advance(self._state, input_ids[:, -1], row_batch)
+        else:
+            self._state = self._init_state(n_rows, input_ids.device)
+            for position in range(cur_len):
+                self._advance(self._state, input_ids[:, position], row_batch)
+        self._prev_input_ids = input_ids
+
+    def _get_entries(self, input_ids: torch.Tensor):
+        """Returns the allowed-token table entry of every beam, the beams copying from the source and the beams in
+        irregular states."""
+        state = self._state
+        token = input_ids[:, -1]
+        n_start, n_end, mode = state["n_start"], state["n_end"], state["mode"]
+        entry = torch.full_like(token, -1)
+        entry[n_start == n_end] = self.EOS
+        entry[n_start == n_end + 1] = self.START_FIRST
+        generate_span = n_start == n_end + 2
+        label = generate_span & (mode == self.LABEL)
+        entry[label] = self.NUM_FIXED_ENTRIES + state["node"][label]
+        entry[generate_span & (mode == self.BAD)] = self.EOS
+        copy = generate_span & (mode == self.SPAN)
+        irregular = (state["n_special"] == 0) \
+            | ((state["n_special"] == 1) & (state["first_special"] != self.type_start)) \
+            | (n_start > n_end + 2) | (n_start < n_end) \
+            | (generate_span & ((mode == self.NONE) | (token == self.type_end)))
+        start = token == self.pad_token_id
+        irregular &= ~start
+        entry[irregular] = -1
+        copy &= ~(irregular | start)
+        entry[start] = self.START
+        return entry, copy, irregular
+
+    def __call__(self, input_ids: torch.Tensor, scores: torch.Tensor) -> torch.Tensor:
+        if not self._compiled:
+            self._compile(scores.shape[-1], scores.device)
+        n_rows = input_ids.shape[0]
+        mask = torch.full((n_rows, self.vocab_size + 1), -math.inf, dtype=scores.dtype, device=scores.device)
+        if self.is_structured:
+            self._update_state(input_ids)
+            entry, copy, irregular = self._get_entries(input_ids)
+            rows = (entry >= 0).nonzero().view(-1)
+            if len(rows) > 0:
+                mask[rows] = mask[rows].scatter(1, self.entries[entry[rows]], 0)
+            rows = copy.nonzero().view(-1)
+            if len(rows) > 0:
+                row_batch = rows // self.num_beams
+                src_ids = torch.where(self._state["next_positions"][rows], self.src[row_batch], self.vocab_size)
+                mask[rows] = mask[rows].scatter(1, src_ids, 0)
+                mask[rows[self._state["span_nonempty"][rows]], self.type_end] = 0
+            irregular_rows = irregular.nonzero().view(-1).tolist()
+        else:
+            irregular_rows = range(n_rows)
+        for row in irregular_rows:
+            batch_id = row // self.num_beams
+            allowed_tokens = self.constraint_decoder.constraint_decoding(batch_id=batch_id,
+                                                                         src_sentence=self.src_input_ids[batch_id],
+                                                                         tgt_generated=input_ids[row],
+                                                                         src_index=self.get_src_index(batch_id))
+            mask[row, allowed_tokens] = 0
+        return scores + mask[:, :self.vocab_size]
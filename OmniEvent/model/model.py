@@ -15,6 +15,7 @@ from OmniEvent.arguments import (
     TrainingArguments,
     ArgumentParser
 )
+from OmniEvent.model.quantization import load_quantized
 from OmniEvent.utils import check_web_and_convert_path
 
 
@@ -76,14 +77,22 @@ def get_model_cls(model_args):
 class BaseModel(nn.Module):
 
     @classmethod
-    def from_pretrained(cls, model_name_or_path: Union[str, os.PathLike], backbone=None, model_args=None, **kwargs):
+    def from_pretrained(cls, model_name_or_path: Union[str, os.PathLike], backbone=None, model_args=None,
+                        quantize: Optional[str] = None, **kwargs):
         if model_args is None:
             parser = ArgumentParser((ModelArguments, DataArguments, TrainingArguments))
             model_args, _, _ = parser.from_pretrained(model_name_or_path, **kwargs)
         path = check_web_and_convert_path(model_name_or_path, 'model')
         model = get_model(model_args, backbone)
-        model.load_state_dict(torch.load(path), strict=False)
-        return model
+
+        def load_model():
+            model.load_state_dict(torch.load(path), strict=False)
+            return model
+
+        if quantize is not None:
+            # int8 weights are cached next to the checkpoint, so only the first load quantizes.
+            return load_quantized(lambda: model, load_model, path, quantize)
+        return load_model()
 
 
 class ModelForTokenClassification(BaseModel):
@@ -0,0 +1,80 @@
+import os
+import logging
+
+import torch
+import torch.nn as nn
+import torch.nn.quantized.dynamic as nnqd
+
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+QUANTIZED_WEIGHTS_NAME = "pytorch_model.int8.bin"
+QUANTIZATION_MODES = [None, "int8"]
+
+
+def quantize_dynamic_int8(model: nn.Module) -> nn.Module:
+    """Applies dynamic int8 quantization to the `nn.Linear` layers of a model.
+
+    Weights of the linear layers are stored as int8 and activations are quantized on the fly, which speeds up the
+    matrix multiplications of mT5 and BERT backbones on cpu. Embeddings and layer norms stay in float32.
+    """
+    return torch.quantization.quantize_dynamic(model.to("cpu").float().eval(), {nn.Linear}, dtype=torch.qint8)
+
+
+def swap_to_quantized_linear(module: nn.Module) -> nn.Module:
+    """Replaces the `nn.Linear` layers of a model by empty dynamic int8 layers, without quantizing any weights.
+
+    The result has the structure of `quantize_dynamic_int8(module)`, so that saved int8 weights can be loaded into it.
+    """
+    for name, child in module.named_children():
+        if type(child) is nn.Linear:
+            setattr(module, name, nnqd.Linear(child.in_features, child.out_features, bias_=child.bias is not None,
+                                              dtype=torch.qint8))
+        else:
+            swap_to_quantized_linear(child)
+    return module
+
+
+def get_quantized_weights_path(path: str) -> str:
+    """Returns where the quantized weights of the checkpoint at `path` (a directory or a weights file) are cached."""
+    if os.path.isdir(path):
+        return os.path.join(path, QUANTIZED_WEIGHTS_NAME)
+    return os.path.splitext(path)[0] + ".int8.bin"
+
+
+def load_quantized(build_model: Callable[[], nn.Module],
+                   load_model: Callable[[], nn.Module],
+                   path: str,
+                   quantize: Optional[str] = "int8") -> nn.Module:
+    """Loads the quantized version of the checkpoint at `path`, quantizing and caching it on the first call.
+
+    Args:
+        build_model (`Callable`):
+            Builds the model architecture. Its weights are replaced by the cached int8 weights.
+        load_model (`Callable`):
+            Loads the float model from the checkpoint. Only called if there are no cached int8 weights yet.
+        path (`str`):
+            The path of the checkpoint, next to which the int8 weights are cached.
+        quantize (`str`, `optional`, defaults to "int8"):
+            The quantization mode. Only "int8" is supported.
+
+    Returns:
+        The quantized model on cpu, in eval mode.
+    """
+    assert quantize == "int8", f"Unsupported quantization mode: {quantize}"
+    quantized_path = get_quantized_weights_path(path)
+    if os.path.exists(quantized_path):
+        model = swap_to_quantized_linear(build_model().float().eval())
+        model.load_state_dict(torch.load(quantized_path, map_location="cpu"))
+        logger.info("Loaded int8 weights from %s" % quantized_path)
+        return model
+    model = quantize_dynamic_int8(load_model())
+    try:
+        tmp_path = quantized_path + ".tmp"
+        torch.save(model.state_dict(), tmp_path)
+        os.replace(tmp_path, quantized_path)
+        logger.info("Saved int8 weights to %s" % quantized_path)
+    except OSError as e:
+        logger.warning("Could not cache int8 weights at %s: %s" % (quantized_path, e))
+    return model
@@ -14,13 +14,13 @@
 
 import torch 
 import logging
-from torch.utils.data import DataLoader
+from torch.utils.data import DataLoader, Dataset
 from typing import Optional, List
 from collections import defaultdict
 
 import numpy as np
 
-from transformers import Trainer
+from transformers import Trainer, TrainerCallback
 from transformers.trainer import (
     EvalLoopOutput, 
     deepspeed_init, 
@@ -39,9 +39,35 @@ if is_torch_tpu_available():
     import torch_xla.debug.metrics as met
     import torch_xla.distributed.parallel_loader as pl
 
+from .input_engineering.sampler import TokenBudgetBatchSampler, get_lengths, nested_reorder
+
 logger = logging.getLogger(__name__)
 
 
+class SetEpochCallback(TrainerCallback):
+    """Sets the epoch of a streamed training set and of a `TokenBudgetBatchSampler` at the beginning of every epoch, so
+    that they change their order. The trainer itself only sets the epoch of an `IterableDatasetShard` and of a
+    `DistributedSampler`."""
+
+    def __init__(self):
+        """Constructs a `SetEpochCallback`."""
+        self.epoch = 0
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        """Starts counting at the epoch the training (or the checkpoint it resumes from) is in."""
+        self.epoch = int(state.epoch or 0)
+
+    def on_epoch_begin(self, args, state, control, train_dataloader=None, **kwargs):
+        """Sets the epoch of the training set if it has a `set_epoch` method, and of its length-bucketed batches."""
+        dataset = getattr(train_dataloader, "dataset", None)
+        if hasattr(dataset, "set_epoch") and not isinstance(dataset, IterableDatasetShard):
+            dataset.set_epoch(self.epoch)
+        batch_sampler = getattr(train_dataloader, "batch_sampler", None)
+        if isinstance(batch_sampler, TokenBudgetBatchSampler):
+            batch_sampler.set_epoch(self.epoch)
+        self.epoch += 1
+
+
 class Trainer(Trainer):
     """Trainer for event extraction.
 
@@ -52,6 +78,70 @@ class Trainer(Trainer):
     def __init__(self, *args, **kwargs):
         """Constructs a `Trainer`."""
         super().__init__(*args, **kwargs)
+        self.add_callback(SetEpochCallback())
+
+    def get_train_dataloader(self) -> DataLoader:
+        """
+        Returns the training dataloader, with length-bucketed batches if `args.max_tokens_per_batch` is set. A streamed
+        training set (e.g. `IterableProcessor`) is only wrapped in an `IterableDatasetShard` across processes, its
+        epoch is set by `SetEpochCallback`.
+        """
+        batch_sampler = self.get_length_batch_sampler(self.train_dataset, shuffle=True)
+        if batch_sampler is None:
+            return super().get_train_dataloader()
+        logger.info(f"  Length-bucketed batches: {len(batch_sampler)}, padding ratio = "
+                    f"{batch_sampler.get_padding_ratio():.3f}")
+        return self.get_length_bucketed_dataloader(self.train_dataset, batch_sampler, "training")
+
+    def get_eval_dataloader(self, eval_dataset: Optional[Dataset] = None) -> DataLoader:
+        """Returns the evaluation dataloader, with length-bucketed batches if `args.max_tokens_per_batch` is set."""
+        dataset = eval_dataset if eval_dataset is not None else self.eval_dataset
+        batch_sampler = self.get_length_batch_sampler(dataset, shuffle=False)
+        if batch_sampler is None:
+            return super().get_eval_dataloader(eval_dataset)
+        return self.get_length_bucketed_dataloader(dataset, batch_sampler, "evaluation")
+
+    def get_test_dataloader(self, test_dataset: Dataset) -> DataLoader:
+        """Returns the test dataloader, with length-bucketed batches if `args.max_tokens_per_batch` is set."""
+        batch_sampler = self.get_length_batch_sampler(test_dataset, shuffle=False)
+        if batch_sampler is None:
+            return super().get_test_dataloader(test_dataset)
+        return self.get_length_bucketed_dataloader(test_dataset, batch_sampler, "test")
+
+    def get_length_batch_sampler(self,
+                                 dataset: Optional[Dataset],
+                                 shuffle: bool) -> Optional[TokenBudgetBatchSampler]:
+        """
+        Returns a `TokenBudgetBatchSampler` over the input lengths of a data processor if `args.max_tokens_per_batch`
+        is set, and `None` otherwise. Evaluation batches are only bucketed on a single process, since their order is
+        restored by `evaluation_loop`.
+        """
+        if self.args.max_tokens_per_batch is None or not has_length(dataset) or not hasattr(dataset, "input_features"):
+            return None
+        if not shuffle and self.args.world_size > 1:
+            return None
+        return TokenBudgetBatchSampler(
+            get_lengths(dataset),
+            max_tokens=self.args.max_tokens_per_batch,
+            bucket_size=self.args.length_bucket_size,
+            shuffle=shuffle,
+            seed=self.args.seed,
+            num_replicas=self.args.world_size if shuffle else 1,
+            rank=self.args.process_index if shuffle else 0
+        )
+
+    def get_length_bucketed_dataloader(self,
+                                       dataset: Dataset,
+                                       batch_sampler: TokenBudgetBatchSampler,
+                                       description: str) -> DataLoader:
+        """Returns a dataloader whose batches are drawn from `batch_sampler`."""
+        return DataLoader(
+            dataset,
+            batch_sampler=batch_sampler,
+            collate_fn=self._get_collator_with_removed_columns(self.data_collator, description=description),
+            num_workers=self.args.dataloader_num_workers,
+            pin_memory=self.args.dataloader_pin_memory
+        )
 
     def evaluation_loop(self,
                         dataloader: DataLoader,
@@ -103,6 +193,7 @@ class Trainer(Trainer):
         self.callback_handler.eval_dataloader = dataloader
         # Do this before wrapping.
         eval_dataset = getattr(dataloader, "dataset", None)
+        batch_sampler = getattr(dataloader, "batch_sampler", None)
 
         if is_torch_tpu_available():
             dataloader = pl.ParallelLoader(dataloader, [args.device]).per_device_loader(args.device)
@@ -129,7 +220,7 @@ class Trainer(Trainer):
             if observed_batch_size is not None:
                 observed_num_examples += observed_batch_size
                 # For batch samplers, batch_size is not known by the dataloader in advance.
-                if batch_size is None:
+                if batch_size is None or isinstance(batch_sampler, TokenBudgetBatchSampler):
                     batch_size = observed_batch_size
 
             # Prediction step
@@ -208,6 +299,16 @@ class Trainer(Trainer):
         if all_labels is not None:
             all_labels = nested_truncate(all_labels, num_samples)
 
+        # Length-bucketed batches are sorted by length, restore the order of the dataset.
+        if isinstance(batch_sampler, TokenBudgetBatchSampler):
+            inverse_order = np.argsort(batch_sampler.get_order())
+            if all_losses is not None:
+                all_losses = all_losses[inverse_order]
+            if all_preds is not None:
+                all_preds = nested_reorder(all_preds, inverse_order)
+            if all_labels is not None:
+                all_labels = nested_reorder(all_labels, inverse_order)
+
         # Metrics!
         if self.compute_metrics is not None and all_preds is not None and all_labels is not None:
             metrics = self.compute_metrics(logits=all_preds, labels=all_labels, **{"tokenizer": self.tokenizer, "training_args": self.args})
@@ -240,9 +240,9 @@ def finetune(args, tokenizer, model, optimizer, lr_scheduler, dataset):
     start_dev_epoch = 1
     dev_epoch_step = 1
     dataloader = {
-        "train": DistributedDataLoader(dataset['train'], batch_size=args.batch_size, shuffle=True, **{"num_workers": dataloader_num_workers}),
-        "dev": DistributedDataLoader(dataset['dev'], batch_size=8, shuffle=False, **{"num_workers": dataloader_num_workers}),
-        "test": DistributedDataLoader(dataset['test'], batch_size=8, shuffle=False, **{"num_workers": dataloader_num_workers})
+        "train": DistributedDataLoader(dataset['train'], batch_size=args.batch_size, shuffle=True, collate_fn=dataset['train'].collate_fn, **{"num_workers": dataloader_num_workers}),
+        "dev": DistributedDataLoader(dataset['dev'], batch_size=8, shuffle=False, collate_fn=dataset['dev'].collate_fn, **{"num_workers": dataloader_num_workers}),
+        "test": DistributedDataLoader(dataset['test'], batch_size=8, shuffle=False, collate_fn=dataset['test'].collate_fn, **{"num_workers": dataloader_num_workers})
     }
     if args.do_train:
         for epoch in range(args.epochs):
@@ -0,0 +1,61 @@
+"""Cost of the copy constraint (`generated_search_src_sequence`) on long sources: a full `match_sublist` scan per
+decoding step versus the per-source `SourceIndex`.
+
+Simulates beam search copying spans out of the source: every beam extends its span by one source token per step and
+asks for the valid next tokens.
+
+Example:
+    python copy_constraint.py --src_length 2048 --num_sources 8 --num_beams 4 --span_length 16
+"""
+import sys
+sys.path.append("../../")
+import time
+import random
+import argparse
+
+from OmniEvent.model.constraint_decoding import generated_search_src_sequence, SourceIndex
+
+
+def get_spans(src, args):
+    spans = []
+    for _ in range(args.num_beams * args.num_spans):
+        start = random.randint(0, len(src) - args.span_length)
+        spans.append(src[start:start + args.span_length])
+    return spans
+
+
+def run(sources, all_spans, use_index):
+    start = time.perf_counter()
+    outputs = []
+    for src, spans in zip(sources, all_spans):
+        # the index is built once per source and shared by all beams and steps
+        src_index = SourceIndex(src) if use_index else None
+        for span in spans:
+            for end in range(1, len(span) + 1):
+                outputs.append(set(generated_search_src_sequence(span[:end], src, src_index=src_index)))
+    return outputs, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--src_length", type=int, default=2048)
+    parser.add_argument("--vocab_size", type=int, default=200)
+    parser.add_argument("--num_sources", type=int, default=8)
+    parser.add_argument("--num_beams", type=int, default=4)
+    parser.add_argument("--num_spans", type=int, default=8, help="spans copied per beam")
+    parser.add_argument("--span_length", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    # skewed token distribution, so that frequent tokens have many occurrences as in real text
+    sources = [[int(random.paretovariate(1.0)) % args.vocab_size for _ in range(args.src_length)]
+               for _ in range(args.num_sources)]
+    all_spans = [get_spans(src, args) for src in sources]
+
+    scan_outputs, scan_time = run(sources, all_spans, use_index=False)
+    index_outputs, index_time = run(sources, all_spans, use_index=True)
+    lookups = len(scan_outputs)
+    print("match_sublist: %.3fs (%.1f us/lookup)" % (scan_time, scan_time / lookups * 1e6))
+    print("SourceIndex:   %.3fs (%.1f us/lookup, index build included)" % (index_time, index_time / lookups * 1e6))
+    print("speedup: %.2fx, outputs_match: %s" % (scan_time / index_time, scan_outputs == index_outputs))
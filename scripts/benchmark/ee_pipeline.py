@@ -0,0 +1,67 @@
+"""Throughput of pipelined EE (ED of chunk N+1 overlapping EAE of chunk N) versus the sequential path.
+
+Example:
+    python ee_pipeline.py --num_texts 512 --batch_size 32 --device cuda
+"""
+import sys
+sys.path.append("../../")
+import json
+import time
+import argparse
+
+from OmniEvent.infer import infer_batch, get_device, get_pretrained
+
+
+SAMPLE_TEXTS = [
+    "U.S. and British troops were moving on the strategic southern port city of Basra Saturday after a massive aerial assault pounded Baghdad at dawn",
+    "The company fired its chief executive after the merger talks collapsed last week",
+    "Police arrested two men in connection with the bombing that killed 12 people in the capital",
+    "Protesters marched through the city center on Sunday demanding the resignation of the prime minister",
+]
+
+
+def read_texts(args):
+    if args.input_file is None:
+        return [SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)] for i in range(args.num_texts)]
+    with open(args.input_file, "r", encoding="utf-8") as f:
+        return [json.loads(line)["text"] for line, _ in zip(f, range(args.num_texts))]
+
+
+def run(texts, args, models, tokenizers, pipelined):
+    start = time.perf_counter()
+    results = infer_batch(texts, args.schema, "EE", args.batch_size, args.max_tokens, model=models,
+                          tokenizer=tokenizers, device=args.device, pipelined=pipelined, chunk_size=args.chunk_size)
+    return results, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ed_model", default="s2s-mt5-ed")
+    parser.add_argument("--eae_model", default="s2s-mt5-eae")
+    parser.add_argument("--input_file", default=None, help="Unified-format jsonl. Sample sentences if not given.")
+    parser.add_argument("--num_texts", type=int, default=256)
+    parser.add_argument("--schema", default="ace")
+    parser.add_argument("--batch_size", type=int, default=32)
+    parser.add_argument("--max_tokens", type=int, default=None)
+    parser.add_argument("--chunk_size", type=int, default=64)
+    parser.add_argument("--device", default="auto")
+    args = parser.parse_args()
+
+    args.device = get_device(args.device)
+    ed_model, ed_tokenizer = get_pretrained(args.ed_model, args.device)
+    eae_model, eae_tokenizer = get_pretrained(args.eae_model, args.device)
+    models, tokenizers = [ed_model, eae_model], [ed_tokenizer, eae_tokenizer]
+    texts = read_texts(args)
+    # warmup
+    run(texts[:args.batch_size], args, models, tokenizers, pipelined=False)
+
+    sequential, sequential_time = run(texts, args, models, tokenizers, pipelined=False)
+    pipelined, pipelined_time = run(texts, args, models, tokenizers, pipelined=True)
+    report = {
+        "results_match": sequential == pipelined,
+        "num_texts": len(texts),
+        "sequential_texts_per_sec": len(texts) / sequential_time,
+        "pipelined_texts_per_sec": len(texts) / pipelined_time,
+        "speedup": sequential_time / pipelined_time,
+    }
+    print(json.dumps(report, indent=4))
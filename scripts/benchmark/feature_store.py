@@ -0,0 +1,94 @@
+"""Dataset memory and collation time of padded python features versus the columnar `FeatureStore` that pads on
+collate.
+
+Builds synthetic sequence labeling features padded to `--max_seq_length`, with sentence lengths drawn from a
+log-normal distribution, and collates random batches the way `collate_fn` did before (stack the padded samples, then
+truncate to the longest input) and does now (pad the unpadded samples to the longest input).
+
+Example:
+    python feature_store.py --num_features 20000 --max_seq_length 256 --batch_size 32
+"""
+import sys
+sys.path.append("../../")
+import time
+import random
+import argparse
+import tracemalloc
+
+import numpy as np
+import torch
+
+from OmniEvent.arguments import DataArguments
+from OmniEvent.input_engineering.base_processor import EDInputFeatures
+from OmniEvent.input_engineering.feature_store import FeatureStore, collate_features
+
+PAD_VALUES = {"input_ids": 1, "labels": -100}
+
+
+def build_features(args):
+    features = []
+    for i in range(args.num_features):
+        length = int(min(args.max_seq_length, max(4, random.lognormvariate(np.log(args.mean_length), 0.5))))
+        pad = args.max_seq_length - length
+        features.append(EDInputFeatures(
+            example_id=i,
+            input_ids=[random.randint(5, 30000) for _ in range(length)] + [1] * pad,
+            attention_mask=[1] * length + [0] * pad,
+            token_type_ids=[0] * args.max_seq_length,
+            labels=[random.randint(0, 33) for _ in range(length)] + [-100] * pad
+        ))
+    return features
+
+
+def get_item(features):
+    return dict(
+        input_ids=torch.tensor(features.input_ids, dtype=torch.long),
+        attention_mask=torch.tensor(features.attention_mask, dtype=torch.float32),
+        token_type_ids=torch.tensor(features.token_type_ids, dtype=torch.long),
+        labels=torch.tensor(features.labels, dtype=torch.long)
+    )
+
+
+def stack_and_truncate(batch):
+    output_batch = {key: torch.stack([x[key] for x in batch], dim=0) for key in batch[0]}
+    input_length = int(output_batch["attention_mask"].sum(-1).max())
+    for key in output_batch:
+        output_batch[key] = output_batch[key][:, :input_length]
+    return output_batch
+
+
+def run(dataset, batches, collate):
+    start = time.perf_counter()
+    padded_tokens = 0
+    for indices in batches:
+        output_batch = collate([get_item(dataset[idx]) for idx in indices])
+        padded_tokens += output_batch["input_ids"].numel()
+    return time.perf_counter() - start, padded_tokens
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_features", type=int, default=20000)
+    parser.add_argument("--max_seq_length", type=int, default=256)
+    parser.add_argument("--mean_length", type=float, default=40)
+    parser.add_argument("--batch_size", type=int, default=32)
+    parser.add_argument("--num_batches", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    tracemalloc.start()
+    features = build_features(args)
+    list_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    store = FeatureStore.from_features(features, EDInputFeatures, PAD_VALUES)
+    print("padded python features: %.1f MB" % (list_bytes / 2 ** 20))
+    print("FeatureStore columns:   %.1f MB (%.1fx smaller)" % (store.nbytes / 2 ** 20, list_bytes / store.nbytes))
+
+    config = DataArguments(truncate_in_batch=True)
+    batches = [random.sample(range(args.num_features), args.batch_size) for _ in range(args.num_batches)]
+    stack_time, tokens = run(features, batches, stack_and_truncate)
+    store_time, store_tokens = run(store, batches, lambda batch: collate_features(batch, config, PAD_VALUES))
+    print("stack and truncate: %.3fs (%.2f ms/batch)" % (stack_time, stack_time / len(batches) * 1e3))
+    print("pad on collate:     %.3fs (%.2f ms/batch)" % (store_time, store_time / len(batches) * 1e3))
+    print("speedup: %.2fx, same padded tokens: %s" % (stack_time / store_time, tokens == store_tokens))
@@ -0,0 +1,79 @@
+"""Padding and training throughput of random batches (padded to the longest sample of the batch, as with
+`truncate_in_batch`) versus the length-bucketed batches of `TokenBudgetBatchSampler`.
+
+Trains a small transformer encoder on cpu for `--num_steps` steps of each kind of batches, with sentence lengths drawn
+from a log-normal distribution.
+
+Example:
+    python length_bucketing.py --num_samples 5000 --batch_size 32 --max_tokens 2048
+"""
+import sys
+sys.path.append("../../")
+import time
+import argparse
+
+import numpy as np
+import torch
+
+from OmniEvent.input_engineering.sampler import TokenBudgetBatchSampler
+
+
+def get_random_batches(lengths, batch_size, rng):
+    permutation = rng.permutation(len(lengths))
+    return [permutation[start:start + batch_size].tolist() for start in range(0, len(lengths), batch_size)]
+
+
+def get_padding_ratio(lengths, batches):
+    padded = sum(len(batch) * int(lengths[batch].max()) for batch in batches)
+    return 1 - sum(int(lengths[batch].sum()) for batch in batches) / padded
+
+
+def run(model, optimizer, lengths, batches, num_steps):
+    samples = 0
+    start = time.perf_counter()
+    for batch in batches[:num_steps]:
+        width = int(lengths[batch].max())
+        input_ids = torch.randint(1, 1000, (len(batch), width))
+        mask = torch.arange(width)[None, :] >= torch.as_tensor(lengths[batch])[:, None]
+        hidden = model["encoder"](model["embedding"](input_ids), src_key_padding_mask=mask)
+        loss = hidden.masked_fill(mask[..., None], 0).pow(2).mean()
+        loss.backward()
+        optimizer.step()
+        optimizer.zero_grad()
+        samples += len(batch)
+    elapsed = time.perf_counter() - start
+    steps = min(num_steps, len(batches))
+    return steps / elapsed, samples / elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_samples", type=int, default=5000)
+    parser.add_argument("--mean_length", type=float, default=40)
+    parser.add_argument("--max_seq_length", type=int, default=256)
+    parser.add_argument("--batch_size", type=int, default=32)
+    parser.add_argument("--max_tokens", type=int, default=2048)
+    parser.add_argument("--bucket_size", type=int, default=1000)
+    parser.add_argument("--num_steps", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    torch.manual_seed(args.seed)
+    rng = np.random.RandomState(args.seed)
+    lengths = np.clip(rng.lognormal(np.log(args.mean_length), 0.5, args.num_samples), 4, args.max_seq_length)
+    lengths = lengths.astype(np.int64)
+    model = torch.nn.ModuleDict({
+        "embedding": torch.nn.Embedding(1000, 128),
+        "encoder": torch.nn.TransformerEncoder(torch.nn.TransformerEncoderLayer(128, 4, 256, batch_first=True), 2)
+    })
+    optimizer = torch.optim.SGD(model.parameters(), lr=1e-3)
+
+    random_batches = get_random_batches(lengths, args.batch_size, rng)
+    sampler = TokenBudgetBatchSampler(lengths, args.max_tokens, bucket_size=args.bucket_size, seed=args.seed)
+    bucketed_batches = sampler.get_batches()
+    # warmup
+    run(model, optimizer, lengths, random_batches, 3)
+    for name, batches in [("random batches", random_batches), ("token budget", bucketed_batches)]:
+        steps_per_second, samples_per_second = run(model, optimizer, lengths, batches, args.num_steps)
+        print("%-15s batches: %5d, padding ratio: %.3f, steps/s: %.2f, samples/s: %.1f"
+              % (name, len(batches), get_padding_ratio(lengths, batches), steps_per_second, samples_per_second))
@@ -0,0 +1,220 @@
+"""Offline load test of the server and `infer()` with a tiny randomly initialized mT5.
+
+The model and its sentencepiece tokenizer are built locally, so no checkpoint is downloaded. The server is the real
+`server/main.py` app, driven in-process through an ASGI client; `infer()` is driven from a thread pool. Latency
+percentiles and QPS are printed as JSON, so that throughput regressions show up in CI.
+
+Example:
+    python load_harness.py --concurrency 16 --num_requests 256 --lengths lognormal:20,0.5
+    python load_harness.py --target server --task "Event Extraction" --lengths uniform:5-60
+"""
+import os
+import sys
+sys.path.append("../../")
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+
+from concurrent.futures import ThreadPoolExecutor
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "server")
+SPECIAL_TOKENS = ["<ace>", "<kbp>", "<ere>", "<maven>", "<leven>", "<duee>", "<fewfc>", "<event>", "</event>"]
+WORDS = ("troops moving strategic southern port city Basra Saturday after massive aerial assault pounded Baghdad "
+         "dawn company fired chief executive merger talks collapsed last week police arrested two men connection "
+         "bombing killed people capital protesters marched through center Sunday demanding resignation prime "
+         "minister").split()
+TASKS = {"ED": "Event Detection", "EAE": "Event Argument Extraction", "EE": "Event Extraction"}
+
+
+def build_tiny_mt5(output_dir, d_model=32, num_layers=1, seed=42):
+    """Saves a randomly initialized mT5 and a sentencepiece tokenizer trained on `WORDS` to `output_dir`."""
+    import torch
+    import sentencepiece as spm
+    from transformers import MT5Config, MT5ForConditionalGeneration, T5Tokenizer
+
+    os.makedirs(output_dir, exist_ok=True)
+    corpus_path = os.path.join(output_dir, "corpus.txt")
+    rng = random.Random(seed)
+    with open(corpus_path, "w", encoding="utf-8") as f:
+        for _ in range(200):
+            f.write(" ".join(rng.choice(WORDS) for _ in range(20)) + "\n")
+    spm.SentencePieceTrainer.train(input=corpus_path, model_prefix=os.path.join(output_dir, "spiece"),
+                                   vocab_size=256, hard_vocab_limit=False, pad_id=0, eos_id=1, unk_id=2, bos_id=-1,
+                                   user_defined_symbols=SPECIAL_TOKENS, minloglevel=2)
+    tokenizer = T5Tokenizer(os.path.join(output_dir, "spiece.model"), extra_ids=0)
+    tokenizer.save_pretrained(output_dir)
+    torch.manual_seed(seed)
+    config = MT5Config(vocab_size=len(tokenizer), d_model=d_model, d_kv=d_model // 4, d_ff=2 * d_model,
+                       num_layers=num_layers, num_decoder_layers=num_layers, num_heads=4,
+                       decoder_start_token_id=tokenizer.pad_token_id, pad_token_id=tokenizer.pad_token_id,
+                       eos_token_id=tokenizer.eos_token_id)
+    MT5ForConditionalGeneration(config).save_pretrained(output_dir)
+    return output_dir
+
+
+def sample_lengths(spec, n, rng):
+    """Draws `n` text lengths (in words) from `fixed:N`, `uniform:A-B` or `lognormal:MEDIAN,SIGMA`."""
+    kind, _, value = spec.partition(":")
+    if kind == "fixed":
+        return [int(value)] * n
+    if kind == "uniform":
+        low, high = map(int, value.split("-"))
+        return [rng.randint(low, high) for _ in range(n)]
+    if kind == "lognormal":
+        median, sigma = map(float, value.split(","))
+        return [max(1, int(rng.lognormvariate(0, sigma) * median)) for _ in range(n)]
+    raise ValueError("Unknown length distribution: %s" % spec)
+
+
+def build_texts(spec, n, seed=0):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(length)) for length in sample_lengths(spec, n, rng)]
+
+
+def get_triggers(text):
+    first = text.split()[0]
+    return [(first, 0, len(first))]
+
+
+def summarize(latencies, total_time, errors=0):
+    latencies = sorted(latencies)
+
+    def percentile(q):
+        return latencies[min(int(q / 100 * len(latencies)), len(latencies) - 1)] * 1000 if latencies else 0.0
+    return {
+        "num_requests": len(latencies) + errors,
+        "errors": errors,
+        "qps": len(latencies) / total_time if total_time > 0 else 0.0,
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "mean_ms": sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+    }
+
+
+def load_server_app(model_dir, args):
+    """Imports `server/main.py` configured to serve the tiny model on cpu."""
+    os.environ.update({
+        "OMNIEVENT_ED_MODEL": model_dir,
+        "OMNIEVENT_EAE_MODEL": model_dir,
+        "OMNIEVENT_DEVICE": "cpu",
+        "OMNIEVENT_WARMUP": "false",
+        "OMNIEVENT_CACHE_SIZE": str(args.cache_size),
+        "OMNIEVENT_MAX_BATCH_SIZE": str(args.max_batch_size),
+        "OMNIEVENT_MAX_QUEUE_SIZE": str(max(1024, args.concurrency)),
+    })
+    # main.py mounts "static" and imports its modules relative to the server directory
+    os.chdir(SERVER_DIR)
+    sys.path.insert(0, SERVER_DIR)
+    import main
+    return main.app
+
+
+async def drive_server(app, texts, args):
+    import httpx
+
+    async def worker(client, queue, latencies, errors):
+        while not queue.empty():
+            text = queue.get_nowait()
+            params = {"text": text, "task": TASKS[args.task], "ontology": args.schema.upper()}
+            if args.task == "EAE":
+                params["triggers"] = get_triggers(text)
+            start = time.perf_counter()
+            response = await client.post("/api/query", json=params)
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors.append(response.status_code)
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://harness", timeout=None) as client:
+            # warmup
+            await client.post("/api/query", json={"text": texts[0], "task": TASKS["ED"]})
+            queue = asyncio.Queue()
+            for text in texts:
+                queue.put_nowait(text)
+            latencies, errors = [], []
+            start = time.perf_counter()
+            await asyncio.gather(*[worker(client, queue, latencies, errors) for _ in range(args.concurrency)])
+            total_time = time.perf_counter() - start
+    return summarize(latencies, total_time, len(errors))
+
+
+def drive_infer(model_dir, texts, args):
+    from OmniEvent.infer import infer
+    from OmniEvent.infer_module.cache import ResultCache
+    from transformers import MT5ForConditionalGeneration, MT5TokenizerFast
+
+    model = MT5ForConditionalGeneration.from_pretrained(model_dir).eval()
+    tokenizer = MT5TokenizerFast.from_pretrained(model_dir)
+    models, tokenizers = ([model, model], [tokenizer, tokenizer]) if args.task == "EE" else (model, tokenizer)
+    cache = ResultCache(args.cache_size) if args.cache_size > 0 else None
+
+    def query(text):
+        start = time.perf_counter()
+        infer(text, model=models, tokenizer=tokenizers, schema=args.schema, task=args.task, device="cpu",
+              triggers=get_triggers(text) if args.task == "EAE" else None, cache=cache)
+        return time.perf_counter() - start
+
+    # infer() prints its results
+    stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+    try:
+        query(texts[0])
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            start = time.perf_counter()
+            latencies = list(pool.map(query, texts))
+            total_time = time.perf_counter() - start
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    return summarize(latencies, total_time)
+
+
+def run(args):
+    import torch
+    torch.set_num_threads(args.num_threads)
+    os.environ["HF_HUB_OFFLINE"] = "1"
+    model_dir = args.model_dir or build_tiny_mt5(tempfile.mkdtemp(prefix="tiny-mt5-"))
+    texts = build_texts(args.lengths, args.num_requests, args.seed)
+    report = {
+        "task": args.task,
+        "concurrency": args.concurrency,
+        "lengths": args.lengths,
+        "mean_words": sum(len(text.split()) for text in texts) / len(texts),
+    }
+    if args.target in ["infer", "all"]:
+        report["infer"] = drive_infer(model_dir, texts, args)
+    if args.target in ["server", "all"]:
+        cwd, environ = os.getcwd(), dict(os.environ)
+        try:
+            report["server"] = asyncio.run(drive_server(load_server_app(model_dir, args), texts, args))
+        finally:
+            os.chdir(cwd)
+            os.environ.clear()
+            os.environ.update(environ)
+    return report
+
+
+def get_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--target", default="all", choices=["all", "server", "infer"])
+    parser.add_argument("--task", default="ED", choices=list(TASKS))
+    parser.add_argument("--schema", default="ace")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--num_requests", type=int, default=256)
+    parser.add_argument("--lengths", default="lognormal:20,0.5",
+                        help="Text lengths in words: fixed:N, uniform:A-B or lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--max_batch_size", type=int, default=32)
+    parser.add_argument("--cache_size", type=int, default=0, help="0 measures uncached inference")
+    parser.add_argument("--num_threads", type=int, default=4)
+    parser.add_argument("--model_dir", default=None, help="Reuse a tiny model built before")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(get_parser().parse_args()), indent=4))
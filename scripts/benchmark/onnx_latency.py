@@ -0,0 +1,78 @@
+"""Latency of seq2seq inference on cpu with the PyTorch model versus the ONNX Runtime engine.
+
+The ONNX graphs are exported to `<checkpoint>/onnx` on first use.
+
+Example:
+    python onnx_latency.py --model s2s-mt5-ed --task ED --batch_size 8 --num_threads 4
+"""
+import sys
+sys.path.append("../../")
+import json
+import time
+import argparse
+
+import numpy as np
+import torch
+
+from OmniEvent.infer import infer_batch, get_pretrained
+
+
+SAMPLE_TEXTS = [
+    "U.S. and British troops were moving on the strategic southern port city of Basra Saturday after a massive aerial assault pounded Baghdad at dawn",
+    "The company fired its chief executive after the merger talks collapsed last week",
+    "Police arrested two men in connection with the bombing that killed 12 people in the capital",
+    "Protesters marched through the city center on Sunday demanding the resignation of the prime minister",
+]
+
+
+def read_texts(args):
+    if args.input_file is None:
+        return [SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)] for i in range(args.num_texts)]
+    with open(args.input_file, "r", encoding="utf-8") as f:
+        return [json.loads(line)["text"] for line, _ in zip(f, range(args.num_texts))]
+
+
+def run(texts, args, model, tokenizer, backend):
+    latencies, results = [], []
+    for start in range(0, len(texts), args.batch_size):
+        batch = texts[start:start+args.batch_size]
+        begin = time.perf_counter()
+        results.extend(infer_batch(batch, args.schema, args.task, args.batch_size, model=model, tokenizer=tokenizer,
+                                   device="cpu", backend=backend))
+        latencies.append(time.perf_counter() - begin)
+    return results, latencies
+
+
+def summarize(latencies, num_texts):
+    return {
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p95_ms": float(np.percentile(latencies, 95) * 1000),
+        "texts_per_sec": num_texts / sum(latencies)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="s2s-mt5-ed")
+    parser.add_argument("--task", default="ED", choices=["ED", "EAE"])
+    parser.add_argument("--schema", default="ace")
+    parser.add_argument("--input_file", default=None, help="unified-format jsonl; defaults to built-in samples")
+    parser.add_argument("--num_texts", type=int, default=64)
+    parser.add_argument("--batch_size", type=int, default=8)
+    parser.add_argument("--num_threads", type=int, default=None, help="torch threads; onnxruntime uses its default")
+    parser.add_argument("--warmup", type=int, default=1, help="warm-up batches per backend")
+    args = parser.parse_args()
+
+    if args.num_threads is not None:
+        torch.set_num_threads(args.num_threads)
+    texts = read_texts(args)
+    report = {}
+    outputs = {}
+    for backend in ["torch", "onnx"]:
+        model, tokenizer = get_pretrained(args.model, "cpu", backend=backend)
+        run(texts[:args.batch_size * args.warmup], args, model, tokenizer, backend)
+        outputs[backend], latencies = run(texts, args, model, tokenizer, backend)
+        report[backend] = summarize(latencies, len(texts))
+    report["speedup"] = report["onnx"]["texts_per_sec"] / report["torch"]["texts_per_sec"]
+    report["results_match"] = outputs["torch"] == outputs["onnx"]
+    print(json.dumps(report, indent=4))
@@ -0,0 +1,93 @@
+"""Accuracy, latency and memory of dynamic int8 quantization versus the float32 model on a held-out file.
+
+The F1 scores are computed with `f1_score_overall` over `(text id, type, trigger)` tuples for ED and
+`(text id, trigger offset, role, mention)` tuples for EAE, the latter using the gold triggers as input.
+
+Example:
+    python quantization_report.py --input_file ../../data/processed/ace2005-en/test.unified.jsonl --task ED
+"""
+import sys
+sys.path.append("../../")
+import json
+import time
+import argparse
+
+import torch
+
+from OmniEvent.infer import infer_batch, get_pretrained
+from OmniEvent.infer_module.registry import get_model_memory
+from OmniEvent.infer_module.stream import get_input_triggers
+from OmniEvent.evaluation.metric import f1_score_overall
+
+
+def read_items(args):
+    with open(args.input_file, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line, _ in zip(f, range(args.num_texts))]
+
+
+def get_labels(items, task):
+    labels = []
+    for i, item in enumerate(items):
+        for event in item.get("events", []):
+            for trigger in event["triggers"]:
+                if task == "ED":
+                    labels.append((i, event["type"], trigger["trigger_word"]))
+                    continue
+                for argument in trigger.get("arguments", []):
+                    for mention in argument["mentions"]:
+                        labels.append((i, tuple(trigger["position"]), argument["role"], mention["mention"]))
+    return labels
+
+
+def get_preds(results, task):
+    preds = []
+    for i, result in enumerate(results):
+        for event in result["events"]:
+            if task == "ED":
+                preds.append((i, event["type"], event["trigger"]))
+                continue
+            for argument in event["arguments"]:
+                preds.append((i, tuple(event["offset"]), argument["role"], argument["mention"]))
+    return preds
+
+
+def evaluate(items, args, quantize):
+    model_name = "s2s-mt5-ed" if args.task == "ED" else "s2s-mt5-eae"
+    model, tokenizer = get_pretrained(model_name, "cpu", quantize=quantize)
+    texts = [item["text"] for item in items]
+    triggers = [get_input_triggers(item) for item in items] if args.task == "EAE" else None
+    start = time.perf_counter()
+    results = infer_batch(texts, args.schema, args.task, args.batch_size, model=model, tokenizer=tokenizer,
+                          triggers=triggers, device="cpu", quantize=quantize)
+    elapsed = time.perf_counter() - start
+    precision, recall, f1 = f1_score_overall(get_preds(results, args.task), get_labels(items, args.task))
+    return {
+        "precision": precision,
+        "recall": recall,
+        "f1": f1,
+        "texts_per_sec": len(texts) / elapsed,
+        "model_memory_mb": get_model_memory(model) / 2**20
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input_file", required=True, help="held-out unified-format jsonl")
+    parser.add_argument("--task", default="ED", choices=["ED", "EAE"])
+    parser.add_argument("--schema", default="ace")
+    parser.add_argument("--num_texts", type=int, default=1000)
+    parser.add_argument("--batch_size", type=int, default=16)
+    parser.add_argument("--num_threads", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.num_threads is not None:
+        torch.set_num_threads(args.num_threads)
+    items = read_items(args)
+    report = {
+        "float32": evaluate(items, args, None),
+        "int8": evaluate(items, args, "int8")
+    }
+    report["f1_delta"] = report["int8"]["f1"] - report["float32"]["f1"]
+    report["speedup"] = report["int8"]["texts_per_sec"] / report["float32"]["texts_per_sec"]
+    report["memory_ratio"] = report["float32"]["model_memory_mb"] / report["int8"]["model_memory_mb"]
+    print(json.dumps(report, indent=4))
@@ -0,0 +1,244 @@
+import time
+import asyncio
+import logging
+import functools
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from OmniEvent.infer_module.metrics import metrics, SIZE_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+
+metrics.describe("queue_wait_seconds", "Time requests wait in a batching queue.")
+metrics.describe("queue_batch_size", "Number of requests per micro-batch.", SIZE_BUCKETS)
+metrics.describe("rejected_total", "Requests rejected by admission control by reason.")
+metrics.describe("degraded_batches_total", "Batches generated with reduced beams or length under pressure.")
+
+
+class QueueFullError(Exception):
+    """Raised by `BatchQueue.submit` when the queue holds `max_queue_size` requests."""
+
+
+class DeadlineExceededError(Exception):
+    """Raised by `BatchQueue.submit` when the deadline of a request passes before its result is ready."""
+
+
+class ClientDisconnectedError(Exception):
+    """Raised by `cancel_on_disconnect` when the client went away before its result was ready."""
+
+
+def adaptive_generation(pressure: float, max_length: int = 128, num_beams: int = 4) -> Dict[str, int]:
+    """Generation settings for a batch under `pressure` (0 is idle, 1 is saturated).
+
+    Beam search dominates the latency of a batch, so the number of beams is reduced first and the maximum length of
+    the output second.
+    """
+    if pressure < 0.5:
+        return {"max_length": max_length, "num_beams": num_beams}
+    if pressure < 0.8:
+        return {"max_length": max_length, "num_beams": max(1, num_beams // 2)}
+    return {"max_length": max(16, max_length // 2), "num_beams": 1}
+
+
+class BatchQueue(object):
+    """Dynamic micro-batching of concurrent requests.
+
+    Requests submitted from the event loop are collected into a batch until `max_batch_size` requests or `max_tokens`
+    tokens are queued, or until `max_wait_ms` have passed since the first request of the batch arrived. The batch is
+    then processed by `process_batch` in a worker thread, so that the event loop keeps accepting requests while the
+    model is generating, and the result of every request is delivered through its own future.
+
+    Args:
+        process_batch (`Callable`):
+            Maps a list of request items to a list of results of the same length and order. Runs in a worker thread.
+        max_batch_size (`int`, `optional`, defaults to 32):
+            Maximum number of requests per batch.
+        max_tokens (`int`, `optional`):
+            Maximum number of tokens per batch, counted by `count_tokens`. A single request exceeding it still forms a
+            batch of its own.
+        max_wait_ms (`float`, `optional`, defaults to 10):
+            How long the first request of a batch waits for more requests to arrive.
+        max_queue_size (`int`, `optional`, defaults to 1024):
+            Maximum number of queued requests. `submit` rejects requests once the queue is full.
+        count_tokens (`Callable`, `optional`):
+            Counts the tokens of a request item. Each request counts as one token if not given.
+        executor (`ThreadPoolExecutor`, `optional`):
+            The executor running `process_batch`. A single worker thread is used if not given, so that batches of
+            different queues sharing the executor never run on the device at the same time.
+        adapt (`Callable`, `optional`):
+            Maps the pressure of a batch to keyword arguments of `process_batch`, e.g. `adaptive_generation`. The
+            pressure is the larger of how full the queue is and how much of the time left to the earliest deadline
+            of the batch a batch is expected to take.
+    """
+
+    def __init__(self,
+                 process_batch: Callable[[List[Any]], List[Any]],
+                 max_batch_size: int = 32,
+                 max_tokens: Optional[int] = None,
+                 max_wait_ms: float = 10,
+                 max_queue_size: int = 1024,
+                 count_tokens: Optional[Callable[[Any], int]] = None,
+                 executor: Optional[ThreadPoolExecutor] = None,
+                 adapt: Optional[Callable[[float], Dict]] = None,
+                 name: str = "batch") -> None:
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_tokens = max_tokens
+        self.max_wait_ms = max_wait_ms
+        self.max_queue_size = max_queue_size
+        self.count_tokens = count_tokens if count_tokens is not None else (lambda item: 1)
+        self.executor = executor if executor is not None else ThreadPoolExecutor(max_workers=1)
+        self.adapt = adapt
+        self.name = name
+        # moving average of the duration of a batch
+        self.batch_seconds = None
+        self.queue = None
+        self.worker = None
+        self.pending = None
+
+    @property
+    def depth(self) -> int:
+        """Number of requests waiting to be batched."""
+        return (self.queue.qsize() if self.queue is not None else 0) + (self.pending is not None)
+
+    def start(self) -> None:
+        """Starts the batching worker on the running event loop."""
+        if self.worker is None:
+            self.queue = asyncio.Queue(maxsize=self.max_queue_size)
+            self.worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stops the batching worker. Requests that are still queued are cancelled."""
+        if self.worker is None:
+            return
+        self.worker.cancel()
+        try:
+            await self.worker
+        except asyncio.CancelledError:
+            pass
+        self.worker = None
+        while self.pending is not None or not self.queue.empty():
+            _, future, _, _, _ = self.pending if self.pending is not None else self.queue.get_nowait()
+            self.pending = None
+            future.cancel()
+
+    async def submit(self, item: Any, deadline: Optional[float] = None) -> Any:
+        """Queues a request item and waits for its result.
+
+        Args:
+            item: The request item.
+            deadline (`float`, `optional`): The `time.perf_counter()` by which the result is needed.
+
+        Raises:
+            QueueFullError: If the queue is full.
+            DeadlineExceededError: If the deadline passes first. The request is dropped if it is still queued.
+        """
+        self.start()
+        if self.queue.full():
+            metrics.inc("rejected_total", queue=self.name, reason="queue_full")
+            raise QueueFullError("The %s queue is full" % self.name)
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((item, future, self.count_tokens(item), time.perf_counter(), deadline))
+        if deadline is None:
+            return await future
+        try:
+            # cancels the future on timeout, so that the worker skips the request
+            return await asyncio.wait_for(future, deadline - time.perf_counter())
+        except asyncio.TimeoutError:
+            metrics.inc("rejected_total", queue=self.name, reason="deadline")
+            raise DeadlineExceededError("The deadline passed before the result of the %s queue was ready" %
+                                        self.name)
+
+    def get_pressure(self, deadlines: List[float]) -> float:
+        pressure = self.depth / self.max_queue_size
+        if self.batch_seconds is not None and len(deadlines) > 0:
+            slack = min(deadlines) - time.perf_counter()
+            pressure = max(pressure, self.batch_seconds / slack if slack > 0 else 1.0)
+        return min(pressure, 1.0)
+
+    async def _next_batch(self) -> List:
+        if self.pending is not None:
+            batch, self.pending = [self.pending], None
+        else:
+            batch = [await self.queue.get()]
+        n_tokens = batch[0][2]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            if self.queue.empty():
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    request = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            else:
+                request = self.queue.get_nowait()
+            if self.max_tokens is not None and n_tokens + request[2] > self.max_tokens:
+                self.pending = request
+                break
+            batch.append(request)
+            n_tokens += request[2]
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            now = time.perf_counter()
+            for _, future, _, enqueued, deadline in batch:
+                metrics.observe("queue_wait_seconds", now - enqueued, queue=self.name)
+                if deadline is not None and deadline <= now and not future.done():
+                    future.set_exception(DeadlineExceededError("The deadline passed while the request was queued"))
+            # clients that gave up or whose deadline passed do not need to be computed
+            deadlines = [deadline for _, future, _, _, deadline in batch if not future.done() and deadline is not None]
+            batch = [(item, future) for item, future, _, _, _ in batch if not future.done()]
+            if len(batch) == 0:
+                continue
+            metrics.observe("queue_batch_size", len(batch), queue=self.name)
+            options = {}
+            if self.adapt is not None:
+                pressure = self.get_pressure(deadlines)
+                options = self.adapt(pressure)
+                if options != self.adapt(0.0):
+                    metrics.inc("degraded_batches_total", queue=self.name)
+            process = functools.partial(self.process_batch, [item for item, _ in batch], **options)
+            start = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(self.executor, process)
+                assert len(results) == len(batch), "process_batch must return one result per item"
+            except Exception as e:
+                logger.exception("%s batch of %d requests failed" % (self.name, len(batch)))
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            duration = time.perf_counter() - start
+            self.batch_seconds = duration if self.batch_seconds is None else 0.8 * self.batch_seconds + 0.2 * duration
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+
+async def cancel_on_disconnect(is_disconnected: Callable[[], Awaitable[bool]], awaitable: Awaitable,
+                               poll_interval: float = 0.1) -> Any:
+    """Awaits `awaitable`, cancelling it as soon as `is_disconnected()` (e.g. `Request.is_disconnected`) is true, so
+    that queued requests of clients that went away are never computed.
+
+    Raises:
+        ClientDisconnectedError: If the client disconnected.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait([task], timeout=poll_interval)
+            if len(done) > 0:
+                return task.result()
+            if await is_disconnected():
+                metrics.inc("rejected_total", reason="disconnected")
+                raise ClientDisconnectedError("The client disconnected")
+    finally:
+        task.cancel()
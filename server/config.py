@@ -0,0 +1,95 @@
+import os
+import yaml
+import dataclasses
+
+from dataclasses import dataclass, field
+from typing import List, Optional, Union
+
+
+@dataclass
+class ServerConfig:
+    """Settings of the demo server.
+
+    Values are read from a yaml file, and every field can be overridden by the environment variable
+    `OMNIEVENT_<FIELD NAME IN UPPER CASE>`, e.g. `OMNIEVENT_WORKERS=4`.
+
+    Attributes:
+        ed_model, eae_model: The ED and EAE models, names of pretrained models (downloaded and cached on first use) or
+            paths of checkpoints.
+        device: "auto", "cpu", "cuda" or "cuda:<index>", or one device per worker.
+        workers: Number of server processes. Workers on cpu share the weights loaded by the launcher copy-on-write.
+        threads_per_worker: Intra-op threads of every worker. Defaults to the number of cores divided by `workers`.
+        preload: Whether the launcher loads cpu weights once before forking the workers.
+        warmup: Whether every worker runs a sample query before it accepts requests.
+        max_queue_size: Requests beyond it are rejected with 429.
+        request_timeout: Default deadline of a request in seconds, None for no deadline. Clients can set their own
+            with the header `X-Request-Timeout`.
+        adaptive_generation: Whether beams and output length are reduced when the queue fills up or deadlines near.
+    """
+    ed_model: str = "s2s-mt5-ed"
+    eae_model: str = "s2s-mt5-eae"
+    device: Union[str, List[str]] = "auto"
+    workers: int = 1
+    threads_per_worker: Optional[int] = None
+    preload: bool = True
+    warmup: bool = True
+    host: str = "0.0.0.0"
+    port: int = 9621
+    # batching
+    max_batch_size: int = 32
+    max_batch_tokens: Optional[int] = None
+    max_wait_ms: float = 10
+    max_queue_size: int = 1024
+    # admission control
+    request_timeout: Optional[float] = 30.0
+    adaptive_generation: bool = True
+    # backpressure of /api/batch and /api/stream
+    max_request_items: int = 256
+    max_in_flight: int = 64
+    # result cache, 0 turns it off
+    cache_size: int = 10000
+    cache_path: Optional[str] = None
+
+    def get_worker_device(self, worker: int) -> str:
+        devices = self.device if isinstance(self.device, list) else [self.device]
+        device = devices[worker % len(devices)]
+        if device == "auto":
+            import torch
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+        return device
+
+    def get_threads_per_worker(self) -> int:
+        if self.threads_per_worker is not None:
+            return self.threads_per_worker
+        return max(1, (os.cpu_count() or 1) // self.workers)
+
+
+def parse_value(value: str, default):
+    if isinstance(default, bool):
+        return value.lower() in ["1", "true", "yes"]
+    if value.lower() in ["", "none", "null"]:
+        return None
+    if "," in value:
+        return value.split(",")
+    for cast in [int, float]:
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+def load_config(path: Optional[str] = None) -> ServerConfig:
+    """Loads the server config from a yaml file, if given, and applies the environment overrides."""
+    values = {}
+    if path is not None:
+        with open(path, "r", encoding="utf-8") as f:
+            values = yaml.safe_load(f) or {}
+    unknown = set(values) - set(f.name for f in dataclasses.fields(ServerConfig))
+    if len(unknown) != 0:
+        raise ValueError("Unknown server settings: %s" % ", ".join(sorted(unknown)))
+    for config_field in dataclasses.fields(ServerConfig):
+        name = "OMNIEVENT_%s" % config_field.name.upper()
+        if name in os.environ:
+            values[config_field.name] = parse_value(os.environ[name], config_field.default)
+    return ServerConfig(**values)
@@ -0,0 +1,96 @@
+"""Starts the demo server with the settings of a config file (see config.py and config.yaml).
+
+On cpu, the launcher loads the weights once and forks `workers` processes that share their memory pages
+copy-on-write and accept connections from one listening socket; each worker runs `threads_per_worker` intra-op
+threads. CUDA cannot be used across fork, so GPU workers load the weights onto their own device after forking.
+
+Example:
+    python launch.py --config config.yaml
+    OMNIEVENT_WORKERS=8 OMNIEVENT_DEVICE=cpu python launch.py --config config.yaml
+"""
+import os
+import gc
+import sys
+import signal
+import socket
+import logging
+import argparse
+
+import torch
+import uvicorn
+
+logger = logging.getLogger(__name__)
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(server, worker: int, sock: socket.socket) -> None:
+    config = server.config
+    torch.set_num_threads(config.get_threads_per_worker())
+    if server.engine is None:
+        server.load_models(config.get_worker_device(worker))
+    logger.info("Worker %d (pid %d) serves on %s with %d threads" % (worker, os.getpid(), server.engine.device,
+                                                                     torch.get_num_threads()))
+    uvicorn.Server(uvicorn.Config(server.app, log_level="info")).run(sockets=[sock])
+
+
+def main(args) -> None:
+    if args.config is not None:
+        os.environ["OMNIEVENT_SERVER_CONFIG"] = os.path.abspath(args.config)
+    # main.py is imported only now, so that it reads the config
+    import main as server
+    config = server.config
+    devices = [config.get_worker_device(worker) for worker in range(config.workers)]
+    if config.preload and all(device == "cpu" for device in devices):
+        # the weights are shared by all workers. The parent must not run parallel regions before forking, since the
+        # OpenMP thread pool does not survive fork.
+        torch.set_num_threads(1)
+        server.load_models("cpu")
+        # keeps the garbage collector from touching, and thereby copying, the pages of the loaded objects
+        gc.freeze()
+    sock = bind_socket(config.host, config.port)
+    logger.info("Listening on %s:%d with %d workers on %s" % (config.host, config.port, config.workers, devices))
+    if config.workers == 1:
+        run_worker(server, 0, sock)
+        return
+
+    children = {}
+    for worker in range(config.workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            run_worker(server, worker, sock)
+            os._exit(0)
+        children[pid] = worker
+
+    def stop(signum, frame):
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    while len(children) > 0:
+        try:
+            pid, status = os.wait()
+        except InterruptedError:
+            continue
+        except ChildProcessError:
+            break
+        worker = children.pop(pid, None)
+        if os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0:
+            logger.info("Worker %s exited" % worker)
+        else:
+            logger.error("Worker %s (pid %d) died with status %d" % (worker, pid, status))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default="config.yaml")
+    main(parser.parse_args())
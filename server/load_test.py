@@ -0,0 +1,63 @@
+"""Load test of the running server: latency percentiles and throughput under concurrent clients.
+
+Example:
+    python load_test.py --url http://127.0.0.1:9621/api/query --concurrency 32 --num_requests 1024
+"""
+import json
+import time
+import argparse
+import requests
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+SAMPLE_TEXTS = [
+    "U.S. and British troops were moving on the strategic southern port city of Basra Saturday after a massive aerial assault pounded Baghdad at dawn",
+    "The company fired its chief executive after the merger talks collapsed last week",
+    "Police arrested two men in connection with the bombing that killed 12 people in the capital",
+    "Protesters marched through the city center on Sunday demanding the resignation of the prime minister",
+]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(q / 100 * len(values)), len(values) - 1)]
+
+
+def query(session, url, params):
+    start = time.perf_counter()
+    response = session.post(url, json=params)
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+def run(args):
+    params = [{"text": SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)], "task": args.task, "ontology": args.ontology}
+              for i in range(args.num_requests)]
+    sessions = [requests.Session() for _ in range(args.concurrency)]
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        # warmup
+        list(pool.map(lambda i: query(sessions[i], args.url, params[i]), range(args.concurrency)))
+        start = time.perf_counter()
+        latencies = list(pool.map(lambda i: query(sessions[i % args.concurrency], args.url, params[i]),
+                                  range(args.num_requests)))
+        total_time = time.perf_counter() - start
+    return {
+        "concurrency": args.concurrency,
+        "num_requests": args.num_requests,
+        "qps": args.num_requests / total_time,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": sum(latencies) / len(latencies) * 1000,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:9621/api/query")
+    parser.add_argument("--task", default="Event Detection")
+    parser.add_argument("--ontology", default="ERE")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--num_requests", type=int, default=1024)
+    args = parser.parse_args()
+    print(json.dumps(run(args), indent=4))
@@ -1,10 +1,15 @@
 from asyncio.log import logger
 import os 
+import sys
 import json
-os.environ["CUDA_VISIBLE_DEVICES"] = "0"
+import time
+import asyncio
+sys.path.append("..")
 
 from typing import Union, List, Tuple
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import PlainTextResponse, JSONResponse, Response
+from pydantic import ValidationError
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
@@ -19,17 +24,22 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-from model.seq2seq import (
-    get_backbone,
-    do_event_detection,
-    do_event_argument_extraction
-)
 from io_format import Result, Event, Argument, Input
-from extract_utils import get_ed_result, get_eae_result
-from extract_utils import (
-    prepare_for_eae_from_input,
-    prepare_for_eae_from_pred
+from batching import (
+    BatchQueue,
+    QueueFullError,
+    DeadlineExceededError,
+    ClientDisconnectedError,
+    adaptive_generation,
+    cancel_on_disconnect
 )
+from streaming import iter_lines, map_ordered, DuplexStreamingResponse
+from OmniEvent.infer_module.metrics import metrics
+from OmniEvent.infer_module.cache import ResultCache
+from OmniEvent.infer_module.seq2seq import prepare_for_eae_from_input, prepare_for_eae_from_result
+from OmniEvent.engine import InferenceEngine
+from config import load_config
+from concurrent.futures import ThreadPoolExecutor
 from fastapi.middleware.cors import CORSMiddleware
 origins = [
     "*",
@@ -47,16 +57,36 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="static")
 
 
+# config, see config.py
+config = load_config(os.environ.get("OMNIEVENT_SERVER_CONFIG", None))
+
+
+# result cache, shared by all endpoints. cache_size=0 turns it off.
+# Created by every worker when the app starts, i.e. after launch.py forked it: a sqlite connection must not be shared
+# by several processes.
+cache = None
+
+
 # model 
-model_path = "/data/ph/OmniEvent_Model/s2s-mt5-ed"
-ed_model, ed_tokenizer, _ = get_backbone("t5", model_path, model_path)
-ed_model.cuda()
-ed_model.eval()
+# Loaded by `load_models`, either by launch.py before forking the workers or when the app starts.
+# The queues below batch requests, so the engine runs every micro-batch as a single batch.
+engine = None
+ready = False
+
+
+def load_models(device):
+    global engine
+    logger.info("Loading models on %s" % device)
+    engine = InferenceEngine.from_pretrained(config.ed_model, config.eae_model, device,
+                                             batch_size=config.max_batch_size, cache=cache)
+
 
-model_path = "/data/ph/OmniEvent_Model/s2s-mt5-eae"
-eae_model, eae_tokenizer, _ = get_backbone("t5", model_path, model_path)
-eae_model.cuda()
-eae_model.eval()
+def open_cache():
+    global cache
+    if config.cache_size > 0 and cache is None:
+        cache = ResultCache(config.cache_size, config.cache_path)
+    if engine is not None:
+        engine.cache = cache
 
 
 # @app.get("/")
@@ -73,34 +103,233 @@ def root(request: Request):
     )
 
 
-@app.post("/api/query")
-async def main(item: Input):
-    logger.info(item)
+# batching
+# All batches run in one worker thread, so that ED and EAE batches never share the GPU at the same time.
+MAX_BATCH_SIZE = config.max_batch_size
+MAX_BATCH_TOKENS = config.max_batch_tokens
+MAX_WAIT_MS = config.max_wait_ms
+MAX_QUEUE_SIZE = config.max_queue_size
+# backpressure of /api/batch and /api/stream
+MAX_REQUEST_ITEMS = config.max_request_items
+MAX_IN_FLIGHT = config.max_in_flight
+# task names of the API
+TASKS = {
+    "Event Detection": "ED",
+    "Event Argument Extraction": "EAE",
+    "Event Extraction": "EE"
+}
+
+
+def count_tokens(text, schema):
+    return engine.count_tokens(text, schema)
+
+
+def detect_events_batch(items, **gen_kwargs):
+    """Runs ED on a batch of `(text, schema)` items and returns one result per item."""
+    texts = [text for text, _ in items]
+    schemas = [schema for _, schema in items]
+    return engine.detect_events(texts, schemas, **gen_kwargs)[0]
+
+
+def extract_arguments_batch(instances, **gen_kwargs):
+    """Runs EAE on a batch of instances and returns one result per instance."""
+    return engine.extract_arguments(instances, **gen_kwargs)
+
+
+executor = ThreadPoolExecutor(max_workers=1)
+ed_queue = BatchQueue(detect_events_batch,
+                      max_batch_size=MAX_BATCH_SIZE,
+                      max_tokens=MAX_BATCH_TOKENS,
+                      max_wait_ms=MAX_WAIT_MS,
+                      max_queue_size=MAX_QUEUE_SIZE,
+                      count_tokens=lambda item: count_tokens(*item),
+                      executor=executor,
+                      adapt=adaptive_generation if config.adaptive_generation else None,
+                      name="ED")
+eae_queue = BatchQueue(extract_arguments_batch,
+                       max_batch_size=MAX_BATCH_SIZE,
+                       max_tokens=MAX_BATCH_TOKENS,
+                       max_wait_ms=MAX_WAIT_MS,
+                       max_queue_size=MAX_QUEUE_SIZE,
+                       count_tokens=lambda instance: max(len(instance["triggers"]), 1) * \
+                                                     count_tokens(instance["text"], instance["schema"]),
+                       executor=executor,
+                       adapt=adaptive_generation if config.adaptive_generation else None,
+                       name="EAE")
+
+
+@app.on_event("startup")
+async def start():
+    global ready
+    loop = asyncio.get_running_loop()
+    open_cache()
+    if engine is None:
+        await loop.run_in_executor(executor, load_models, config.get_worker_device(0))
+    if config.warmup:
+        await loop.run_in_executor(executor, engine.warmup)
+    ready = True
+
+
+@app.get("/health/live")
+def live():
+    return {"live": True}
+
+
+@app.get("/health/ready")
+def is_ready():
+    if not ready:
+        raise HTTPException(status_code=503, detail="Models are loading")
+    return {"ready": True}
+
+
+@app.on_event("shutdown")
+async def stop_queues():
+    await ed_queue.stop()
+    await eae_queue.stop()
+
+
+def get_deadline(request: Request = None):
+    """Returns the `time.perf_counter()` deadline of a request, from its header `X-Request-Timeout` (seconds) or the
+    configured `request_timeout`."""
+    timeout = config.request_timeout
+    if request is not None and "x-request-timeout" in request.headers:
+        try:
+            timeout = float(request.headers["x-request-timeout"])
+        except ValueError:
+            raise HTTPException(status_code=400, detail="X-Request-Timeout must be a number of seconds")
+    return time.perf_counter() + timeout if timeout is not None else None
+
+
+async def run_query(item: Input, deadline=None):
+    if cache is None or item.task not in TASKS:
+        return await compute_query(item, deadline)
+    schema = f"<{item.ontology.lower()}>"
+    triggers = item.triggers if item.task == "Event Argument Extraction" else None
+    key = engine.make_key(item.text, schema, TASKS[item.task], triggers)
+    return await cache.get_or_compute_async(key, item.text, schema, lambda: compute_query(item, deadline))
+
+
+async def compute_query(item: Input, deadline=None):
     schema = f"<{item.ontology.lower()}>"
     if item.task == "Event Detection":
-        events = do_event_detection(ed_model, ed_tokenizer, [item.text], [schema])
-        results = get_ed_result([item.text], events)
+        return await ed_queue.submit((item.text, schema), deadline)
     elif item.task == "Event Argument Extraction":
         if len(item.triggers) == 0:
-            results = [{
+            return {
                 "text": item.text,
                 "events": []
-            }]
-            return results
+            }
         instances = prepare_for_eae_from_input([item.text], [item.triggers], [schema])
-        arguments = do_event_argument_extraction(eae_model, eae_tokenizer, instances)
-        results = get_eae_result(instances, arguments)
+        return await eae_queue.submit(instances[0], deadline)
     elif item.task == "Event Extraction":
-        events = do_event_detection(ed_model, ed_tokenizer, [item.text], [schema])
-        instances = prepare_for_eae_from_pred([item.text], events, [schema])
-        if len(instances[0]["triggers"]) == 0:
-            results = [{
-                "text": instances[0]["text"],
+        ed_result = await ed_queue.submit((item.text, schema), deadline)
+        instance = prepare_for_eae_from_result(ed_result, schema)
+        if len(instance["triggers"]) == 0:
+            return {
+                "text": instance["text"],
                 "events": []
-            }]
-            return results
-        arguments = do_event_argument_extraction(eae_model, eae_tokenizer, instances)
-        results = get_eae_result(instances, arguments)
+            }
+        return await eae_queue.submit(instance, deadline)
+    raise HTTPException(status_code=422, detail=f"Unknown task: {item.task}")
+
+
+metrics.describe("request_seconds", "Latency of every request by endpoint.")
+
+
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    if request.url.path.startswith("/api/"):
+        metrics.observe("request_seconds", time.perf_counter() - start, endpoint=request.url.path)
+        metrics.inc("requests_total", endpoint=request.url.path, status=response.status_code)
+    return response
+
+
+@app.get("/metrics")
+def get_metrics():
+    for queue in [ed_queue, eae_queue]:
+        metrics.set("queue_depth", queue.depth, queue=queue.name)
+    if cache is not None:
+        metrics.set("cache_hit_rate", cache.get_stats()["hit_rate"])
+    return PlainTextResponse(metrics.to_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.exception_handler(QueueFullError)
+async def queue_full(request: Request, e: QueueFullError):
+    return JSONResponse({"detail": str(e)}, status_code=429, headers={"Retry-After": "1"})
+
+
+@app.exception_handler(DeadlineExceededError)
+async def deadline_exceeded(request: Request, e: DeadlineExceededError):
+    return JSONResponse({"detail": str(e)}, status_code=504)
+
+
+@app.exception_handler(ClientDisconnectedError)
+async def client_disconnected(request: Request, e: ClientDisconnectedError):
+    # nobody reads it, but it shows up in the access log and metrics
+    return Response(status_code=499)
+
+
+@app.post("/api/query")
+async def main(item: Input, request: Request):
+    logger.info(item)
+    deadline = get_deadline(request)
+    results = [await cancel_on_disconnect(request.is_disconnected, run_query(item, deadline))]
     logger.info(results)
     return results
 
+
+@app.post("/api/batch")
+async def batch(items: List[Input], request: Request):
+    """Returns one result per input, in input order."""
+    if len(items) > MAX_REQUEST_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_REQUEST_ITEMS} inputs per request")
+    logger.info("batch of %d inputs" % len(items))
+    deadline = get_deadline(request)
+
+    async def run_batch():
+        return [result async for result in map_ordered(lambda item: run_query(item, deadline), iter_items(items),
+                                                       MAX_IN_FLIGHT)]
+    return await cancel_on_disconnect(request.is_disconnected, run_batch())
+
+
+async def iter_items(items):
+    for item in items:
+        yield item
+
+
+async def run_stream_line(line, deadline=None):
+    try:
+        item = Input(**json.loads(line))
+    except (ValueError, ValidationError) as e:
+        return {"error": str(e), "status": 422}
+    try:
+        return await run_query(item, deadline)
+    except HTTPException as e:
+        return {"error": e.detail, "status": e.status_code}
+    except QueueFullError as e:
+        return {"error": str(e), "status": 429}
+    except DeadlineExceededError as e:
+        return {"error": str(e), "status": 504}
+
+
+async def stream_results(request: Request, timeout=None):
+    # every line gets the full timeout from the moment it is read
+    def run_line(line):
+        return run_stream_line(line, time.perf_counter() + timeout if timeout is not None else None)
+    async for result in map_ordered(run_line, iter_lines(request.stream()), MAX_IN_FLIGHT):
+        yield json.dumps(result, ensure_ascii=False) + "\n"
+
+
+@app.post("/api/stream")
+async def stream(request: Request):
+    """Reads one `Input` per line of NDJSON and streams back one result per line, in input order.
+
+    At most `OMNIEVENT_MAX_IN_FLIGHT` inputs are queued per stream; the rest of the body is only read once earlier
+    results have been sent. Lines that are not a valid `Input`, or that are rejected by admission control, yield
+    `{"error": ..., "status": ...}`. Queued lines are cancelled if the client disconnects.
+    """
+    deadline = get_deadline(request)
+    timeout = deadline - time.perf_counter() if deadline is not None else None
+    return DuplexStreamingResponse(stream_results(request, timeout), media_type="application/x-ndjson")
@@ -0,0 +1,60 @@
+import asyncio
+
+from collections import deque
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+
+async def iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    """Splits a stream of byte chunks into non-empty lines."""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        lines = buffer.split(b"\n")
+        buffer = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield line.decode("utf-8")
+    if buffer.strip():
+        yield buffer.decode("utf-8")
+
+
+async def map_ordered(fn: Callable[[Any], Awaitable[Any]],
+                      items: AsyncIterable[Any],
+                      max_in_flight: int = 64) -> AsyncIterator[Any]:
+    """Applies `fn` to every item concurrently and yields the results in the order of the items.
+
+    At most `max_in_flight` items are processed at the same time: the next item is only read from `items` once the
+    oldest item has been yielded, so that a fast producer is slowed down to the speed of the model. Results that are
+    already done are yielded right away. Items still in flight are cancelled if the consumer stops early, e.g. when
+    the client disconnects.
+    """
+    pending = deque()
+    try:
+        async for item in items:
+            pending.append(asyncio.ensure_future(fn(item)))
+            while len(pending) >= max_in_flight or (len(pending) > 0 and pending[0].done()):
+                yield await pending.popleft()
+        while len(pending) > 0:
+            yield await pending.popleft()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """A `StreamingResponse` whose body may still read the request body while it is being sent.
+
+    `StreamingResponse` listens for the client disconnecting by reading the request messages, which steals the request
+    body from a response that streams its results while the request is still being uploaded. Here the body iterator
+    is the only reader, and a disconnect surfaces as `ClientDisconnect` from `Request.stream()` instead.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await self.stream_response(send)
+        except OSError:
+            pass
+        if self.background is not None:
+            await self.background()
@@ -0,0 +1,73 @@
+import os
+import time
+import tempfile
+import threading
+import unittest
+import sys
+sys.path.append("..")
+
+from OmniEvent.infer import infer
+from OmniEvent.infer_module.cache import ResultCache, get_alignment
+
+from utils import EchoModel, build_tokenizer
+
+
+class TestResultCache(unittest.TestCase):
+
+    def test_get_alignment(self):
+        normalized, positions = get_alignment("  a  bc\td ")
+        self.assertEqual(normalized, " a bc d")
+        self.assertEqual(positions, [0, 2, 4, 5, 6, 7, 8])
+        self.assertEqual(get_alignment("a  b "), ("a b", [0, 2, 3]))
+
+    def test_infer_with_whitespace_variants(self):
+        text = "<attack:assault> x x assault"
+        variant = "<attack:assault>  x x\tassault  "
+        tokenizer = build_tokenizer([text])
+        model = EchoModel()
+        cache = ResultCache()
+        infer(text, model=model, tokenizer=tokenizer, device="cpu", cache=cache)
+        result = infer(variant, model=model, tokenizer=tokenizer, device="cpu", cache=cache)
+        self.assertEqual(len(model.batch_sizes), 1)
+        self.assertEqual(result, infer(variant, model=EchoModel(), tokenizer=tokenizer, device="cpu"))
+        self.assertEqual(cache.get_stats()["memory_hit"], 1)
+        # cached results are copies
+        result[0]["events"].clear()
+        self.assertEqual(len(infer(text, model=model, tokenizer=tokenizer, device="cpu", cache=cache)[0]["events"]), 1)
+
+    def test_coalescing(self):
+        cache = ResultCache()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.1)
+            return {"text": "a b", "events": [{"type": "x", "trigger": "b", "offset": [2, 3]}]}
+
+        key = cache.make_key("a b", "<ace>", "ED", [])
+        results = [None] * 4
+
+        def run(i):
+            results[i] = cache.get_or_compute(key, "a b", "<ace>", compute)
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(result == results[0] for result in results))
+        self.assertEqual(cache.get_stats()["coalesced"], 3)
+
+    def test_disk_tier(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "cache.sqlite")
+            key = ResultCache(path=path).make_key("a b", "<ace>", "ED", [])
+            value = {"text": "a b", "events": []}
+            ResultCache(path=path).put(key[0], value)
+            cache = ResultCache(path=path)
+            self.assertEqual(cache.get_or_compute(key, "a b", "<ace>", lambda: None), value)
+            self.assertEqual(cache.get_stats()["disk_hit"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import unittest
+import sys
+sys.path.append("..")
+
+import torch
+
+from transformers import (
+    T5Config,
+    T5ForConditionalGeneration,
+    LogitsProcessor,
+    LogitsProcessorList,
+    PrefixConstrainedLogitsProcessor
+)
+
+import random
+
+from OmniEvent.model.constraint_decoding import (
+    get_constraint_decoder,
+    generated_search_src_sequence,
+    ConstrainedLogitsProcessor,
+    SourceIndex
+)
+from OmniEvent.input_engineering.seq2seq_processor import type_start, type_end
+
+from utils import build_tokenizer
+
+
+ROLES = ["Time", "Time Within", "Place", "Attacker Agent", "Target"]
+TEXTS = [
+    "the army attacked the city at dawn and the city fell",
+    "rebels attacked the army",
+    "at dawn the the the rebels fired at the city of the army at dawn",
+]
+
+
+class CheckingProcessor(LogitsProcessor):
+    """Applies `ConstrainedLogitsProcessor` and asserts that it matches `prefix_allowed_tokens_fn` at every step."""
+
+    def __init__(self, test, processor, reference):
+        self.test = test
+        self.processor = processor
+        self.reference = reference
+        self.steps = 0
+
+    def __call__(self, input_ids, scores):
+        scores = scores.clone()
+        scores[torch.isinf(scores)] = -1e4
+        expected = self.reference(input_ids, scores)
+        output = self.processor(input_ids, scores)
+        self.test.assertTrue(torch.equal(torch.isinf(output), torch.isinf(expected)))
+        self.steps += 1
+        return output
+
+
+class TestConstrainedLogitsProcessor(unittest.TestCase):
+
+    def setUp(self):
+        torch.manual_seed(0)
+        self.tokenizer = build_tokenizer(TEXTS + ROLES, [type_start, type_end], prefix="")
+        config = T5Config(vocab_size=len(self.tokenizer), d_model=32, d_kv=8, d_ff=64, num_layers=2, num_heads=4,
+                          decoder_start_token_id=0, pad_token_id=0, eos_token_id=1)
+        self.model = T5ForConditionalGeneration(config).eval()
+        self.decoder = get_constraint_decoder(self.tokenizer, {"role_list": ROLES})
+        self.inputs = self.tokenizer(TEXTS, padding=True, return_tensors="pt")
+
+    def generate(self, **kwargs):
+        return self.model.generate(self.inputs["input_ids"], attention_mask=self.inputs["attention_mask"],
+                                   max_length=40, num_beams=4, **kwargs)
+
+    def test_same_mask_as_prefix_fn(self):
+        def prefix_allowed_tokens_fn(batch_id, sent):
+            return self.decoder.constraint_decoding(batch_id, self.inputs["input_ids"][batch_id], sent)
+        for seed in range(3):
+            torch.manual_seed(seed)
+            for module in self.model.modules():
+                if isinstance(module, torch.nn.Linear):
+                    torch.nn.init.normal_(module.weight, std=1.0)
+            checking = CheckingProcessor(self,
+                                         ConstrainedLogitsProcessor(self.decoder, self.inputs["input_ids"], 4),
+                                         PrefixConstrainedLogitsProcessor(prefix_allowed_tokens_fn, 4))
+            self.generate(logits_processor=LogitsProcessorList([checking]))
+            self.assertGreater(checking.steps, 1)
+
+    def test_same_output_as_prefix_fn(self):
+        def prefix_allowed_tokens_fn(batch_id, sent):
+            return self.decoder.constraint_decoding(batch_id, self.inputs["input_ids"][batch_id], sent)
+        expected = self.generate(prefix_allowed_tokens_fn=prefix_allowed_tokens_fn)
+        processor = ConstrainedLogitsProcessor(self.decoder, self.inputs["input_ids"], 4)
+        output = self.generate(logits_processor=LogitsProcessorList([processor]))
+        self.assertTrue(torch.equal(output, expected))
+
+    def test_source_index_per_row(self):
+        processor = ConstrainedLogitsProcessor(self.decoder, self.inputs["input_ids"], 4)
+        index = processor.get_src_index(1)
+        self.assertEqual(index.sequence, self.tokenizer.encode(TEXTS[1], add_special_tokens=False))
+        self.assertIs(processor.get_src_index(1), index)
+        self.assertEqual(list(processor.src_indices), [1])
+        # copying "the" of "<Target> the" continues with "army"
+        generated = torch.tensor([0] + self.tokenizer.convert_tokens_to_ids([type_start, type_start, "Target", "the"]))
+        valid_tokens = self.decoder.constraint_decoding(1, self.inputs["input_ids"][1], generated, src_index=index)
+        self.assertEqual(valid_tokens, self.tokenizer.convert_tokens_to_ids(["army", type_end]))
+        self.assertEqual(valid_tokens, self.decoder.constraint_decoding(1, self.inputs["input_ids"][1], generated))
+
+
+class TestSourceIndex(unittest.TestCase):
+
+    def test_same_tokens_as_match_sublist(self):
+        random.seed(0)
+        for _ in range(20):
+            src = [random.randint(0, 4) for _ in range(random.randint(1, 60))]
+            index = SourceIndex(src)
+            for _ in range(50):
+                start = random.randint(0, len(src) - 1)
+                span = src[start:start + random.randint(1, 8)]
+                if random.random() < 0.3:
+                    span = span + [random.randint(0, 5)]
+                for end in range(1, len(span) + 1):
+                    self.assertEqual(
+                        sorted(set(generated_search_src_sequence(span[:end], src, src_index=index))),
+                        sorted(set(generated_search_src_sequence(span[:end], src)))
+                    )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+import os
+import json
+import tempfile
+import unittest
+import sys
+sys.path.append("..")
+
+import yaml
+import torch
+
+from transformers import BertConfig, BertModel, BertTokenizerFast
+
+from OmniEvent.infer import infer, infer_batch, get_pretrained, model_registry
+from OmniEvent.arguments import DataArguments
+from OmniEvent.infer_module.encoder import EncoderInferenceModel, get_spans, tokenize_words
+from OmniEvent.input_engineering.mrc_processor import EDMRCProcessor
+
+
+TEXT = "rebels attacked the army in the north"
+TYPES = ["NA", "attack", "die"]
+ROLES = ["NA", "Attacker", "Target"]
+
+
+class EncoderCheckpointTestCase(unittest.TestCase):
+    """Saves small encoder checkpoints whose head always predicts one label."""
+
+    def setUp(self):
+        torch.manual_seed(0)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        bert_path = os.path.join(self.tmp_dir.name, "bert")
+        os.makedirs(bert_path)
+        with open(os.path.join(bert_path, "vocab.txt"), "w") as f:
+            f.write("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + TEXT.split()))
+        BertTokenizerFast(os.path.join(bert_path, "vocab.txt")).save_pretrained(bert_path)
+        config = BertConfig(vocab_size=16, hidden_size=32, num_hidden_layers=1, num_attention_heads=2,
+                            intermediate_size=64)
+        BertModel(config).save_pretrained(bert_path)
+        self.bert_path = bert_path
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def save_checkpoint(self, paradigm, label, task="ED"):
+        """Saves a checkpoint whose head always predicts `label`."""
+        path = os.path.join(self.tmp_dir.name, paradigm + task)
+        os.makedirs(path)
+        args = {"paradigm": paradigm, "model_type": "bert", "model_name_or_path": self.bert_path,
+                "hidden_size": 32, "head_type": "linear", "aggregation": "cls", "task_name": task,
+                "output_dir": path, "language": "English", "max_seq_length": 32}
+        with open(os.path.join(path, "args.yaml"), "w") as f:
+            yaml.safe_dump(args, f)
+        labels = TYPES if task == "ED" else ROLES
+        with open(os.path.join(path, "type2id.json" if task == "ED" else "role2id.json"), "w") as f:
+            json.dump({label: i for i, label in enumerate(labels)}, f)
+        # backbone weights only, then the head is overwritten
+        torch.save({}, os.path.join(path, "pytorch_model.bin"))
+        model, _ = get_pretrained(path, "cpu")
+        model_registry.evict(path)
+        classifier = model.model.cls_head.classifier
+        torch.nn.init.zeros_(classifier.weight)
+        torch.nn.init.zeros_(classifier.bias)
+        classifier.bias.data[model.label2id[label]] = 10
+        torch.save(model.model.state_dict(), os.path.join(path, "pytorch_model.bin"))
+        return path
+
+
+class TestEncoderInfer(EncoderCheckpointTestCase):
+
+    def test_get_spans(self):
+        model = EncoderInferenceModel(None, "sequence_labeling", "ED", {"O": 0, "B-attack": 1, "I-attack": 2})
+        self.assertEqual(get_spans([0, 1, 2, 0, 1, 0], model), [(1, 3, "attack"), (4, 5, "attack")])
+        # a span followed by a span of the same label is ambiguous, as in evaluation
+        self.assertEqual(get_spans([1, 1], model), [(1, 2, "attack")])
+
+    def test_token_classification(self):
+        path = self.save_checkpoint("token_classification", "attack")
+        results = infer(TEXT, model=path, task="ED", device="cpu")
+        events = results[0]["events"]
+        self.assertEqual([event["trigger"] for event in events], TEXT.split())
+        for event in events:
+            self.assertEqual(event["type"], "attack")
+            self.assertEqual(TEXT[event["offset"][0]:event["offset"][1]], event["trigger"])
+
+    def test_sequence_labeling(self):
+        path = self.save_checkpoint("sequence_labeling", "I-attack")
+        # every word is I-attack, so there is no span start
+        self.assertEqual(infer_batch([TEXT], model=path, device="cpu")[0]["events"], [])
+
+    def test_words_without_tokens(self):
+        path = self.save_checkpoint("sequence_labeling", "B-attack")
+        # the tokenizer drops the zero width space, which must not shift the labels of the following words
+        text = "rebels \u200b attacked"
+        events = infer_batch([text], model=path, device="cpu")[0]["events"]
+        self.assertEqual([event["trigger"] for event in events], ["rebels", "attacked"])
+        self.assertEqual(events[1]["offset"], [text.index("attacked"), len(text)])
+
+    def test_argument_extraction(self):
+        path = self.save_checkpoint("sequence_labeling", "B-Target", task="EAE")
+        results = infer(TEXT, model=path, triggers=[("attacked", 7, 15)], task="EAE", device="cpu")
+        # the trigger markers are not words of the text: only the last word starts an unambiguous span
+        self.assertEqual(results[0]["events"][0]["arguments"],
+                         [{"mention": "north", "offset": [32, 37], "role": "Target"}])
+
+
+class TestMRCInfer(EncoderCheckpointTestCase):
+
+    def test_event_detection(self):
+        path = self.save_checkpoint("mrc", "attack")
+        events = infer_batch([TEXT], model=path, device="cpu")[0]["events"]
+        self.assertEqual(events, [{"type": "attack", "trigger": TEXT, "offset": [0, len(TEXT)]}])
+
+    def test_inputs_match_processor(self):
+        path = self.save_checkpoint("mrc", "attack")
+        model, tokenizer = get_pretrained(path, "cpu")
+        # the second text is longer than `max_seq_length` and truncated
+        texts = [TEXT, " ".join([TEXT] * 6)]
+        input_file = os.path.join(self.tmp_dir.name, "test.unified.jsonl")
+        with open(input_file, "w") as f:
+            for i, text in enumerate(texts):
+                f.write(json.dumps({"id": str(i), "text": text, "events": []}) + "\n")
+        config = DataArguments(language="English", max_seq_length=model.max_seq_length)
+        config.type2id = model.label2id
+        processor = EDMRCProcessor(config, tokenizer, input_file)
+        inputs, word_ids = tokenize_words(model, tokenizer, [text.split() for text in texts], "cpu")
+        for i in range(len(texts)):
+            features = processor.input_features[i]
+            length = int(sum(features.attention_mask))
+            self.assertEqual(int(inputs["attention_mask"][i].sum()), length)
+            for key in ["input_ids", "token_type_ids"]:
+                self.assertEqual(inputs[key][i][:length].tolist(), list(getattr(features, key)[:length]), key)
+            # the first token of every word is labeled in training and predicted at inference
+            labeled = [pos for pos, label in enumerate(features.labels) if label != -100]
+            first_tokens = [pos for pos, word_id in enumerate(word_ids[i])
+                            if word_id is not None and word_id != word_ids[i][pos - 1]]
+            self.assertEqual(first_tokens, labeled)
+
+
+if __name__ == "__main__":
+    unittest.main()
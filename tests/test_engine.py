@@ -0,0 +1,90 @@
+import unittest
+import sys
+sys.path.append("..")
+
+import torch
+
+from OmniEvent.engine import InferenceEngine, get_device
+from OmniEvent.infer import infer, infer_batch
+from OmniEvent.infer_module.cache import ResultCache
+
+from utils import EchoModel, build_tokenizer
+
+
+class KwargsEchoModel(EchoModel):
+    """Also records the generation settings of every call."""
+
+    def __init__(self):
+        super(KwargsEchoModel, self).__init__()
+        self.num_beams = []
+
+    def generate(self, input_ids, attention_mask=None, **kwargs):
+        self.num_beams.append(kwargs["num_beams"])
+        return super(KwargsEchoModel, self).generate(input_ids, attention_mask, **kwargs)
+
+
+class TestInferenceEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.texts = ["<attack:assault> x x assault", "nothing happened here"]
+        self.tokenizer = build_tokenizer(self.texts)
+
+    def test_predict_matches_infer(self):
+        engine = InferenceEngine(EchoModel(), self.tokenizer, EchoModel(), self.tokenizer, "cpu")
+        results = engine.predict(self.texts, ["<ace>"] * 2, "EE")
+        self.assertEqual(results, [infer(text, model=[EchoModel(), EchoModel()],
+                                         tokenizer=[self.tokenizer, self.tokenizer], task="EE", device="cpu")[0]
+                                   for text in self.texts])
+        self.assertEqual(results[1]["events"], [])
+
+    def test_device(self):
+        self.assertEqual(get_device("cpu"), torch.device("cpu"))
+        self.assertEqual(get_device("auto", backend="onnx"), torch.device("cpu"))
+        self.assertEqual(get_device("cpu", quantize="int8"), torch.device("cpu"))
+        # a cuda device is not replaced by the cpu silently
+        with self.assertRaises(ValueError):
+            get_device("cuda", backend="onnx")
+        with self.assertRaises(ValueError):
+            get_device("cuda:1", quantize="int8")
+
+    def test_extract_arguments_without_triggers(self):
+        model = EchoModel()
+        engine = InferenceEngine(eae_model=model, eae_tokenizer=self.tokenizer)
+        instances = [{"text": text, "schema": "<ace>", "triggers": []} for text in self.texts]
+        self.assertEqual(engine.extract_arguments(instances), [{"text": text, "events": []} for text in self.texts])
+        self.assertEqual(model.batch_sizes, [])
+
+    def test_eae_needs_triggers(self):
+        engine = InferenceEngine(eae_model=EchoModel(), eae_tokenizer=self.tokenizer)
+        for triggers in [None, [[("assault", 20, 27)]], [[("assault", 20, 27)], None]]:
+            with self.assertRaises(AssertionError):
+                engine.predict(self.texts, ["<ace>"] * 2, "EAE", triggers)
+            with self.assertRaises(AssertionError):
+                infer_batch(self.texts, task="EAE", model=EchoModel(), tokenizer=self.tokenizer, triggers=triggers,
+                            device="cpu")
+        with self.assertRaises(AssertionError):
+            infer(self.texts[0], model=EchoModel(), tokenizer=self.tokenizer, task="EAE", device="cpu")
+
+    def test_generation_settings(self):
+        model = KwargsEchoModel()
+        engine = InferenceEngine(model, self.tokenizer)
+        engine.detect_events(self.texts, ["<ace>"] * 2, num_beams=1)
+        engine.detect_events(self.texts, ["<ace>"] * 2)
+        self.assertEqual(model.num_beams, [1, 4])
+
+    def test_predict_text_with_cache(self):
+        model = EchoModel()
+        engine = InferenceEngine(model, self.tokenizer, cache=ResultCache())
+        first = engine.predict_text(self.texts[0], "<ace>", "ED")
+        self.assertEqual(engine.predict_text(self.texts[0], "<ace>", "ED"), first)
+        self.assertEqual(model.batch_sizes, [1])
+        self.assertEqual(engine.cache.get_stats()["memory_hit"], 1)
+
+    def test_warmup(self):
+        ed_model, eae_model = EchoModel(), EchoModel()
+        InferenceEngine(ed_model, build_tokenizer([]), eae_model, build_tokenizer([])).warmup()
+        self.assertEqual((ed_model.batch_sizes, eae_model.batch_sizes), ([1], [1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
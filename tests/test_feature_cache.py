@@ -0,0 +1,81 @@
+import os
+import json
+import tempfile
+import unittest
+from unittest import mock
+import sys
+sys.path.append("..")
+
+import torch
+
+from OmniEvent.arguments import DataArguments
+from OmniEvent.input_engineering.seq2seq_processor import EDSeq2SeqProcessor
+from OmniEvent.input_engineering.feature_cache import FeatureStore
+
+from utils import build_tokenizer
+
+
+class TestFeatureCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.input_file = os.path.join(self.tmp_dir, "train.unified.jsonl")
+        items = [
+            {"text": "troops attacked the city", "events": [{"type": "attack", "triggers": [{"trigger_word": "attacked"}]}]},
+            {"text": "nothing happened"},
+        ]
+        with open(self.input_file, "w", encoding="utf-8") as f:
+            for item in items:
+                f.write(json.dumps(item) + "\n")
+        self.tokenizer = build_tokenizer([item["text"] for item in items] + ["< attack: attacked >"])
+
+    def get_args(self, cache_dir, **kwargs):
+        kwargs = dict({"max_seq_length": 16, "max_out_length": 8}, **kwargs)
+        return DataArguments(feature_cache_dir=cache_dir, **kwargs)
+
+    def test_cached_features_match(self):
+        cache_dir = os.path.join(self.tmp_dir, "cache")
+        expected = EDSeq2SeqProcessor(self.get_args(None), self.tokenizer, self.input_file)
+        cold = EDSeq2SeqProcessor(self.get_args(cache_dir), self.tokenizer, self.input_file)
+        warm = EDSeq2SeqProcessor(self.get_args(cache_dir), self.tokenizer, self.input_file)
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+        self.assertIsInstance(warm.input_features, FeatureStore)
+        self.assertEqual(len(warm), len(expected))
+        for i in range(len(expected)):
+            for dataset in [cold, warm]:
+                item, expected_item = dataset[i], expected[i]
+                self.assertEqual(item.keys(), expected_item.keys())
+                for key in item:
+                    self.assertTrue(torch.equal(item[key], expected_item[key]))
+                    self.assertEqual(item[key].dtype, expected_item[key].dtype)
+        self.assertEqual(warm.input_features[1].example_id, expected.input_features[1].example_id)
+
+    def test_warm_start_reads_lazily(self):
+        cache_dir = os.path.join(self.tmp_dir, "cache")
+        cold = EDSeq2SeqProcessor(self.get_args(cache_dir), self.tokenizer, self.input_file)
+        with mock.patch.object(EDSeq2SeqProcessor, "read_lines", autospec=True,
+                               side_effect=EDSeq2SeqProcessor.read_lines) as read_lines:
+            warm = EDSeq2SeqProcessor(self.get_args(cache_dir), self.tokenizer, self.input_file)
+            self.assertEqual(read_lines.call_count, 0)
+            self.assertEqual(len(warm), len(cold))
+            # the examples are read once they are needed
+            self.assertEqual(warm.get_ids(), cold.get_ids())
+            self.assertEqual(read_lines.call_count, 1)
+            self.assertEqual([example.labels for example in warm.examples],
+                             [example.labels for example in cold.examples])
+            self.assertEqual(read_lines.call_count, 1)
+        self.assertIsInstance(warm.input_features, FeatureStore)
+
+    def test_key_changes(self):
+        cache_dir = os.path.join(self.tmp_dir, "cache")
+        EDSeq2SeqProcessor(self.get_args(cache_dir), self.tokenizer, self.input_file)
+        EDSeq2SeqProcessor(self.get_args(cache_dir, max_seq_length=12), self.tokenizer, self.input_file)
+        with open(self.input_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"text": "the city"}) + "\n")
+        dataset = EDSeq2SeqProcessor(self.get_args(cache_dir), self.tokenizer, self.input_file)
+        self.assertEqual(len(dataset), 3)
+        self.assertEqual(len(os.listdir(cache_dir)), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import tempfile
+import unittest
+import sys
+sys.path.append("..")
+
+import numpy as np
+import torch
+
+from OmniEvent.arguments import DataArguments
+from OmniEvent.input_engineering.base_processor import EAEInputFeatures
+from OmniEvent.input_engineering.feature_store import FeatureStore, collate_features
+
+
+def get_features(lengths, width=12):
+    features = []
+    for i, length in enumerate(lengths):
+        # sequence labeling style labels: -100 for padding and inside the sequence for sub-words
+        labels = [i % 3, -100] * (length // 2) + [1] * (length % 2) + [-100] * (width - length)
+        features.append(EAEInputFeatures(
+            example_id=i,
+            input_ids=list(range(5, 5 + length)) + [1] * (width - length),
+            attention_mask=[1] * length + [0] * (width - length),
+            token_type_ids=[0] * width,
+            trigger_left=i,
+            labels=labels
+        ))
+    return features
+
+
+def to_batch(features):
+    batch = []
+    for feature in features:
+        item = {key: torch.tensor(getattr(feature, key), dtype=torch.long)
+                for key in ["input_ids", "attention_mask", "token_type_ids", "trigger_left", "labels"]}
+        batch.append(item)
+    return batch
+
+
+def stack_and_truncate(batch, config):
+    """The collation of padded samples before `collate_features`."""
+    output_batch = {key: torch.stack([x[key] for x in batch], dim=0) for key in batch[0]}
+    if config.truncate_in_batch:
+        input_length = int(output_batch["attention_mask"].sum(-1).max())
+        for key in ["input_ids", "attention_mask", "token_type_ids"]:
+            output_batch[key] = output_batch[key][:, :input_length]
+        if config.truncate_seq2seq_output:
+            output_length = int((output_batch["labels"] != -100).sum(-1).max())
+            output_batch["labels"] = output_batch["labels"][:, :output_length]
+        else:
+            output_batch["labels"] = output_batch["labels"][:, :input_length]
+    return output_batch
+
+
+class TestFeatureStore(unittest.TestCase):
+
+    def setUp(self):
+        self.features = get_features([3, 8, 5, 1])
+        self.pad_values = {"input_ids": 1, "labels": -100}
+        self.store = FeatureStore.from_features(self.features, EAEInputFeatures, self.pad_values)
+
+    def test_unpadded_columns(self):
+        self.assertEqual(self.store.get_lengths().tolist(), [3, 8, 5, 1])
+        self.assertEqual(self.store[1].input_ids.tolist(), list(range(5, 13)))
+        self.assertEqual(self.store[0].token_type_ids.tolist(), [])
+        self.assertEqual(self.store[2].trigger_left, 2)
+        self.assertIsNone(self.store[2].argument_left)
+        self.assertEqual(self.store.arrays["attention_mask"][0].dtype, np.int8)
+        for i, feature in enumerate(self.features):
+            padded = self.store.get(i, padded=True)
+            for key in ["input_ids", "attention_mask", "token_type_ids", "labels"]:
+                self.assertEqual(getattr(padded, key).tolist(), getattr(feature, key))
+
+    def test_collate_matches_padded(self):
+        for truncate_in_batch in [True, False]:
+            for truncate_seq2seq_output in [True, False]:
+                config = DataArguments(truncate_in_batch=truncate_in_batch,
+                                       truncate_seq2seq_output=truncate_seq2seq_output)
+                expected = stack_and_truncate(to_batch(self.features), config)
+                stored = [self.store.get(i, padded=not truncate_in_batch) for i in range(len(self.store))]
+                output = collate_features(to_batch(stored), config, self.pad_values)
+                self.assertEqual(output.keys(), expected.keys())
+                for key in expected:
+                    self.assertTrue(torch.equal(output[key], expected[key]), key)
+
+    def test_save_and_load(self):
+        path = tempfile.mkdtemp()
+        self.store.state = {"is_overflow": [False] * 4}
+        self.store.save(path)
+        loaded = FeatureStore.load(path, EAEInputFeatures)
+        self.assertEqual(loaded.state, self.store.state)
+        self.assertEqual(loaded.widths, self.store.widths)
+        for i in range(len(self.store)):
+            self.assertEqual(loaded.get(i, padded=True).labels.tolist(), self.features[i].labels)
+
+
+if __name__ == "__main__":
+    unittest.main()
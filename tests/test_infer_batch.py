@@ -0,0 +1,71 @@
+import os
+import json
+import tempfile
+import unittest
+from unittest import mock
+import sys
+sys.path.append("..")
+
+from OmniEvent.infer import InferenceEngine, infer, infer_batch, infer_stream
+from OmniEvent.infer_module.seq2seq import get_length_batches
+
+from utils import EchoModel, build_tokenizer
+
+
+class TestInferBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.texts = [
+            "<attack:assault> " + "x " * 5 + "assault",
+            "<die:killed> killed",
+            "nothing happened here",
+            "<meet:summit> " + "y " * 9 + "summit",
+        ]
+        self.tokenizer = build_tokenizer(self.texts)
+
+    def test_get_length_batches(self):
+        self.assertEqual(get_length_batches([5, 1, 3, 2], batch_size=2), [[1, 3], [2, 0]])
+        self.assertEqual(get_length_batches([5, 1, 3, 2], batch_size=8, max_tokens=6), [[1, 3], [2], [0]])
+
+    def test_order_matches_infer(self):
+        model = EchoModel()
+        results = infer_batch(self.texts, task="ED", batch_size=2, model=model, tokenizer=self.tokenizer,
+                              device="cpu")
+        expected = [infer(text, model=EchoModel(), tokenizer=self.tokenizer, device="cpu")[0]
+                    for text in self.texts]
+        self.assertEqual(results, expected)
+        self.assertEqual(model.batch_sizes, [2, 2])
+        self.assertEqual([[event["type"] for event in result["events"]] for result in results],
+                         [["attack"], ["die"], [], ["meet"]])
+
+    def test_pipelined_ee(self):
+        texts = self.texts * 5
+        models, tokenizers = [EchoModel(), EchoModel()], [self.tokenizer, self.tokenizer]
+        expected = infer_batch(texts, task="EE", model=models, tokenizer=tokenizers, device="cpu")
+        # the pipeline runs every chunk through the engine
+        with mock.patch.object(InferenceEngine, "extract_arguments", autospec=True,
+                               side_effect=InferenceEngine.extract_arguments) as extract_arguments:
+            results = infer_batch(texts, task="EE", model=models, tokenizer=tokenizers, device="cpu",
+                                  pipelined=True, chunk_size=3)
+        self.assertEqual(results, expected)
+        self.assertEqual(extract_arguments.call_count, 7)
+
+    def test_stream_resume(self):
+        texts = self.texts * 5
+        expected = infer_batch(texts, model=EchoModel(), tokenizer=self.tokenizer, device="cpu")
+        self.assertEqual(list(infer_stream(iter(texts), model=EchoModel(), tokenizer=self.tokenizer, device="cpu",
+                                           chunk_size=3)), expected)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            out_path = os.path.join(tmp_dir, "out.jsonl")
+            # simulate a run that was interrupted after 6 lines, with a partially written 7th line
+            infer_stream(texts[:6], out_path, model=EchoModel(), tokenizer=self.tokenizer, device="cpu", chunk_size=3)
+            with open(out_path, "a") as f:
+                f.write('{"text": ')
+            self.assertEqual(infer_stream(texts, out_path, model=EchoModel(), tokenizer=self.tokenizer,
+                                          device="cpu", chunk_size=3), len(texts))
+            with open(out_path) as f:
+                self.assertEqual([json.loads(line) for line in f], expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import json
+import tempfile
+import unittest
+import sys
+sys.path.append("..")
+
+import torch
+
+from torch.utils.data import DataLoader
+
+from OmniEvent.arguments import DataArguments, TrainingArguments
+from OmniEvent.input_engineering.seq2seq_processor import EDSeq2SeqProcessor
+from OmniEvent.input_engineering.iterable_processor import IterableProcessor
+
+from utils import build_tokenizer
+
+try:
+    from OmniEvent.trainer import Trainer
+except ImportError:
+    # `OmniEvent.trainer` imports helpers of the pinned transformers version that later versions moved
+    Trainer = None
+
+
+class TinyModel(torch.nn.Module):
+    """Predicts every label from the mean embedding of the input."""
+
+    def __init__(self, vocab_size):
+        super().__init__()
+        self.embedding = torch.nn.Embedding(vocab_size, 8)
+        self.output = torch.nn.Linear(8, vocab_size)
+        self.batch_sizes = []
+
+    def forward(self, input_ids, attention_mask, labels=None):
+        self.batch_sizes.append(input_ids.shape[0])
+        logits = self.output(self.embedding(input_ids).mean(1, keepdim=True)).expand(-1, labels.shape[1], -1)
+        loss = torch.nn.functional.cross_entropy(logits.reshape(-1, logits.shape[-1]), labels.reshape(-1))
+        return {"loss": loss, "logits": logits}
+
+
+class TestIterableProcessor(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.input_file = os.path.join(self.tmp_dir, "train.unified.jsonl")
+        words = ["troops", "attacked", "the", "city", "nothing", "happened"]
+        self.texts = [" ".join(words[i % 6:] + words[:i % 6]) + " " + "x" * (i + 1) for i in range(11)]
+        with open(self.input_file, "w", encoding="utf-8") as f:
+            for text in self.texts:
+                item = {"text": text, "events": [{"type": "attack", "triggers": [{"trigger_word": "attacked"}]}]}
+                f.write(json.dumps(item) + "\n")
+        self.tokenizer = build_tokenizer(self.texts + ["< attack: attacked >"])
+
+    def get_dataset(self, **kwargs):
+        args = DataArguments(max_seq_length=16, max_out_length=8, **kwargs)
+        return IterableProcessor(EDSeq2SeqProcessor, args, self.tokenizer, self.input_file, chunk_size=3)
+
+    @staticmethod
+    def to_keys(items):
+        return [tuple(item["input_ids"].tolist()) for item in items]
+
+    def test_matches_map_style(self):
+        expected = EDSeq2SeqProcessor(DataArguments(max_seq_length=16, max_out_length=8), self.tokenizer,
+                                      self.input_file)
+        items = list(self.get_dataset())
+        self.assertEqual(len(items), len(expected))
+        for item, expected_item in zip(items, expected):
+            self.assertEqual(item.keys(), expected_item.keys())
+            for key in item:
+                self.assertTrue(torch.equal(item[key], expected_item[key]))
+
+    def test_workers_and_shuffle(self):
+        ordered = self.to_keys(self.get_dataset())
+        dataset = self.get_dataset(shuffle_buffer_size=4)
+        sharded = self.to_keys(DataLoader(dataset, batch_size=None, num_workers=2))
+        self.assertEqual(sorted(sharded), sorted(ordered))
+        self.assertEqual(self.to_keys(dataset), self.to_keys(dataset))
+        self.assertNotEqual(self.to_keys(dataset), ordered)
+        dataset.set_epoch(1)
+        self.assertEqual(sorted(self.to_keys(dataset)), sorted(ordered))
+
+    @unittest.skipIf(Trainer is None, "OmniEvent.trainer is incompatible with the installed transformers")
+    def test_trainer(self):
+        dataset = self.get_dataset(shuffle_buffer_size=4)
+        # two epochs of 6 batches, the last one of a single sample
+        args = TrainingArguments(output_dir=self.tmp_dir, max_steps=12, per_device_train_batch_size=2,
+                                 report_to=[], no_cuda=True, save_strategy="no", logging_strategy="no")
+        model = TinyModel(len(self.tokenizer))
+        trainer = Trainer(model=model, args=args, train_dataset=dataset, data_collator=dataset.collate_fn)
+        output = trainer.train()
+        self.assertEqual(output.global_step, 12)
+        # no sample is repeated to fill the last batch of an epoch
+        self.assertEqual(model.batch_sizes, [2, 2, 2, 2, 2, 1] * 2)
+        self.assertEqual(dataset.epoch, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
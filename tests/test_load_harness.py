@@ -0,0 +1,32 @@
+import os
+import unittest
+import sys
+sys.path.append("..")
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts", "benchmark"))
+
+from load_harness import build_texts, get_parser, run, sample_lengths
+
+
+class TestLoadHarness(unittest.TestCase):
+
+    def test_sample_lengths(self):
+        import random
+        rng = random.Random(0)
+        self.assertEqual(sample_lengths("fixed:7", 3, rng), [7, 7, 7])
+        self.assertTrue(all(5 <= length <= 9 for length in sample_lengths("uniform:5-9", 50, rng)))
+        self.assertTrue(all(length >= 1 for length in sample_lengths("lognormal:10,1.0", 50, rng)))
+        self.assertEqual(len(build_texts("fixed:4", 2)[0].split()), 4)
+
+    def test_offline_run(self):
+        args = get_parser().parse_args(["--num_requests", "4", "--concurrency", "2", "--lengths", "fixed:8",
+                                        "--num_threads", "1"])
+        report = run(args)
+        for target in ["infer", "server"]:
+            self.assertEqual(report[target]["num_requests"], 4)
+            self.assertEqual(report[target]["errors"], 0)
+            self.assertGreater(report[target]["qps"], 0)
+            self.assertLessEqual(report[target]["p50_ms"], report[target]["p99_ms"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+import sys
+sys.path.append("..")
+
+from OmniEvent.infer import infer_batch, get_stats, reset_stats
+from OmniEvent.infer_module.metrics import Metrics
+
+from utils import EchoModel, build_tokenizer
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_histogram(self):
+        metrics = Metrics(prefix="test")
+        for value in [0.002, 0.02, 0.2]:
+            metrics.observe("stage_seconds", value, stage="generate")
+        metrics.inc("requests_total", endpoint="/api/query")
+        stats = metrics.get_stats()
+        generate = stats["stage_seconds"]['{stage="generate"}']
+        self.assertEqual(generate["count"], 3)
+        self.assertAlmostEqual(generate["sum"], 0.222)
+        self.assertEqual(generate["p50"], 0.02)
+        self.assertEqual(generate["max"], 0.2)
+        self.assertEqual(stats["requests_total"], {'{endpoint="/api/query"}': 1})
+        text = metrics.to_prometheus()
+        self.assertIn('test_stage_seconds_bucket{stage="generate",le="0.0025"} 1', text)
+        self.assertIn('test_stage_seconds_bucket{stage="generate",le="+Inf"} 3', text)
+        self.assertIn('test_stage_seconds_count{stage="generate"} 3', text)
+        self.assertIn('test_requests_total{endpoint="/api/query"} 1', text)
+
+    def test_infer_records_stages(self):
+        texts = ["<attack:assault> x x assault", "<die:killed> killed", "nothing happened here"]
+        tokenizer = build_tokenizer(texts)
+        reset_stats()
+        infer_batch(texts, batch_size=2, model=EchoModel(), tokenizer=tokenizer, device="cpu")
+        stats = get_stats()
+        self.assertEqual(set(stats["stage_seconds"]),
+                         {'{stage="%s"}' % stage for stage in ["tokenize", "generate", "decode", "extract", "result"]})
+        self.assertEqual(stats["stage_seconds"]['{stage="generate"}']["count"], 2)
+        self.assertEqual(stats["batch_size"][""]["sum"], 3)
+        self.assertGreater(stats["padding_ratio"][""]["max"], 0)
+        self.assertGreater(stats["generated_tokens"][""]["sum"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import json
+import pickle
+import tempfile
+import unittest
+import sys
+sys.path.append("..")
+
+from OmniEvent.arguments import DataArguments
+from OmniEvent.input_engineering.seq2seq_processor import EDSeq2SeqProcessor, EAESeq2SeqProcessor
+from OmniEvent.input_engineering.multiprocess import convert_features, get_chunks
+
+from utils import build_tokenizer
+
+
+class StateProcessor(object):
+    """Converts every example to itself and records the given entries of `data_for_evaluation`."""
+
+    def __init__(self, get_state):
+        self.config = DataArguments(num_proc=2)
+        self.examples = list(range(8))
+        self.data_for_evaluation = {"examples": self.examples}
+        self.get_state = get_state
+
+    def convert_examples_to_features(self):
+        self.input_features = list(self.examples)
+        self.is_overflow = [False] * len(self.examples)
+        self.data_for_evaluation.update(self.get_state(self.examples))
+
+
+class TestMultiprocess(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.input_file = os.path.join(self.tmp_dir, "train.unified.jsonl")
+        texts = ["troops attacked the city", "nothing happened", "the city was attacked by troops", "troops"]
+        with open(self.input_file, "w", encoding="utf-8") as f:
+            for i in range(25):
+                item = {"text": texts[i % len(texts)]}
+                if "attacked" in item["text"]:
+                    item["events"] = [{"type": "attack", "triggers": [{"trigger_word": "attacked"}]}]
+                f.write(json.dumps(item) + "\n")
+        self.tokenizer = build_tokenizer(texts + ["< attack: attacked >"])
+
+    def get_processor(self, num_proc):
+        args = DataArguments(max_seq_length=16, max_out_length=8, num_proc=num_proc)
+        return EDSeq2SeqProcessor(args, self.tokenizer, self.input_file)
+
+    def test_get_chunks(self):
+        self.assertEqual(get_chunks(10, 2, chunks_per_proc=2), [(0, 3), (3, 6), (6, 9), (9, 10)])
+        self.assertEqual(get_chunks(1, 4), [(0, 1)])
+        self.assertEqual(get_chunks(0, 4), [])
+
+    def test_identical_to_serial(self):
+        serial = self.get_processor(1)
+        parallel = self.get_processor(3)
+        self.assertEqual(len(parallel.input_features), 25)
+        self.assertEqual(pickle.dumps([vars(f) for f in parallel.input_features]),
+                         pickle.dumps([vars(f) for f in serial.input_features]))
+        self.assertEqual(parallel.is_overflow, serial.is_overflow)
+        self.assertEqual(getattr(parallel, "data_for_evaluation", None),
+                         getattr(serial, "data_for_evaluation", None))
+        self.assertEqual(len(parallel.examples), 25)
+
+    def test_eae_identical_to_serial(self):
+        input_file = os.path.join(self.tmp_dir, "eae.unified.jsonl")
+        item = {"text": "troops attacked the city", "negative_triggers": [], "events": [{"type": "attack", "triggers": [
+            {"trigger_word": "attacked", "position": [7, 15],
+             "arguments": [{"role": "attacker", "mentions": [{"mention": "troops"}]}]}]}]}
+        with open(input_file, "w", encoding="utf-8") as f:
+            for _ in range(7):
+                f.write(json.dumps(item) + "\n")
+        tokenizer = build_tokenizer([item["text"], "<event> </event> attacker"])
+        processors = []
+        for num_proc in [1, 2]:
+            args = DataArguments(max_seq_length=16, max_out_length=8, num_proc=num_proc)
+            args.markers = ["<event>", "</event>"]
+            processors.append(EAESeq2SeqProcessor(args, tokenizer, input_file, None))
+        serial, parallel = processors
+        self.assertEqual(pickle.dumps([vars(f) for f in parallel.input_features]),
+                         pickle.dumps([vars(f) for f in serial.input_features]))
+        self.assertEqual(parallel.data_for_evaluation, serial.data_for_evaluation)
+
+
+    def test_merge_data_for_evaluation(self):
+        processor = StateProcessor(lambda examples: {"squares": [x * x for x in examples]})
+        convert_features(processor)
+        self.assertEqual(processor.input_features, list(range(8)))
+        self.assertEqual(processor.data_for_evaluation, {"examples": list(range(8)),
+                                                         "squares": [x * x for x in range(8)]})
+        # entries that cannot be concatenated are not silently taken from the first chunk
+        for get_state in [lambda examples: {"count": len(examples)},
+                          lambda examples: {"firsts": [examples[0]]} if examples[0] == 0 else {}]:
+            with self.assertRaises(ValueError):
+                convert_features(StateProcessor(get_state))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import tempfile
+import unittest
+import sys
+sys.path.append("..")
+
+import torch
+
+from transformers import MT5Config, MT5ForConditionalGeneration
+
+from OmniEvent.infer import infer
+from OmniEvent.infer_module.onnx_engine import export_seq2seq_onnx, OnnxSeq2SeqEngine
+
+from utils import build_tokenizer
+
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+
+TEXTS = [
+    "the army attacked the city at dawn",
+    "rebels fired at the army in the north of the city",
+]
+
+
+@unittest.skipIf(onnxruntime is None, "onnxruntime is not installed")
+class TestOnnxSeq2SeqEngine(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        torch.manual_seed(0)
+        cls.tokenizer = build_tokenizer(TEXTS, ["<extra_id_0>", "<extra_id_1>"])
+        config = MT5Config(vocab_size=len(cls.tokenizer), d_model=32, d_kv=8, d_ff=64, num_layers=2,
+                           num_decoder_layers=2, num_heads=4, decoder_start_token_id=0, pad_token_id=0, eos_token_id=1)
+        cls.model = MT5ForConditionalGeneration(config).eval()
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        export_seq2seq_onnx(cls.model, cls.tmp_dir.name, cls.tokenizer)
+        cls.engine = OnnxSeq2SeqEngine.from_pretrained(cls.tmp_dir.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def test_generate_parity(self):
+        inputs = self.tokenizer(TEXTS, padding=True, return_tensors="pt")
+        for num_beams in [1, 4]:
+            expected = self.model.generate(inputs["input_ids"], attention_mask=inputs["attention_mask"],
+                                           max_length=24, num_beams=num_beams)
+            output = self.engine.generate(inputs["input_ids"], attention_mask=inputs["attention_mask"],
+                                          max_length=24, num_beams=num_beams)
+            self.assertTrue(torch.equal(output, expected))
+
+    def test_logits_parity(self):
+        inputs = self.tokenizer(TEXTS, padding=True, return_tensors="pt", return_token_type_ids=False)
+        decoder_input_ids = torch.tensor([[0, 5, 6], [0, 7, 8]])
+        with torch.no_grad():
+            expected = self.model(**inputs, decoder_input_ids=decoder_input_ids[:, :1], use_cache=True)
+            output = self.engine(**inputs, decoder_input_ids=decoder_input_ids[:, :1])
+            self.assertTrue(torch.allclose(output.logits, expected.logits, atol=1e-4))
+            expected = self.model(**inputs, decoder_input_ids=decoder_input_ids[:, 1:2],
+                                  past_key_values=expected.past_key_values)
+            output = self.engine(**inputs, decoder_input_ids=decoder_input_ids[:, 1:2],
+                                 past_key_values=output.past_key_values)
+            self.assertTrue(torch.allclose(output.logits, expected.logits, atol=1e-4))
+
+    def test_infer_backend(self):
+        for text in TEXTS:
+            self.assertEqual(infer(text, model=self.engine, tokenizer=self.tokenizer, backend="onnx"),
+                             infer(text, model=self.model, tokenizer=self.tokenizer, device="cpu"))
+
+
+if __name__ == "__main__":
+    unittest.main()
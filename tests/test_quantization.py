@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+import sys
+sys.path.append("..")
+from unittest import mock
+
+import torch
+
+from transformers import MT5Config, MT5ForConditionalGeneration
+
+from OmniEvent.infer import build_model, AttrDict
+from OmniEvent.infer_module.registry import get_model_memory
+from OmniEvent.model import quantization
+from OmniEvent.model.quantization import load_quantized, get_quantized_weights_path
+
+
+class TestQuantization(unittest.TestCase):
+
+    def setUp(self):
+        torch.manual_seed(0)
+        config = MT5Config(vocab_size=64, d_model=64, d_kv=16, d_ff=256, num_layers=2, num_decoder_layers=2,
+                           num_heads=4, decoder_start_token_id=0, pad_token_id=0, eos_token_id=1)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = self.tmp_dir.name
+        MT5ForConditionalGeneration(config).save_pretrained(self.path)
+        self.model_args = AttrDict({"paradigm": "seq2seq", "model_type": "mt5"})
+        self.input_ids = torch.randint(2, 64, (2, 10))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def load(self):
+        return load_quantized(lambda: build_model(self.model_args, self.path),
+                              lambda: MT5ForConditionalGeneration.from_pretrained(self.path),
+                              self.path)
+
+    def generate(self, model):
+        return model.generate(self.input_ids, max_length=12, num_beams=2)
+
+    def test_quantize_and_reload(self):
+        model = self.load()
+        self.assertTrue(os.path.exists(get_quantized_weights_path(self.path)))
+        float_model = MT5ForConditionalGeneration.from_pretrained(self.path).eval()
+        self.assertLess(get_model_memory(model), get_model_memory(float_model))
+        expected = self.generate(model)
+        # the cached int8 weights are loaded as they are
+        with mock.patch.object(quantization, "quantize_dynamic_int8") as quantize:
+            reloaded = self.load()
+            quantize.assert_not_called()
+        self.assertTrue(torch.equal(self.generate(reloaded), expected))
+
+
+if __name__ == "__main__":
+    unittest.main()
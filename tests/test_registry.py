@@ -0,0 +1,53 @@
+import threading
+import unittest
+import sys
+sys.path.append("..")
+
+import torch
+
+from OmniEvent.infer_module.registry import ModelRegistry
+
+
+class TestModelRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        def loader(model_name_or_path, device, dtype):
+            self.calls.append((model_name_or_path, device, dtype))
+            model = torch.nn.Linear(16, 16).to(device)
+            if dtype is not None:
+                model = model.to(dtype)
+            return model, model_name_or_path
+        self.loader = loader
+
+    def test_load_once(self):
+        registry = ModelRegistry(self.loader)
+        model, tokenizer = registry.get("a", "cpu")
+        self.assertIs(registry.get("a", torch.device("cpu"))[0], model)
+        registry.get("a", "cpu", torch.float16)
+        self.assertEqual(len(self.calls), 2)
+
+    def test_concurrent_get(self):
+        registry = ModelRegistry(self.loader)
+        threads = [threading.Thread(target=registry.get, args=("a", "cpu")) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.calls), 1)
+
+    def test_lru_eviction(self):
+        model_size = (16 * 16 + 16) * 4
+        registry = ModelRegistry(self.loader, max_memory=2 * model_size)
+        registry.preload(["a", "b"], "cpu")
+        registry.get("a", "cpu")
+        registry.get("c", "cpu")
+        self.assertEqual([key[0] for key in registry.keys()], ["a", "c"])
+        self.assertEqual(registry.memory_usage(), 2 * model_size)
+        self.assertEqual(registry.evict("a"), 1)
+        self.assertEqual(registry.evict(), 1)
+        self.assertEqual(len(registry), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import json
+import tempfile
+import unittest
+import sys
+sys.path.append("..")
+
+import numpy as np
+
+from OmniEvent.arguments import DataArguments, TrainingArguments
+from OmniEvent.input_engineering.seq2seq_processor import EDSeq2SeqProcessor
+from OmniEvent.input_engineering.sampler import TokenBudgetBatchSampler, get_lengths, nested_reorder
+
+from utils import EchoModel, build_tokenizer
+
+try:
+    from OmniEvent.trainer import Trainer
+except ImportError:
+    # `OmniEvent.trainer` imports helpers of the pinned transformers version that later versions moved
+    Trainer = None
+
+
+class TestSampler(unittest.TestCase):
+
+    def setUp(self):
+        self.lengths = np.random.RandomState(0).randint(1, 40, size=200)
+
+    def test_budget_and_coverage(self):
+        for shuffle in [True, False]:
+            sampler = TokenBudgetBatchSampler(self.lengths, max_tokens=64, bucket_size=50, shuffle=shuffle)
+            batches = list(sampler)
+            self.assertEqual(sorted(idx for batch in batches for idx in batch), list(range(200)))
+            for batch in batches:
+                self.assertTrue(len(batch) == 1 or len(batch) * self.lengths[batch].max() <= 64)
+        sampler = TokenBudgetBatchSampler(self.lengths, max_tokens=64, batch_size=2)
+        self.assertEqual(max(len(batch) for batch in sampler), 2)
+
+    def test_shuffle_within_buckets(self):
+        sampler = TokenBudgetBatchSampler(self.lengths, max_tokens=64, bucket_size=50)
+        first = list(sampler)
+        self.assertEqual(list(sampler), first)
+        sampler.set_epoch(1)
+        second = list(sampler)
+        self.assertNotEqual(first, second)
+        # only the order of the batches changes, so every epoch has as many batches
+        self.assertEqual(sorted(first), sorted(second))
+        self.assertEqual(len(sampler), len(first))
+        self.assertLess(sampler.get_padding_ratio(), 0.2)
+
+    def test_replicas(self):
+        samplers = [TokenBudgetBatchSampler(self.lengths, max_tokens=64, num_replicas=3, rank=rank)
+                    for rank in range(3)]
+        batches = [list(sampler) for sampler in samplers]
+        self.assertEqual(len(set(len(b) for b in batches)), 1)
+        covered = set(idx for rank_batches in batches for batch in rank_batches for idx in batch)
+        self.assertEqual(covered, set(range(200)))
+
+    def test_nested_reorder(self):
+        order = np.asarray([2, 0, 1])
+        inverse_order = np.argsort(order)
+        arrays = (np.asarray([[2], [0], [1]]), [np.asarray([20, 0, 10])])
+        reordered = nested_reorder(arrays, inverse_order)
+        self.assertEqual(reordered[0].tolist(), [[0], [1], [2]])
+        self.assertEqual(reordered[1][0].tolist(), [0, 10, 20])
+
+    @staticmethod
+    def get_dataset(tmp_dir):
+        input_file = os.path.join(tmp_dir, "valid.unified.jsonl")
+        texts = ["troops " * (i % 7 + 1) + "attacked" for i in range(23)]
+        with open(input_file, "w", encoding="utf-8") as f:
+            for text in texts:
+                f.write(json.dumps({"text": text}) + "\n")
+        tokenizer = build_tokenizer(texts)
+        data_args = DataArguments(max_seq_length=16, max_out_length=4, truncate_in_batch=True)
+        return EDSeq2SeqProcessor(data_args, tokenizer, input_file)
+
+    @unittest.skipIf(Trainer is None, "OmniEvent.trainer is incompatible with the installed transformers")
+    def test_training_epochs(self):
+        tmp_dir = tempfile.mkdtemp()
+        dataset = self.get_dataset(tmp_dir)
+        args = TrainingArguments(output_dir=tmp_dir, num_train_epochs=3, per_device_train_batch_size=4, report_to=[],
+                                 no_cuda=True, save_strategy="no", logging_strategy="no", max_tokens_per_batch=40,
+                                 length_bucket_size=8)
+        trainer = Trainer(model=EchoModel(), args=args, train_dataset=dataset, data_collator=dataset.collate_fn)
+        output = trainer.train()
+        batch_sampler = trainer.callback_handler.train_dataloader.batch_sampler
+        self.assertEqual(batch_sampler.epoch, 2)
+        self.assertEqual(output.global_step, 3 * len(batch_sampler))
+
+    @unittest.skipIf(Trainer is None, "OmniEvent.trainer is incompatible with the installed transformers")
+    def test_evaluation_order(self):
+        tmp_dir = tempfile.mkdtemp()
+        dataset = self.get_dataset(tmp_dir)
+        outputs = []
+        for max_tokens in [None, 40]:
+            args = TrainingArguments(output_dir=tmp_dir, per_device_eval_batch_size=4, report_to=[], no_cuda=True,
+                                     max_tokens_per_batch=max_tokens)
+            trainer = Trainer(model=EchoModel(), args=args, data_collator=dataset.collate_fn)
+            outputs.append(trainer.predict(dataset))
+        bucketed_batches = trainer.get_length_batch_sampler(dataset, shuffle=False)
+        self.assertTrue(all(len(batch) * get_lengths(dataset)[batch].max() <= 40 for batch in bucketed_batches))
+        default, bucketed = outputs
+        for length, predictions, expected in zip(get_lengths(dataset), bucketed.predictions, default.predictions):
+            self.assertEqual(predictions[:length].tolist(), expected[:length].tolist())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+import sys
+sys.path.append("..")
+
+import torch
+
+from OmniEvent.infer_module.seq2seq import (
+    EDProcessor,
+    EAEProcessor,
+    SpanIndex,
+    get_eae_batches,
+    get_ed_result,
+    get_eae_result,
+    prepare_for_eae_from_input,
+    prepare_for_eae_from_pred
+)
+
+from utils import build_tokenizer
+
+
+class TestSeq2SeqProcessor(unittest.TestCase):
+
+    def setUp(self):
+        self.texts = ["troops were moving on Basra", "an assault", "nothing happened here at all today"]
+        self.tokenizer = build_tokenizer(self.texts + ["<event> </event>"])
+
+    def test_insert_marker(self):
+        processor = EAEProcessor(self.tokenizer)
+        self.assertEqual(processor.insert_marker("troops were moving on Basra", [12, 18]),
+                         "troops were <event> moving </event> on Basra")
+        self.assertEqual(processor.insert_marker("an assault", [0, 2]), "<event> an </event> assault")
+        self.assertEqual(processor.insert_marker("袭击了巴格达", [0, 6], whitespace=False), "<event>袭击了巴格达</event>")
+
+    def test_batched_tokenize_matches_per_instance(self):
+        processor = EDProcessor(self.tokenizer)
+        inputs = processor.tokenize(self.texts, ["<ace>"] * 3, "cpu")
+        features = [processor.tokenize_per_instance(text, "<ace>", padding=False) for text in self.texts]
+        self.assertEqual(inputs["input_ids"].shape[1], max(len(feature["input_ids"]) for feature in features))
+        self.assertEqual(inputs["attention_mask"].dtype, torch.float32)
+        for row, feature in enumerate(features):
+            length = len(feature["input_ids"])
+            self.assertEqual(inputs["input_ids"][row, :length].tolist(), feature["input_ids"].tolist())
+            self.assertEqual(inputs["attention_mask"][row].sum().item(), length)
+
+    def test_eae_batches(self):
+        instances = [{"text": self.texts[0], "schema": "<ace>", "triggers": [{"offset": [12, 18]}, {"offset": [0, 6]}]},
+                     {"text": self.texts[1], "schema": "<ace>", "triggers": []}]
+        processor = EAEProcessor(self.tokenizer)
+        inputs = processor.tokenize(instances, "cpu")
+        (indices, batch), = get_eae_batches(self.tokenizer, instances)
+        self.assertEqual(sorted(indices), [0, 1])
+        for row, i in enumerate(indices):
+            self.assertEqual(batch["input_ids"][row].tolist(), inputs["input_ids"][i].tolist())
+
+
+class TestSpanIndex(unittest.TestCase):
+
+    def test_resolve(self):
+        index = SpanIndex("the army attacked the city and the army won")
+        self.assertEqual(index.find_all("the army"), [0, 31])
+        self.assertEqual(index.resolve("the army"), [0, 8])
+        self.assertEqual(index.resolve("the army", anchor=[40, 43]), [31, 39])
+        self.assertIsNone(index.resolve("navy"))
+
+    def test_resolve_trigger(self):
+        text = "the army attacked the city and the army won"
+        index = SpanIndex(text)
+        self.assertEqual(index.resolve_trigger("the army"), [0, 8])
+        self.assertEqual(index.resolve_trigger("the army", [31, 39]), [31, 39])
+        # an offset that does not span the mention picks the nearest occurrence
+        self.assertEqual(index.resolve_trigger("the army", [30, 38]), [31, 39])
+        results = get_ed_result([text], [(0, "win", "the army", 31, 39)])
+        self.assertEqual(results[0]["events"][0]["offset"], [31, 39])
+        instances = prepare_for_eae_from_pred([text], [(0, "win", "the army", 31, 39)], ["<ace>"])
+        self.assertEqual(instances[0]["triggers"][0]["offset"], [31, 39])
+        instances = prepare_for_eae_from_input([text], [[("the army", 31, 39), "attacked", ("navy",)]], ["<ace>"])
+        self.assertEqual([trigger["offset"] for trigger in instances[0]["triggers"]], [[31, 39], [9, 17]])
+
+    def test_results(self):
+        text = "the army attacked the city and the army won"
+        results = get_ed_result([text, "nothing"], [(0, "attack", "attacked"), (0, "win", "won"), (1, "x", "y")])
+        self.assertEqual([event["offset"] for event in results[0]["events"]], [[9, 17], [40, 43]])
+        self.assertEqual(results[1]["events"], [])
+        instance = {"text": text, "schema": "<ace>", "triggers": [{"mention": "won", "offset": [40, 43]},
+                                                                    {"mention": "attacked", "offset": [9, 17]}]}
+        results = get_eae_result([instance], [[(0, "winner", "the army")], [(1, "attacker", "the army")]])
+        self.assertEqual([event["arguments"][0]["offset"] for event in results[0]["events"]], [[31, 39], [0, 8]])
+
+
+if __name__ == '__main__':
+    unittest.main()
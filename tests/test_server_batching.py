@@ -0,0 +1,207 @@
+import os
+import time
+import asyncio
+import unittest
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+
+from batching import (
+    BatchQueue,
+    QueueFullError,
+    DeadlineExceededError,
+    ClientDisconnectedError,
+    adaptive_generation,
+    cancel_on_disconnect
+)
+from OmniEvent.infer_module.metrics import metrics
+from streaming import iter_lines, map_ordered
+
+
+class Recorder(object):
+
+    def __init__(self, delay=0.0, fail=False):
+        self.batches = []
+        self.delay = delay
+        self.fail = fail
+
+    def __call__(self, items, **kwargs):
+        self.batches.append(list(items))
+        self.options = kwargs
+        time.sleep(self.delay)
+        if self.fail:
+            raise ValueError("model failed")
+        return [item * 2 for item in items]
+
+
+class TestBatchQueue(unittest.TestCase):
+
+    def run_requests(self, queue, items):
+        async def run():
+            results = await asyncio.gather(*[queue.submit(item) for item in items])
+            await queue.stop()
+            return results
+        return asyncio.run(run())
+
+    def test_batches_concurrent_requests(self):
+        metrics.reset()
+        recorder = Recorder()
+        queue = BatchQueue(recorder, max_batch_size=4, max_wait_ms=50, name="test")
+        self.assertEqual(self.run_requests(queue, list(range(10))), [i * 2 for i in range(10)])
+        self.assertEqual([len(batch) for batch in recorder.batches], [4, 4, 2])
+        stats = metrics.get_stats()
+        self.assertEqual(stats["queue_batch_size"]['{queue="test"}']["sum"], 10)
+        self.assertEqual(stats["queue_wait_seconds"]['{queue="test"}']["count"], 10)
+
+    def test_max_tokens(self):
+        recorder = Recorder()
+        queue = BatchQueue(recorder, max_batch_size=8, max_tokens=10, max_wait_ms=50, count_tokens=lambda item: item)
+        self.assertEqual(self.run_requests(queue, [6, 3, 4, 12, 1]), [12, 6, 8, 24, 2])
+        self.assertEqual(recorder.batches, [[6, 3], [4], [12], [1]])
+
+    def test_event_loop_not_blocked(self):
+        recorder = Recorder(delay=0.2)
+        queue = BatchQueue(recorder, max_batch_size=2, max_wait_ms=1)
+
+        async def run():
+            task = asyncio.ensure_future(queue.submit(1))
+            await asyncio.sleep(0.01)
+            # the loop keeps running while the first batch is being processed
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            elapsed = time.perf_counter() - start
+            result = await task
+            await queue.stop()
+            return elapsed, result
+        elapsed, result = asyncio.run(run())
+        self.assertLess(elapsed, 0.1)
+        self.assertEqual(result, 2)
+
+    def test_errors_reach_every_request(self):
+        queue = BatchQueue(Recorder(fail=True), max_batch_size=4, max_wait_ms=50)
+
+        async def run():
+            results = await asyncio.gather(queue.submit(1), queue.submit(2), return_exceptions=True)
+            await queue.stop()
+            return results
+        results = asyncio.run(run())
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+
+
+class TestAdmissionControl(unittest.TestCase):
+
+    def test_queue_full(self):
+        queue = BatchQueue(Recorder(delay=0.1), max_batch_size=1, max_wait_ms=0, max_queue_size=2)
+
+        async def run():
+            results = await asyncio.gather(*[queue.submit(i) for i in range(4)], return_exceptions=True)
+            await queue.stop()
+            return results
+        results = asyncio.run(run())
+        self.assertEqual(results[:2], [0, 2])
+        self.assertTrue(all(isinstance(result, QueueFullError) for result in results[2:]))
+
+    def test_deadline_drops_queued_work(self):
+        recorder = Recorder(delay=0.2)
+        queue = BatchQueue(recorder, max_batch_size=1, max_wait_ms=0)
+
+        async def run():
+            first = asyncio.ensure_future(queue.submit(1))
+            await asyncio.sleep(0.01)
+            # queued behind the first batch, which takes longer than the deadline
+            with self.assertRaises(DeadlineExceededError):
+                await queue.submit(2, deadline=time.perf_counter() + 0.05)
+            result = await first
+            await asyncio.sleep(0.05)
+            await queue.stop()
+            return result
+        self.assertEqual(asyncio.run(run()), 2)
+        self.assertEqual(recorder.batches, [[1]])
+
+    def test_adaptive_generation(self):
+        self.assertEqual(adaptive_generation(0.1), {"max_length": 128, "num_beams": 4})
+        self.assertEqual(adaptive_generation(0.6), {"max_length": 128, "num_beams": 2})
+        self.assertEqual(adaptive_generation(0.9), {"max_length": 64, "num_beams": 1})
+        recorder = Recorder(delay=0.05)
+        queue = BatchQueue(recorder, max_batch_size=1, max_wait_ms=0, adapt=adaptive_generation)
+
+        async def run():
+            await queue.submit(1)
+            self.assertEqual(recorder.options, {"max_length": 128, "num_beams": 4})
+            await queue.submit(2, deadline=time.perf_counter() + 1.0)
+            self.assertEqual(recorder.options, {"max_length": 128, "num_beams": 4})
+            # a batch takes about 50ms, which leaves no slack for a deadline 20ms ahead
+            with self.assertRaises(DeadlineExceededError):
+                await queue.submit(3, deadline=time.perf_counter() + 0.02)
+            await asyncio.sleep(0.1)
+            self.assertEqual(recorder.options, {"max_length": 64, "num_beams": 1})
+            await queue.stop()
+        asyncio.run(run())
+
+    def test_cancel_on_disconnect(self):
+        recorder = Recorder(delay=0.1)
+        queue = BatchQueue(recorder, max_batch_size=1, max_wait_ms=0)
+        start = time.perf_counter()
+
+        async def is_disconnected():
+            return time.perf_counter() - start > 0.03
+
+        async def run():
+            first = asyncio.ensure_future(queue.submit(1))
+            await asyncio.sleep(0.01)
+            with self.assertRaises(ClientDisconnectedError):
+                await cancel_on_disconnect(is_disconnected, queue.submit(2), poll_interval=0.01)
+            await first
+            await asyncio.sleep(0.05)
+            await queue.stop()
+        asyncio.run(run())
+        self.assertEqual(recorder.batches, [[1]])
+
+
+class TestStreaming(unittest.TestCase):
+
+    def test_iter_lines(self):
+        async def chunks():
+            for chunk in [b'{"a": 1}\n{"b"', b': 2}\n\n', b'{"c": 3}']:
+                yield chunk
+
+        async def run():
+            return [line async for line in iter_lines(chunks())]
+        self.assertEqual(asyncio.run(run()), ['{"a": 1}', '{"b": 2}', '{"c": 3}'])
+
+    def test_map_ordered(self):
+        in_flight, max_seen = [0], [0]
+
+        async def fn(item):
+            in_flight[0] += 1
+            max_seen[0] = max(max_seen[0], in_flight[0])
+            # later items finish first
+            await asyncio.sleep(0.001 * (10 - item))
+            in_flight[0] -= 1
+            return item * 2
+
+        async def items():
+            for i in range(10):
+                yield i
+
+        async def run():
+            return [result async for result in map_ordered(fn, items(), max_in_flight=3)]
+        self.assertEqual(asyncio.run(run()), [i * 2 for i in range(10)])
+        self.assertLessEqual(max_seen[0], 3)
+
+    def test_batch_queue_keeps_order(self):
+        recorder = Recorder()
+        queue = BatchQueue(recorder, max_batch_size=4, max_wait_ms=5)
+
+        async def items():
+            for i in range(10):
+                yield i
+
+        async def run():
+            results = [result async for result in map_ordered(queue.submit, items(), max_in_flight=6)]
+            await queue.stop()
+            return results
+        self.assertEqual(asyncio.run(run()), [i * 2 for i in range(10)])
+
+
+if __name__ == '__main__':
+    unittest.main()
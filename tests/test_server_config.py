@@ -0,0 +1,45 @@
+import os
+import tempfile
+import unittest
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+
+from config import load_config
+
+
+class TestServerConfig(unittest.TestCase):
+
+    def test_load_config(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "config.yaml")
+            with open(path, "w") as f:
+                f.write("ed_model: ed\ndevice: [cuda:0, cuda:1]\nworkers: 3\nthreads_per_worker: 2\n")
+            config = load_config(path)
+            self.assertEqual(config.ed_model, "ed")
+            self.assertEqual([config.get_worker_device(worker) for worker in range(3)], ["cuda:0", "cuda:1", "cuda:0"])
+            self.assertEqual(config.get_threads_per_worker(), 2)
+            self.assertEqual(config.max_batch_size, 32)
+            self.assertEqual(config.eae_model, "s2s-mt5-eae")
+
+            os.environ["OMNIEVENT_WORKERS"] = "4"
+            os.environ["OMNIEVENT_DEVICE"] = "cpu"
+            os.environ["OMNIEVENT_MAX_BATCH_TOKENS"] = "none"
+            os.environ["OMNIEVENT_WARMUP"] = "false"
+            try:
+                config = load_config(path)
+            finally:
+                for name in ["OMNIEVENT_WORKERS", "OMNIEVENT_DEVICE", "OMNIEVENT_MAX_BATCH_TOKENS", "OMNIEVENT_WARMUP"]:
+                    del os.environ[name]
+            self.assertEqual(config.workers, 4)
+            self.assertEqual(config.get_worker_device(3), "cpu")
+            self.assertIsNone(config.max_batch_tokens)
+            self.assertFalse(config.warmup)
+
+            with open(path, "w") as f:
+                f.write("num_workers: 3\n")
+            with self.assertRaises(ValueError):
+                load_config(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
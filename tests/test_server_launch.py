@@ -0,0 +1,98 @@
+import os
+import asyncio
+import argparse
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+import sys
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server")
+sys.path.append(SERVER_DIR)
+
+import launch
+
+
+class StubServer(object):
+    """Stands in for `uvicorn.Server` and records the sockets it was asked to serve."""
+    servers = []
+
+    def __init__(self, config):
+        self.config = config
+        self.sockets = None
+        StubServer.servers.append(self)
+
+    def run(self, sockets=None):
+        self.sockets = sockets
+
+
+class TestLaunch(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        tmp_dir = tempfile.mkdtemp()
+        cls.config_path = os.path.join(tmp_dir, "config.yaml")
+        with open(cls.config_path, "w") as f:
+            f.write("ed_model: ed\neae_model: eae\ndevice: cpu\nworkers: 1\nthreads_per_worker: 1\n"
+                    "preload: false\nwarmup: false\nhost: 127.0.0.1\nport: 0\ncache_size: 0\n")
+        os.environ["OMNIEVENT_SERVER_CONFIG"] = cls.config_path
+        cwd = os.getcwd()
+        # main.py mounts its static files relative to the working directory
+        os.chdir(SERVER_DIR)
+        try:
+            import main
+        finally:
+            os.chdir(cwd)
+            del os.environ["OMNIEVENT_SERVER_CONFIG"]
+        cls.server = main
+
+    def test_single_worker(self):
+        loaded = []
+
+        def load_models(device):
+            loaded.append(device)
+            self.server.engine = SimpleNamespace(device=device)
+
+        StubServer.servers = []
+        with mock.patch.object(self.server, "load_models", load_models), \
+                mock.patch.object(self.server, "engine", None), \
+                mock.patch.object(launch.uvicorn, "Server", StubServer), \
+                mock.patch.dict(os.environ):
+            with self.assertLogs(launch.logger, level="INFO") as logs:
+                launch.main(argparse.Namespace(config=self.config_path))
+            self.assertEqual(loaded, ["cpu"])
+            self.assertEqual(self.server.engine.device, "cpu")
+            # the cache is opened by the workers, not by the launcher
+            self.assertIsNone(self.server.cache)
+        self.assertEqual(len(StubServer.servers), 1)
+        self.assertIs(StubServer.servers[0].config.app, self.server.app)
+        self.assertEqual(len(StubServer.servers[0].sockets), 1)
+        StubServer.servers[0].sockets[0].close()
+        self.assertTrue(any("serves on cpu" in line for line in logs.output))
+
+        # a preloaded engine is not loaded again
+        with mock.patch.object(self.server, "load_models", load_models), \
+                mock.patch.object(self.server, "engine", SimpleNamespace(device="cpu")), \
+                mock.patch.object(launch.uvicorn, "Server", StubServer):
+            sock = launch.bind_socket("127.0.0.1", 0)
+            launch.run_worker(self.server, 0, sock)
+            sock.close()
+        self.assertEqual(loaded, ["cpu"])
+
+    def test_cache_opened_at_startup(self):
+        cache_path = os.path.join(os.path.dirname(self.config_path), "cache.sqlite")
+        engine = SimpleNamespace(device="cpu", cache=None)
+        with mock.patch.object(self.server, "engine", engine), \
+                mock.patch.object(self.server, "cache", None), \
+                mock.patch.object(self.server, "ready", False), \
+                mock.patch.object(self.server.config, "cache_size", 10), \
+                mock.patch.object(self.server.config, "cache_path", cache_path):
+            self.assertIsNone(self.server.cache)
+            asyncio.run(self.server.start())
+            self.assertIsNotNone(self.server.cache.db)
+            self.assertIs(engine.cache, self.server.cache)
+            self.assertTrue(self.server.ready)
+            self.server.cache.db.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+import sys
+sys.path.append("..")
+
+from OmniEvent.infer import infer_batch, infer_documents
+from OmniEvent.infer_module.window import get_windows, merge_window_results
+
+from utils import EchoModel, build_tokenizer
+
+
+class TestWindow(unittest.TestCase):
+
+    def setUp(self):
+        self.document = " ".join("<attack:k%03d> k%03d x x x x" % (i, i) for i in range(60))
+        self.tokenizer = build_tokenizer([self.document])
+
+    def test_get_windows(self):
+        windows = get_windows(self.tokenizer, self.document, "English", window_size=50, window_overlap=10)
+        self.assertEqual(windows[0][0], 0)
+        self.assertEqual(windows[-1][1], len(self.document))
+        for (_, previous_end), (start, end) in zip(windows, windows[1:]):
+            self.assertLess(start, previous_end)
+            self.assertLessEqual(len(self.document[start:end].split()), 50)
+
+    def test_merge_window_results(self):
+        text = "a b c d"
+        windows = [(0, 5), (2, 7)]
+        results = [{"events": [{"type": "x", "trigger": "c", "offset": [4, 5]}]},
+                   {"events": [{"type": "y", "trigger": "c", "offset": [2, 3]}]}]
+        # the second window sees "c" in its middle, the first at its border
+        self.assertEqual(merge_window_results(text, windows, results),
+                         {"text": text, "events": [{"type": "y", "trigger": "c", "offset": [4, 5]}]})
+
+    def test_long_document(self):
+        truncated = infer_batch([self.document], model=EchoModel(), tokenizer=self.tokenizer, device="cpu")[0]
+        self.assertLess(len(truncated["events"]), 60)
+        result = infer_documents([self.document], window_size=64, window_overlap=16, model=EchoModel(),
+                                 tokenizer=self.tokenizer, device="cpu")[0]
+        self.assertEqual([event["trigger"] for event in result["events"]], ["k%03d" % i for i in range(60)])
+        for event in result["events"]:
+            # offsets are relative to the document, not to the window the trigger was found in
+            start = self.document.index(event["trigger"])
+            self.assertEqual(event["offset"], [start, start + len(event["trigger"])])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+"""Helpers shared by the tests: a word-level tokenizer built from the test texts and a model that echoes its input."""
+import torch
+
+from tokenizers import Tokenizer
+from tokenizers.models import WordLevel
+from tokenizers.pre_tokenizers import WhitespaceSplit
+from tokenizers.processors import TemplateProcessing
+from transformers import PreTrainedTokenizerFast
+
+
+def build_tokenizer(texts, special_tokens=(), prefix="<ace>"):
+    """Builds a fast whitespace tokenizer whose vocabulary holds the words of `prefix + text` for every text, after
+    `<pad>`, `</s>`, `<unk>` and `special_tokens`."""
+    vocab = {"<pad>": 0, "</s>": 1, "<unk>": 2}
+    for token in special_tokens:
+        vocab.setdefault(token, len(vocab))
+    for text in texts:
+        for word in (prefix + text).split():
+            vocab.setdefault(word, len(vocab))
+    tokenizer = Tokenizer(WordLevel(vocab, unk_token="<unk>"))
+    tokenizer.pre_tokenizer = WhitespaceSplit()
+    tokenizer.post_processor = TemplateProcessing(single="$A </s>", special_tokens=[("</s>", 1)])
+    return PreTrainedTokenizerFast(tokenizer_object=tokenizer, pad_token="<pad>", eos_token="</s>", unk_token="<unk>")
+
+
+class EchoModel(torch.nn.Module):
+    """Generates, and predicts, its input ids, so that each prediction can be traced back to the text it came from.
+
+    Records the batch size of every `generate` call.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.weight = torch.nn.Parameter(torch.zeros(1))
+        self.batch_sizes = []
+
+    def forward(self, input_ids, attention_mask, labels=None):
+        return {"loss": self.weight.sum(), "logits": input_ids}
+
+    def generate(self, input_ids, attention_mask=None, **kwargs):
+        self.batch_sizes.append(input_ids.shape[0])
+        return input_ids